@@ -0,0 +1,54 @@
+"""
+Compares two benchmark result files written by benchmarks.suite.
+
+Prints p50 latency and peak memory of every (case, rows) present in both,
+with the change relative to the baseline; changes beyond --threshold are
+flagged.
+
+Usage (from backend/):
+    python -m benchmarks.compare baseline.json results.json --threshold 10
+"""
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data, {(result["case"], result["rows"]): result for result in data["results"]}
+
+
+def change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('results')
+    parser.add_argument('--threshold', type=float, default=10.0, help="Percent change flagged as a regression/improvement.")
+    args = parser.parse_args()
+
+    base_data, baseline = load(args.baseline)
+    new_data, results = load(args.results)
+    print(f"baseline {base_data['environment'].get('commit')}  vs  {new_data['environment'].get('commit')}")
+    print(f"{'case':<16}{'rows':>10}{'p50 ms':>12}{'change':>9}{'peak MB':>10}{'change':>9}")
+
+    regressions = 0
+    for key in sorted(baseline.keys() & results.keys(), key=lambda key: (key[1], key[0])):
+        old, new = baseline[key], results[key]
+        latency = change(old["latency_ms"]["p50"], new["latency_ms"]["p50"])
+        memory = change(old["peak_memory_mb"], new["peak_memory_mb"])
+        flag = ''
+        if latency > args.threshold or memory > args.threshold:
+            flag = '  regression'
+            regressions += 1
+        elif latency < -args.threshold:
+            flag = '  faster'
+        print(f"{key[0]:<16}{key[1]:>10}{new['latency_ms']['p50']:>12.1f}{latency:>+8.1f}%"
+              f"{new['peak_memory_mb']:>10.1f}{memory:>+8.1f}%{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
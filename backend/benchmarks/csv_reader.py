@@ -0,0 +1,107 @@
+"""
+Parse-time and memory benchmark for the two-phase CSV reader on wide files.
+
+Compares the previous reader (every column as object, rename, to_numeric)
+against header sniffing + usecols/dtype pushdown.
+
+Usage (from backend/):
+    python -m benchmarks.csv_reader --rows 200000 --extra-columns 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+django.setup()
+
+from core.utils import NUMERIC_COLUMNS, REQUIRED_COLUMNS, resolve_columns, sniff_header  # noqa: E402
+
+
+def write_wide_csv(path, rows, extra_columns, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {
+        'Equipment Name': [f"Equipment-{i}" for i in range(rows)],
+        'Type': rng.choice(['Pump', 'Valve', 'Compressor', 'HeatExchanger', 'Reactor'], rows),
+        'Flowrate': rng.normal(120, 15, rows).round(2),
+        'Pressure': rng.normal(5, 0.5, rows).round(2),
+        'Temperature': rng.normal(110, 8, rows).round(1),
+    }
+    for i in range(extra_columns):
+        data[f"Notes {i}"] = rng.choice(['nominal', 'inspected', 'scheduled maintenance', 'replaced seal'], rows)
+    pd.DataFrame(data).to_csv(path, index=False)
+
+
+def legacy_read(path):
+    df = pd.read_csv(path)
+    df.rename(columns=resolve_columns(df.columns), inplace=True)
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_cols:
+        return None
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def pushdown_read(path):
+    sources, error = sniff_header(path)
+    if error:
+        return None
+    dtype = {sources['EquipmentType']: 'category'}
+    dtype.update({sources[col]: 'float64' for col in NUMERIC_COLUMNS})
+    df = pd.read_csv(path, usecols=[sources[col] for col in REQUIRED_COLUMNS], dtype=dtype)
+    return df.rename(columns={original: col for col, original in sources.items()})
+
+
+def measure(fn, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(path)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--extra-columns', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'wide.csv')
+        write_wide_csv(path, args.rows, args.extra_columns)
+
+        invalid_path = os.path.join(tmp, 'invalid.csv')
+        pd.read_csv(path).drop(columns=['Temperature']).to_csv(invalid_path, index=False)
+
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{args.rows} rows, {args.extra_columns + 5} columns, {size_mb:.1f} MB")
+        print(f"{'case':<28}{'time (s)':>10}{'peak (MB)':>12}")
+
+        for label, fn, file in [
+            ('legacy read', legacy_read, path),
+            ('sniff + pushdown', pushdown_read, path),
+            ('legacy reject invalid', legacy_read, invalid_path),
+            ('sniff reject invalid', pushdown_read, invalid_path),
+        ]:
+            elapsed, peak = measure(fn, file, args.repeat)
+            print(f"{label:<28}{elapsed:>10.3f}{peak / 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
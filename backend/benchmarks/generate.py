@@ -0,0 +1,124 @@
+"""
+Seeded generator of synthetic equipment CSVs for benchmarks.
+
+Files are written in chunks, so any size (up to tens of millions of rows)
+is generated in constant memory. The same arguments always give the same
+file.
+
+Usage (from backend/):
+    python -m benchmarks.generate equipment.csv --rows 1M --types 12 \\
+        --aliases --junk-columns 10 --noise 0.01
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from core.utils import COLUMN_MAPPING
+
+BASE_TYPES = ['Pump', 'Valve', 'Compressor', 'HeatExchanger', 'Reactor', 'Condenser', 'Tank', 'Boiler']
+
+# Standard column -> (mean, std, decimals) of its values
+PARAMETERS = {
+    'Flowrate': (120.0, 15.0, 2),
+    'Pressure': (5.0, 0.5, 2),
+    'Temperature': (110.0, 8.0, 1),
+}
+
+# Written instead of a number for the --noise fraction of numeric cells
+NOISE_TOKENS = ['n/a', 'ERR', '--', '?', 'offline']
+
+JUNK_TEXT = ['nominal', 'inspected', 'scheduled maintenance', 'replaced seal', 'pending review']
+
+CHUNK_ROWS = 500_000
+
+
+def parse_rows(value):
+    """'1000', '1k', '2.5M' -> number of rows."""
+    value = str(value).strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    if scale > 1:
+        value = value[:-1]
+    return int(float(value) * scale)
+
+
+def type_names(count):
+    return (BASE_TYPES + [f"Type-{i}" for i in range(len(BASE_TYPES), count)])[:count]
+
+
+def header_names(rng, aliases):
+    """Header of every standard column: the standard name, or a random alias in random case."""
+    names = {'EquipmentType': 'Type', **{col: col for col in PARAMETERS}}
+    if aliases:
+        for col in names:
+            choices = [alias for alias, standard in COLUMN_MAPPING.items() if standard == col]
+            alias = choices[rng.integers(len(choices))]
+            names[col] = alias.title() if rng.random() < 0.5 else alias.upper()
+    return names
+
+
+def write_equipment_csv(path, rows, seed=0, types=5, aliases=False, junk_columns=0, noise=0.0, type_skew=1.0):
+    """
+    Writes `rows` rows of equipment data to `path`.
+
+    types: number of distinct EquipmentType values; type_skew > 1 makes a
+    few of them dominate (Zipf-like weights). aliases: use alias spellings
+    (e.g. 'FLOW RATE', 'Temp') for the standard columns. junk_columns:
+    extra text/number columns the analytics must ignore. noise: fraction of
+    numeric cells replaced by non-numeric tokens.
+    """
+    rng = np.random.default_rng(seed)
+    names = type_names(types)
+    weights = 1.0 / np.arange(1, types + 1) ** (type_skew - 1.0)
+    weights /= weights.sum()
+    header = header_names(rng, aliases)
+
+    written = 0
+    while written < rows:
+        size = min(CHUNK_ROWS, rows - written)
+        data = {
+            'Equipment Name': np.char.add('EQ-', np.arange(written, written + size).astype(str)),
+            header['EquipmentType']: np.asarray(names, dtype=object)[rng.choice(types, size, p=weights)],
+        }
+        for col, (mean, std, decimals) in PARAMETERS.items():
+            values = rng.normal(mean, std, size).round(decimals)
+            if noise:
+                values = values.astype(object)
+                noisy = rng.random(size) < noise
+                values[noisy] = np.asarray(NOISE_TOKENS, dtype=object)[rng.integers(len(NOISE_TOKENS), size=int(noisy.sum()))]
+            data[header[col]] = values
+        for i in range(junk_columns):
+            if i % 2:
+                data[f"Reading {i}"] = rng.integers(0, 1000, size)
+            else:
+                data[f"Notes {i}"] = np.asarray(JUNK_TEXT, dtype=object)[rng.integers(len(JUNK_TEXT), size=size)]
+
+        pd.DataFrame(data).to_csv(path, index=False, mode='w' if written == 0 else 'a', header=written == 0)
+        written += size
+    return path
+
+
+def add_arguments(parser):
+    """Generator options, shared with the benchmark suite."""
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--types', type=int, default=5, help="Distinct equipment types.")
+    parser.add_argument('--type-skew', type=float, default=1.0, help="1 = uniform, larger = a few types dominate.")
+    parser.add_argument('--aliases', action='store_true', help="Use alias column names.")
+    parser.add_argument('--junk-columns', type=int, default=0, help="Extra columns to be ignored.")
+    parser.add_argument('--noise', type=float, default=0.0, help="Fraction of non-numeric numeric cells.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=parse_rows, default=1000, help="Rows, e.g. 1000, 250k, 50M.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    write_equipment_csv(
+        args.path, args.rows, seed=args.seed, types=args.types, aliases=args.aliases,
+        junk_columns=args.junk_columns, noise=args.noise, type_skew=args.type_skew,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+Load generator for a running server (runserver, gunicorn, an ASGI server).
+
+Virtual users replay scenarios (register -> login -> upload -> history ->
+data -> report, ...) through the desktop client's APIClient, so requests
+look exactly like real client traffic. asyncio schedules the users; each
+request runs in a worker thread of a pool sized to the concurrency.
+
+Two load models:
+  closed (default): --concurrency users loop over scenarios back to back
+  open: --rate new scenario runs per second (Poisson arrivals), served by
+        at most --concurrency users at a time
+
+Scenarios come from a JSON file (--scenarios) of the form
+    {"name": {"weight": 3, "think_time": 0.5, "steps": ["login", "history", ...]}}
+or from DEFAULT_SCENARIOS; see STEPS for the step names.
+
+Usage (from backend/, with the server running):
+    python -m benchmarks.load --url http://127.0.0.1:8000/api/ --concurrency 20 --duration 60
+    python -m benchmarks.load --rate 5 --concurrency 50 --scenarios mix.json --output load.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'desktop'))
+
+from api_client import APIClient  # noqa: E402
+
+DEFAULT_SCENARIOS = {
+    # A user opening the dashboard and browsing an existing dataset
+    "dashboard": {"weight": 6, "think_time": 0.2, "steps": ["login", "history", "summary", "histograms", "series", "data_page"]},
+    # Full workflow of a new user
+    "onboarding": {"weight": 1, "think_time": 0.5, "steps": ["register", "login", "upload", "history", "summary", "data", "report"]},
+    # Returning user uploading a new file
+    "upload": {"weight": 2, "think_time": 0.5, "steps": ["login", "upload", "summary", "report"]},
+}
+
+# Latency histogram bucket upper bounds in ms (log spaced, 1 ms .. 60 s)
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+class VirtualUser:
+    """One APIClient with its own account, session and current dataset."""
+
+    def __init__(self, base_url, password):
+        self.client = APIClient(base_url)
+        self.username = None
+        self.password = password
+        self.dataset_id = None
+        # Status of every request made by the current step (None: no response)
+        self.statuses = []
+        self.client.session.hooks['response'].append(self._record)
+
+    def _record(self, response, *args, **kwargs):
+        self.statuses.append(response.status_code)
+
+
+def _register(user, options):
+    # Every registration is a new account; following steps use it
+    username = f"load-{uuid.uuid4().hex[:12]}"
+    response = user.client.session.post(f"{user.client.base_url}register/", json={'username': username, 'password': user.password})
+    if response.status_code != 201:
+        return False
+    user.username = username
+    user.dataset_id = None
+    return True
+
+
+def _login(user, options):
+    ok, _ = user.client.login(user.username, user.password)
+    return ok
+
+
+def _upload(user, options):
+    result = user.client.upload_dataset(options.upload_file, os.path.basename(options.upload_file))
+    if result:
+        user.dataset_id = result.get('id')
+    return bool(result)
+
+
+def _history(user, options):
+    history = user.client.get_history()
+    if history and user.dataset_id is None:
+        user.dataset_id = history[0]['id']
+    return isinstance(history, list)
+
+
+def _with_dataset(call):
+    def step(user, options):
+        if user.dataset_id is None:
+            return None
+        return bool(call(user.client, user.dataset_id))
+    return step
+
+
+def _report(client, dataset_id):
+    ok, _ = client.download_report(dataset_id, os.devnull)
+    return ok
+
+
+# Step name -> function(user, options) returning True (ok), False (failed)
+# or None (skipped, e.g. no dataset yet). Every user starts registered,
+# logged in and with one uploaded dataset (see LoadTest.setup).
+STEPS = {
+    'register': _register,
+    'login': _login,
+    'upload': _upload,
+    'history': _history,
+    'summary': _with_dataset(lambda client, pk: client.get_dataset_summary(pk)),
+    'data': _with_dataset(lambda client, pk: client.get_dataset_data(pk) is not None),
+    'data_page': _with_dataset(lambda client, pk: client.get_dataset_page(pk, limit=100)),
+    'series': _with_dataset(lambda client, pk: client.get_dataset_series(pk, 'Flowrate', max_points=500)),
+    'histograms': _with_dataset(lambda client, pk: client.get_histograms(pk)),
+    'report': _with_dataset(_report),
+}
+
+
+class Stats:
+    """Latencies and outcomes per step, shared by all virtual users."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.skipped = {}
+        self.status_codes = {}
+        self._lock = threading.Lock()
+
+    def record(self, step, elapsed, ok, statuses):
+        with self._lock:
+            if ok is None:
+                self.skipped[step] = self.skipped.get(step, 0) + 1
+                return
+            self.latencies.setdefault(step, []).append(elapsed * 1000)
+            if not ok:
+                self.errors[step] = self.errors.get(step, 0) + 1
+            codes = self.status_codes.setdefault(step, {})
+            for status in statuses or [None]:
+                codes[str(status)] = codes.get(str(status), 0) + 1
+
+    def summary(self, duration):
+        result = {}
+        for step, latencies in sorted(self.latencies.items()):
+            latencies = np.array(latencies)
+            errors = self.errors.get(step, 0)
+            counts = np.histogram(latencies, bins=[0] + BUCKETS_MS + [np.inf])[0]
+            result[step] = {
+                "requests": len(latencies),
+                "errors": errors,
+                "error_rate": errors / len(latencies),
+                "skipped": self.skipped.get(step, 0),
+                "throughput": len(latencies) / duration,
+                "latency_ms": {
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p90": float(np.percentile(latencies, 90)),
+                    "p99": float(np.percentile(latencies, 99)),
+                    "max": float(latencies.max()),
+                },
+                "histogram": {"le_ms": BUCKETS_MS + ['inf'], "counts": counts.tolist()},
+                "status_codes": self.status_codes.get(step, {}),
+            }
+        return result
+
+
+class LoadTest:
+    def __init__(self, options, scenarios):
+        self.options = options
+        self.scenarios = scenarios
+        self.names = list(scenarios)
+        self.weights = [scenarios[name].get('weight', 1) for name in self.names]
+        self.stats = Stats()
+        self.deadline = None
+
+    async def run_step(self, user, step):
+        loop = asyncio.get_running_loop()
+
+        def call():
+            user.statuses = []
+            start = time.perf_counter()
+            try:
+                ok = STEPS[step](user, self.options)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok and any(status is None or status >= 400 for status in user.statuses):
+                ok = False
+            return elapsed, ok, list(user.statuses)
+
+        elapsed, ok, statuses = await loop.run_in_executor(None, call)
+        self.stats.record(step, elapsed, ok, statuses)
+
+    async def run_scenario(self, user):
+        scenario = self.scenarios[random.choices(self.names, self.weights)[0]]
+        for step in scenario['steps']:
+            if time.monotonic() >= self.deadline:
+                return
+            await self.run_step(user, step)
+            think_time = scenario.get('think_time', 0)
+            if think_time:
+                # Exponential think time around the configured mean
+                await asyncio.sleep(random.expovariate(1 / think_time))
+
+    async def closed(self, users):
+        async def loop_user(user):
+            while time.monotonic() < self.deadline:
+                await self.run_scenario(user)
+
+        await asyncio.gather(*(loop_user(user) for user in users))
+
+    async def open(self, users):
+        idle = asyncio.Queue()
+        for user in users:
+            idle.put_nowait(user)
+        late = 0
+        tasks = set()
+
+        async def serve():
+            user = await idle.get()
+            try:
+                await self.run_scenario(user)
+            finally:
+                idle.put_nowait(user)
+
+        while time.monotonic() < self.deadline:
+            if idle.empty():
+                late += 1
+            task = asyncio.ensure_future(serve())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            await asyncio.sleep(random.expovariate(self.options.rate))
+        if tasks:
+            await asyncio.gather(*tasks)
+        return late
+
+    def setup(self, user):
+        """Account, token and a dataset for a user; not measured."""
+        if not (_register(user, self.options) and _login(user, self.options) and _upload(user, self.options)):
+            raise RuntimeError(f"Could not set up a user against {self.options.url}")
+
+    async def run(self):
+        options = self.options
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=options.concurrency))
+        users = [VirtualUser(options.url, options.password) for _ in range(options.concurrency)]
+        await asyncio.gather(*(loop.run_in_executor(None, self.setup, user) for user in users))
+
+        start = time.monotonic()
+        self.deadline = start + options.duration
+        late = 0
+        # The desktop client prints every error; keep the report readable
+        with contextlib.redirect_stdout(open(os.devnull, 'w')) if not options.verbose else contextlib.nullcontext():
+            if options.rate:
+                late = await self.open(users)
+            else:
+                await self.closed(users)
+        duration = time.monotonic() - start
+        return {
+            "duration_s": duration,
+            "model": "open" if options.rate else "closed",
+            "concurrency": options.concurrency,
+            "rate": options.rate,
+            # Arrivals that found every user busy (the server is not keeping up)
+            "queued_arrivals": late,
+            "steps": self.stats.summary(duration),
+        }
+
+
+def print_report(result):
+    print(f"{result['model']} model, concurrency {result['concurrency']}"
+          + (f", {result['rate']}/s arrivals ({result['queued_arrivals']} queued)" if result['rate'] else '')
+          + f", {result['duration_s']:.1f} s")
+    print(f"{'step':<12}{'requests':>9}{'req/s':>8}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for step, s in result['steps'].items():
+        latency = s['latency_ms']
+        print(f"{step:<12}{s['requests']:>9}{s['throughput']:>8.1f}{s['error_rate']:>7.1%}"
+              f"{latency['p50']:>9.1f}{latency['p90']:>9.1f}{latency['p99']:>9.1f}{latency['max']:>9.1f}")
+
+    for step, s in result['steps'].items():
+        print(f"\n{step} latency histogram (ms)")
+        counts = s['histogram']['counts']
+        scale = 40 / max(max(counts), 1)
+        lower = 0
+        for upper, count in zip(s['histogram']['le_ms'], counts):
+            if count:
+                print(f"  {lower:>6}-{upper:<6}{count:>7} {'#' * max(int(count * scale), 1)}")
+            lower = upper
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/')
+    parser.add_argument('--concurrency', type=int, default=10, help="Virtual users (and worker threads).")
+    parser.add_argument('--rate', type=float, help="Scenario arrivals per second (open model).")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to generate load for.")
+    parser.add_argument('--scenarios', help="JSON file with scenario definitions.")
+    parser.add_argument('--upload-file', help="CSV to upload (default: a generated file of --upload-rows rows).")
+    parser.add_argument('--upload-rows', type=int, default=1000)
+    parser.add_argument('--password', default='load-test-password')
+    parser.add_argument('--seed', type=int, help="Seed scenario choice and think times.")
+    parser.add_argument('--output', help="Also write the results as JSON.")
+    parser.add_argument('--verbose', action='store_true', help="Show the client's error output.")
+    options = parser.parse_args()
+
+    scenarios = DEFAULT_SCENARIOS
+    if options.scenarios:
+        with open(options.scenarios) as f:
+            scenarios = json.load(f)
+    unknown = {step for scenario in scenarios.values() for step in scenario['steps']} - set(STEPS)
+    if unknown:
+        parser.error(f"Unknown steps: {', '.join(sorted(unknown))} (known: {', '.join(STEPS)})")
+    if options.seed is not None:
+        random.seed(options.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not options.upload_file:
+            from benchmarks.generate import write_equipment_csv
+            options.upload_file = write_equipment_csv(os.path.join(tmp, 'load.csv'), options.upload_rows)
+        result = asyncio.run(LoadTest(options, scenarios).run())
+
+    print_report(result)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({"parameters": {key: value for key, value in vars(options).items() if key != 'password'}, **result}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+In-process benchmark suite: analytics, the data endpoint, PDF reports and
+serializers, driven through Django's test client against a throwaway test
+database and media directory (no server needed).
+
+For every dataset size, each case is run --repeat times for latency
+percentiles and throughput, then once more under tracemalloc for peak
+(Python) memory; the SQL query count of that run is recorded as well.
+Results go to a JSON file; compare two of them with benchmarks.compare.
+
+Usage (from backend/):
+    python -m benchmarks.suite --rows 1k 100k 1M --output results.json
+    python -m benchmarks.suite --rows 100k --only analytics data-page
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from benchmarks.generate import add_arguments as add_generator_arguments, parse_rows, write_equipment_csv  # noqa: E402
+
+RESULTS_VERSION = 1
+
+
+def _consume(response):
+    if getattr(response, 'streaming', False):
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def _checked(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.status_code}: {response.content[:200]!r}")
+    return _consume(response)
+
+
+def measure(fn, repeat):
+    """Latency percentiles (ms) over `repeat` runs, plus peak memory and queries of one more run."""
+    from core.instrumentation import QueryRecorder
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with QueryRecorder() as queries:
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = np.array(timings) * 1000
+    return {
+        "runs": repeat,
+        "latency_ms": {
+            "min": float(timings.min()),
+            "p50": float(np.percentile(timings, 50)),
+            "p95": float(np.percentile(timings, 95)),
+            "max": float(timings.max()),
+        },
+        "peak_memory_mb": peak / 1e6,
+        "queries": queries.count,
+    }
+
+
+class Suite:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+
+        self.user = User.objects.create_user('benchmark', password='benchmark')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+
+    def upload(self, path, fresh=False):
+        """Uploads `path`; with fresh=True earlier copies are not reused (no dedup)."""
+        if fresh:
+            from core.models import UploadedDataset
+            UploadedDataset.objects.update(content_hash='')
+        with open(path, 'rb') as f:
+            response = self.client.post('/api/upload/', {'file': f, 'dataset_name': os.path.basename(path)}, format='multipart')
+        if response.status_code != 201:
+            raise RuntimeError(f"Upload failed: {response.status_code} {response.data}")
+        return response.data['id']
+
+    def cases(self, path, rows):
+        """name -> (callable, rows processed per call)."""
+        from core.models import UploadedDataset
+        from core.serializers import UploadedDatasetSerializer
+        from core.utils import generate_pdf_report, process_csv_analytics
+
+        pk = self.upload(path)
+        dataset = UploadedDataset.objects.select_related('user').get(pk=pk)
+        get = self.client.get
+        cases = {
+            "analytics": (lambda: process_csv_analytics(path), rows),
+            "upload": (lambda: self.upload(path, fresh=True), rows),
+            "upload-dedup": (lambda: self.upload(path), rows),
+            "data-page": (lambda: _checked(get(f'/api/data/{pk}/?limit=1000&offset={rows // 2}')), min(rows, 1000)),
+            "data-ndjson": (lambda: _checked(get(f'/api/data/{pk}/?stream=ndjson')), rows),
+            "data-npcols": (lambda: _checked(get(f'/api/data/{pk}/?format=npcols')), rows),
+            "summary": (lambda: _checked(get(f'/api/summary/{pk}/')), 1),
+            "report-render": (lambda: generate_pdf_report(dataset), 1),
+            "report-view": (lambda: _checked(get(f'/api/report/{pk}/')), 1),
+            "serializer": (lambda: UploadedDatasetSerializer(UploadedDataset.objects.filter(user=self.user), many=True).data, 1),
+        }
+        # The whole dataset as one JSON document is only feasible for small files
+        if rows <= self.args.max_json_rows:
+            cases["data-json"] = (lambda: _checked(get(f'/api/data/{pk}/')), rows)
+        return cases
+
+    def run(self):
+        results = []
+        for rows in self.args.rows:
+            path = os.path.join(self.workdir, f"equipment-{rows}.csv")
+            start = time.perf_counter()
+            write_equipment_csv(
+                path, rows, seed=self.args.seed, types=self.args.types, aliases=self.args.aliases,
+                junk_columns=self.args.junk_columns, noise=self.args.noise, type_skew=self.args.type_skew,
+            )
+            print(f"{rows} rows: {os.path.getsize(path) / 1e6:.1f} MB generated in {time.perf_counter() - start:.1f} s")
+
+            for name, (fn, processed) in self.cases(path, rows).items():
+                if self.args.only and name not in self.args.only:
+                    continue
+                result = measure(fn, self.args.repeat)
+                p50 = result["latency_ms"]["p50"] / 1000
+                result.update({
+                    "case": name,
+                    "rows": rows,
+                    "rows_per_s": processed / p50 if p50 else None,
+                    "requests_per_s": 1 / p50 if p50 else None,
+                })
+                results.append(result)
+                print(f"  {name:<16}p50 {result['latency_ms']['p50']:>10.1f} ms  p95 {result['latency_ms']['p95']:>10.1f} ms"
+                      f"  peak {result['peak_memory_mb']:>8.1f} MB  {result['queries']:>3} queries")
+        return results
+
+
+def environment():
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    import pandas as pd
+    return {
+        "commit": git('rev-parse', 'HEAD'),
+        "dirty": bool(git('status', '--porcelain', '--untracked-files=no')),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "django": django.get_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=parse_rows, nargs='+', default=[1000, 100_000], help="Dataset sizes, e.g. 1k 100k 1M.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help="Run only these cases.")
+    parser.add_argument('--max-json-rows', type=parse_rows, default=1_000_000,
+                        help="Skip the single-document JSON case above this size.")
+    parser.add_argument('--output', default='benchmark-results.json')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='benchmarks-')
+    settings.MEDIA_ROOT = os.path.join(workdir, 'media')
+    settings.REPORT_CACHE_DIR = os.path.join(workdir, 'media', 'reports')
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.DEBUG = False
+    # Measure the synchronous code paths without background work
+    settings.ANALYTICS_ASYNC_UPLOADS = False
+    settings.REPORT_PREGENERATE = False
+    settings.RETENTION_MAX_DATASETS = None
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = Suite(args, workdir).run()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    parameters = {key: value for key, value in vars(args).items() if key != 'output'}
+    with open(args.output, 'w') as f:
+        json.dump({"version": RESULTS_VERSION, "environment": environment(), "parameters": parameters, "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
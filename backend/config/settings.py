@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,7 +48,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so Server-Timing covers the whole request
+    'core.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # gzip/brotli; must come before anything that reads or changes the body
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,12 +133,112 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are hashed as they stream in (used to deduplicate datasets)
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True
 
 # DRF Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedTokenAuthentication',
     ],
 }
+# Token -> user lookups cached per process (see core.authentication)
+AUTH_TOKEN_CACHE_SIZE = 1024
+AUTH_TOKEN_CACHE_TTL = 60  # seconds
+
+# Analytics Settings
+# CSVs larger than this many bytes are processed in chunks to bound memory
+ANALYTICS_STREAMING_THRESHOLD = 50 * 1024 * 1024
+ANALYTICS_CHUNK_SIZE = 100_000  # rows per chunk
+# Relative error bound of the per-type quantile sketches, and their size cap
+ANALYTICS_QUANTILE_ACCURACY = 0.01
+ANALYTICS_SKETCH_MAX_BINS = 2048
+# Histograms precomputed at upload: max equal-width bins, and equal-frequency bins
+ANALYTICS_HISTOGRAM_BINS = 64
+ANALYTICS_QUANTILE_BINS = 10
+# Uploads not analysed while streaming in (see core.uploads): process
+# analytics in the background (202 + job id) by default, and the number of
+# local worker threads that run the jobs
+ANALYTICS_ASYNC_UPLOADS = False
+ANALYTICS_WORKERS = 2
+# Threads for background housekeeping (sidecars, report pregeneration,
+# retention sweeps), kept apart from the analytics workers
+HOUSEKEEPING_WORKERS = 1
+# Trend chart series: default and maximum number of points returned
+ANALYTICS_SERIES_POINTS = 1000
+ANALYTICS_MAX_SERIES_POINTS = 10000
+# Paginated /api/data/<pk>/: default and maximum rows per page
+DATA_PAGE_SIZE = 1000
+DATA_MAX_PAGE_SIZE = 50000
+# Rows per chunk when streaming /api/data/<pk>/?stream=json|ndjson
+DATA_STREAM_CHUNK_SIZE = 10_000
+# Resumable uploads (see core.resumable): largest chunk accepted per PUT, and
+# how long an idle session is kept
+UPLOAD_CHUNK_MAX_BYTES = 32 * 1024 * 1024
+UPLOAD_SESSION_MAX_AGE_HOURS = 24
+# Bytes a session may take between two saves of its analytics state (the
+# most a restarted server has to parse again)
+UPLOAD_CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+# Report Settings
+# Generated PDFs are cached on disk (LRU, bounded in bytes) and pre-generated
+# in the background after analytics
+REPORT_CACHE_DIR = MEDIA_ROOT / 'reports'
+REPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+REPORT_PREGENERATE = True
+# Processes rendering batch reports (/api/reports/)
+REPORT_WORKERS = 2
+# Most datasets in one batch request
+REPORT_BATCH_MAX = 50
+# Most datasets in one /api/compare/ request
+COMPARE_MAX_DATASETS = 10
+
+# Retention Settings (see core.retention); None disables a limit
+# Newest datasets kept per user
+RETENTION_MAX_DATASETS = 5
+# Datasets older than this are deleted
+RETENTION_MAX_AGE_DAYS = None
+# Total bytes of uploaded files kept per user
+RETENTION_MAX_BYTES = None
+
+# Query Budgets (see core.instrumentation)
+# Most SQL queries per request, by URL name, with a cold token cache
+QUERY_BUDGETS = {
+    'login': 3,
+    'register': 2,
+    # Dedup lookup, insert, analytics save or job row, retention (one
+    # select, bulk delete)
+    'upload-csv': 10,
+    'upload-sessions': 2,
+    # BEGIN, session lookup (locked) and its update
+    'upload-session': 4,
+    # As upload-csv, plus the session delete
+    'upload-session-complete': 20,
+    'upload-history': 2,
+    'dataset-summary': 3,
+    'dataset-data': 3,
+    'dataset-report': 3,
+    'report-batch': 2,
+    'dataset-series': 2,
+    'dataset-percentiles': 2,
+    'dataset-histograms': 2,
+    # Plus one write per dataset whose state had to be computed
+    'dataset-compare': 2 + COMPARE_MAX_DATASETS,
+    'job-status': 2,
+    'auth-cache-stats': 1,
+}
+# Raise instead of logging when a budget is exceeded (turn on in tests)
+QUERY_BUDGET_STRICT = False
+
+# Async views (see core.aio)
+# Threads running pandas/ReportLab/file work for async views. Heavy requests
+# beyond this wait their turn; more CPU-bound threads than cores only fight
+# over the GIL and slow down every other request
+ASYNC_OFFLOAD_WORKERS = min(4, os.cpu_count() or 1)
@@ -0,0 +1,96 @@
+"""
+Async support for API views served under ASGI (config.asgi).
+
+AsyncAPIView is a DRF APIView whose handlers are coroutines: Django then
+serves it without tying up a thread, and only the parts that block run in
+threads. Authentication and permission checks (which may query the
+database) go through sync_to_async like Django's own async ORM methods;
+pandas/ReportLab/file work goes to a bounded pool via offload(), so a few
+heavy requests can't exhaust the threads cheap requests need.
+Under WSGI these views still work (Django runs them in an event loop).
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework.views import APIView
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_OFFLOAD_WORKERS, thread_name_prefix='offload')
+        return _executor
+
+
+async def offload(fn, *args, **kwargs):
+    """Runs blocking CPU or file work (no ORM access) on the bounded pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def aiter_offloaded(iterator):
+    """Async iterator over a blocking iterator, fetching each item on the pool."""
+    done = object()
+    iterator = iter(iterator)
+    while True:
+        item = await offload(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def streaming_content(request, iterator):
+    """
+    Body for a StreamingHttpResponse of an async view. Under ASGI Django
+    would read a sync iterator to the end before sending anything, so it
+    is wrapped in aiter_offloaded(); WSGI servers get it as it is.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return aiter_offloaded(iterator)
+    return iterator
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with `async def` handlers. Mirrors APIView.dispatch, awaiting
+    the handler and running the (possibly querying) initial checks in a
+    thread. Views returning large bodies set offload_render, so that
+    serializing them to JSON also counts against the offload pool.
+    """
+    offload_render = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            # OPTIONS (metadata) stays synchronous
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if self.offload_render and hasattr(self.response, 'render') and not self.response.is_rendered:
+            await offload(self.response.render)
+        return self.response
@@ -0,0 +1,261 @@
+"""
+Columnar binary sidecar for uploaded CSVs.
+
+Each dataset gets a `<file>.columns/` directory holding one `.npy` file per
+column, written in the same pass as the analytics. Numeric columns are
+float64, text columns (including EquipmentType) are dictionary-encoded as
+int32 codes plus a JSON list of categories. The sidecar stores the values
+as they are in the CSV: a Flowrate column holding text stays text, and
+only the analytics readers (ColumnarDataset.numbers) coerce it.
+`manifest.json` is written last, so a directory without it is treated as
+missing.
+"""
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+import pandas as pd
+
+SIDECAR_SUFFIX = '.columns'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Rows per block when a float64 column is re-encoded as a dictionary
+REENCODE_BLOCK_ROWS = 1_000_000
+
+# Fixed .npy header size so the shape can be rewritten once the row count is known
+NPY_HEADER_SIZE = 128
+
+
+def sidecar_path(file_path):
+    return f"{file_path}{SIDECAR_SUFFIX}"
+
+
+def remove_sidecar(file_path):
+    path = sidecar_path(file_path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class _NpyAppender:
+    """
+    Writes a 1-D .npy file incrementally. The header is padded to a fixed
+    size and rewritten with the final length on close().
+    """
+
+    def __init__(self, path, dtype):
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.file = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        header = repr({
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (self.length,),
+        })
+        magic = np.lib.format.magic(1, 0)
+        header_len = NPY_HEADER_SIZE - len(magic) - 2
+        header = header.ljust(header_len - 1) + '\n'
+        self.file.seek(0)
+        self.file.write(magic + struct.pack('<H', header_len) + header.encode('latin1'))
+
+    def append(self, values):
+        np.ascontiguousarray(values, dtype=self.dtype).tofile(self.file)
+        self.length += len(values)
+
+    def close(self):
+        self._write_header()
+        self.file.close()
+
+
+class ColumnarWriter:
+    """
+    Receives the normalised DataFrame chunks of one CSV and writes them as a
+    columnar sidecar.
+
+    `sources` maps each standard column name to its original CSV header.
+    Columns are stored as float64 if numeric in the first chunk and
+    dictionary-encoded otherwise; one that turns out to hold text in a later
+    chunk is re-encoded as a dictionary (the values written so far become
+    their number formatted as text).
+    """
+
+    def __init__(self, file_path, sources):
+        self.path = sidecar_path(file_path)
+        self.sources = sources
+        self.rows = 0
+        self.columns = []
+        self.categories = {}
+        remove_sidecar(file_path)
+        os.makedirs(self.path)
+
+    def _open_columns(self, df):
+        for i, name in enumerate(df.columns):
+            # Standard columns keep their normalised name on disk
+            file_name = name if name in self.sources else f"col_{i}"
+            numeric = pd.api.types.is_numeric_dtype(df[name])
+            column = {
+                "name": name,
+                "source": self.sources.get(name, name),
+                "file": file_name,
+                "encoding": "float64" if numeric else "dictionary",
+            }
+            if numeric:
+                column["integral"] = True
+                column["writer"] = _NpyAppender(os.path.join(self.path, f"{file_name}.npy"), 'float64')
+            else:
+                column["writer"] = _NpyAppender(os.path.join(self.path, f"{file_name}.codes.npy"), 'int32')
+                self.categories[name] = {}
+            self.columns.append(column)
+
+    def append(self, df):
+        if not self.columns:
+            self._open_columns(df)
+
+        for column in self.columns:
+            values = df[column["name"]]
+            if column["encoding"] == "float64":
+                numbers = pd.to_numeric(values, errors='coerce')
+                if (numbers.isna() & values.notna()).any():
+                    self._to_dictionary(column)
+                else:
+                    numbers = numbers.to_numpy(dtype='float64', na_value=np.nan)
+                    # Integral columns are handed back as int64 on read
+                    if column["integral"] and len(numbers):
+                        column["integral"] = bool(np.all(np.isfinite(numbers)) and np.all(np.mod(numbers, 1) == 0))
+                    column["writer"].append(numbers)
+            if column["encoding"] == "dictionary":
+                self._append_codes(column, values)
+
+        self.rows += len(df)
+
+    def _append_codes(self, column, values):
+        codes, uniques = pd.factorize(values)
+        lookup = self.categories[column["name"]]
+        mapping = np.array([lookup.setdefault(str(u), len(lookup)) for u in uniques], dtype=np.int32)
+        column["writer"].append(np.where(codes >= 0, mapping[codes] if len(mapping) else codes, -1))
+
+    def _to_dictionary(self, column):
+        """Rewrites a float64 column written so far as a dictionary-encoded one."""
+        column.pop("writer").close()
+        path = os.path.join(self.path, f"{column['file']}.npy")
+        integral = column.pop("integral")
+        column["encoding"] = "dictionary"
+        column["writer"] = _NpyAppender(os.path.join(self.path, f"{column['file']}.codes.npy"), 'int32')
+        self.categories[column["name"]] = {}
+
+        numbers = np.load(path, mmap_mode='r')
+        for start in range(0, len(numbers), REENCODE_BLOCK_ROWS):
+            block = pd.Series(numbers[start:start + REENCODE_BLOCK_ROWS])
+            if integral:
+                block = block.astype('int64')
+            self._append_codes(column, block.astype(str).where(block.notna()))
+        del numbers
+        os.remove(path)
+
+    def close(self):
+        manifest = {"version": MANIFEST_VERSION, "rows": self.rows, "columns": []}
+        for column in self.columns:
+            column.pop("writer").close()
+            if column["encoding"] == "dictionary":
+                with open(os.path.join(self.path, f"{column['file']}.categories.json"), 'w') as f:
+                    json.dump(list(self.categories[column["name"]]), f)
+            manifest["columns"].append(column)
+
+        with open(os.path.join(self.path, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f)
+
+    def abort(self):
+        for column in self.columns:
+            if "writer" in column:
+                column["writer"].file.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def load_manifest(file_path):
+    try:
+        with open(os.path.join(sidecar_path(file_path), MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+class ColumnarDataset:
+    """
+    Memory-mapped view of a sidecar. Columns are loaded lazily, so opening a
+    dataset only reads the manifest.
+    """
+
+    def __init__(self, file_path, manifest):
+        self.path = sidecar_path(file_path)
+        self.manifest = manifest
+        self.rows = manifest["rows"]
+        self.columns = {column["name"]: column for column in manifest["columns"]}
+        self._categories = {}
+        self._dtypes = {}
+
+    @classmethod
+    def open(cls, file_path):
+        manifest = load_manifest(file_path)
+        return cls(file_path, manifest) if manifest else None
+
+    def categories(self, name):
+        if name not in self._categories:
+            with open(os.path.join(self.path, f"{self.columns[name]['file']}.categories.json")) as f:
+                self._categories[name] = json.load(f)
+        return self._categories[name]
+
+    def dtype(self, name):
+        # Validating the categories is costly for high-cardinality columns,
+        # so it is done once rather than per chunk
+        if name not in self._dtypes:
+            self._dtypes[name] = pd.CategoricalDtype(self.categories(name))
+        return self._dtypes[name]
+
+    def array(self, name):
+        """Raw memory-mapped array (float64 values or int32 codes)."""
+        column = self.columns[name]
+        suffix = '.npy' if column["encoding"] == "float64" else '.codes.npy'
+        return np.load(os.path.join(self.path, f"{column['file']}{suffix}"), mmap_mode='r')
+
+    def numbers(self, name):
+        """
+        float64 array of a column for the analytics: memory-mapped if the
+        column is numeric, else its text coerced (invalid values -> NaN).
+        """
+        column = self.columns[name]
+        values = self.array(name)
+        if column["encoding"] == "float64":
+            return values
+        categories = pd.to_numeric(pd.Series(self.categories(name), dtype=object), errors='coerce')
+        # Code -1 (missing) picks the trailing NaN
+        lookup = np.append(categories.to_numpy(dtype='float64', na_value=np.nan), np.nan)
+        return lookup[values]
+
+    def series(self, name, start=0, stop=None):
+        column = self.columns[name]
+        values = self.array(name)[start:stop]
+        if column["encoding"] == "dictionary":
+            return pd.Series(pd.Categorical.from_codes(values, dtype=self.dtype(name)), name=name)
+        if column.get("integral"):
+            return pd.Series(values.astype('int64'), name=name)
+        return pd.Series(values, name=name, copy=False)
+
+    def frame(self, columns=None, start=0, stop=None, original_names=False):
+        names = columns or list(self.columns)
+        df = pd.DataFrame({name: self.series(name, start, stop) for name in names})
+        if original_names:
+            df.columns = [self.columns[name]["source"] for name in names]
+        return df
+
+    def chunks(self, chunksize, columns=None, original_names=False):
+        # An empty dataset still yields its (empty) header
+        for start in range(0, max(self.rows, 1), chunksize):
+            yield self.frame(columns, start, start + chunksize, original_names)
@@ -0,0 +1,106 @@
+"""
+Side-by-side comparison of datasets, answered from their stored aggregate
+state (StatsState, quantile sketches, fixed-width histograms) without
+reading any file. Datasets processed before that state existed are analysed
+on the fly, concurrently, and their state is stored for next time.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .histograms import FixedWidthHistogram, overlap
+from .sketches import QuantileSketch
+from .stats import OVERALL_KEY, StatsState
+from .utils import NUMERIC_COLUMNS, analyze_csv
+
+STATE_FIELDS = ['analytics_state', 'quantile_sketches', 'histograms']
+
+# Per-parameter fields compared across datasets (besides the percentiles)
+FIELDS = ['count', 'mean', 'std', 'min', 'max']
+
+
+def has_state(dataset):
+    return all(getattr(dataset, field) for field in STATE_FIELDS) and "fixed" in dataset.histograms
+
+
+def _analyze(dataset):
+    try:
+        summary, accumulator = analyze_csv(dataset.file.path)
+    except OSError as e:
+        raise ValueError(f"{dataset.dataset_name}: {e}")
+    if accumulator is None:
+        raise ValueError(f"{dataset.dataset_name}: {summary['error']}")
+    return {
+        "analytics_state": accumulator.stats.to_dict(),
+        "quantile_sketches": accumulator.sketch.to_dict(),
+        "histograms": accumulator.histograms(),
+    }
+
+
+def load_states(datasets):
+    """
+    Makes sure every dataset carries its aggregate state, analysing the ones
+    without it in parallel (ValueError if one cannot be analysed).
+    Returns the ids of the datasets that had to be analysed.
+    """
+    missing = [dataset for dataset in datasets if not has_state(dataset)]
+    if not missing:
+        return set()
+
+    with ThreadPoolExecutor(max_workers=min(len(missing), settings.ANALYTICS_WORKERS)) as pool:
+        states = list(pool.map(_analyze, missing))
+    for dataset, state in zip(missing, states):
+        for field, value in state.items():
+            setattr(dataset, field, value)
+        type(dataset).objects.filter(pk=dataset.pk).update(**state)
+    return {dataset.pk for dataset in missing}
+
+
+def _deltas(values, baseline):
+    """Difference of every value from the baseline's (None where either is missing)."""
+    base = values[baseline]
+    return [None if value is None or base is None else value - base for value in values]
+
+
+def compare(datasets, qs, baseline=0):
+    """
+    Aligned comparison of datasets (which must carry their state, see
+    load_states). For the overall data (OVERALL_KEY) and every EquipmentType
+    seen in any dataset, returns row counts and, per parameter, count, mean,
+    std, min, max and the requested quantiles as one list entry per dataset,
+    their deltas from datasets[baseline], and the histogram overlap with the
+    baseline. Entries are None where a dataset has no such data.
+    """
+    stats = [StatsState.from_dict(dataset.analytics_state) for dataset in datasets]
+    percentiles = [
+        QuantileSketch.from_dict(dataset.quantile_sketches).quantiles(qs, equipment_type='*')
+        for dataset in datasets
+    ]
+    histograms = [
+        FixedWidthHistogram.from_dict(dataset.histograms["fixed"]).histograms(equipment_type='*')
+        for dataset in datasets
+    ]
+
+    result = {}
+    types = [OVERALL_KEY] + list(dict.fromkeys(type_key for state in stats for type_key in state.types))
+    for type_key in types:
+        described = [state.describe(None if type_key == OVERALL_KEY else type_key) for state in stats]
+        first = NUMERIC_COLUMNS[0]
+        rows = [d[first]["count"] + d[first]["nulls"] if d else None for d in described]
+
+        parameters = {}
+        for parameter in NUMERIC_COLUMNS:
+            entry = {field: [d[parameter][field] if d else None for d in described] for field in FIELDS}
+            for q in qs:
+                entry[f"p{q * 100:g}"] = [p.get(type_key, {}).get(parameter, {}).get(q) for p in percentiles]
+            entry["delta"] = {field: _deltas(values, baseline) for field, values in entry.items() if field not in ('min', 'max')}
+
+            base = histograms[baseline].get(type_key, {}).get(parameter)
+            entry["overlap"] = [
+                overlap(base, h[type_key][parameter]) if base and parameter in h.get(type_key, {}) else None
+                for h in histograms
+            ]
+            parameters[parameter] = entry
+
+        result[type_key] = {"rows": rows, "delta": {"rows": _deltas(rows, baseline)}, "parameters": parameters}
+    return result
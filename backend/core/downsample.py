@@ -0,0 +1,80 @@
+"""
+Downsampling of (row index, value) series for trend charts, so the number
+of points sent and drawn depends on the chart width, not the dataset size.
+"""
+import numpy as np
+
+
+def _valid(values):
+    values = np.asarray(values, dtype='float64')
+    index = np.flatnonzero(~np.isnan(values))
+    return index, values[index]
+
+
+def minmax(values, max_points):
+    """
+    Min/max bucket downsampling: the series is cut into max_points // 2
+    equal buckets and the lowest and highest point of each is kept, in row
+    order. Peaks survive however many rows share a pixel.
+    Returns (index, values) of the kept points; NaN rows are skipped.
+    """
+    index, values = _valid(values)
+    if len(values) <= max_points:
+        return index, values
+
+    buckets = max(max_points // 2, 1)
+    size = -(-len(values) // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:len(values)] = values
+    grid = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    lows = offsets + np.where(np.isnan(grid), np.inf, grid).argmin(axis=1)
+    highs = offsets + np.where(np.isnan(grid), -np.inf, grid).argmax(axis=1)
+    # The last bucket may be partly padding, never all of it
+    keep = np.unique(np.concatenate([lows, highs]))
+    keep = keep[keep < len(values)]
+    return index[keep], values[keep]
+
+
+def lttb(values, max_points):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and, in
+    each of max_points - 2 buckets, the point forming the largest triangle
+    with the previously kept point and the mean of the next bucket.
+    Triangle areas are computed for a whole bucket at once.
+    Returns (index, values) of the kept points; NaN rows are skipped.
+    """
+    index, values = _valid(values)
+    n = len(values)
+    if n <= max_points or max_points < 3:
+        return index, values
+
+    x = index.astype('float64')
+    edges = np.linspace(1, n - 1, max_points - 1).astype('int64')
+    # Mean of every bucket, used as the third corner for the bucket before it
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(values[:n - 1], edges[:-1]) / counts
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, values[-1])
+
+    keep = np.empty(max_points, dtype='int64')
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], values[previous]
+        area = np.abs(
+            (ax - mean_x[bucket + 1]) * (values[start:stop] - ay)
+            - (ax - x[start:stop]) * (mean_y[bucket + 1] - ay)
+        )
+        previous = start + int(area.argmax())
+        keep[bucket + 1] = previous
+    return index[keep], values[keep]
+
+
+METHODS = {
+    'lttb': lttb,
+    'minmax': minmax,
+}
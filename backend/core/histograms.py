@@ -0,0 +1,306 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from .sketches import TypeIndex, _sum_by_key
+from .stats import OVERALL_KEY
+
+# A bin is stored as one int64 key: the histogram id (type, parameter) in the
+# high bits and the signed bin number (value // width) in the low 41 bits.
+HISTOGRAM_SHIFT = 41
+BIN_OFFSET = 1 << 40
+BIN_MASK = (1 << HISTOGRAM_SHIFT) - 1
+
+# Bin numbers stay below 2**40 however large the values are relative to
+# their spread (width is at least 2**-40 of the largest magnitude)
+MAGNITUDE_BITS = 40
+
+
+def _encode(histogram_ids, bins):
+    return (histogram_ids << HISTOGRAM_SHIFT) | (bins + BIN_OFFSET)
+
+
+def _decode(keys):
+    return keys >> HISTOGRAM_SHIFT, (keys & BIN_MASK) - BIN_OFFSET
+
+
+def _grow(array, size, fill):
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.full(size - len(array), fill, dtype=array.dtype)])
+
+
+class FixedWidthHistogram:
+    """
+    Mergeable equal-width histograms for every (EquipmentType, parameter)
+    pair plus an overall histogram per parameter.
+
+    Bin widths are powers of two, so every bin edge is a multiple of the
+    width and histograms built from different chunks line up exactly. When
+    the observed range outgrows `max_bins`, the width doubles and neighbouring
+    bins are added together; a histogram therefore always has between
+    max_bins / 2 and max_bins bins and its counts are exact.
+    """
+
+    def __init__(self, parameters, max_bins=64):
+        self.parameters = list(parameters)
+        self.max_bins = max_bins
+        self.type_index = TypeIndex()
+        self.keys = np.empty(0, dtype='int64')
+        self.counts = np.empty(0, dtype='int64')
+        # Per histogram id: bin width exponent and observed min/max
+        self.exponents = np.empty(0, dtype='int64')
+        self.lo = np.empty(0, dtype='float64')
+        self.hi = np.empty(0, dtype='float64')
+
+    @property
+    def types(self):
+        return self.type_index.types
+
+    def _required_exponents(self, lo, hi, exponents):
+        """Smallest exponents (>= the given ones) that fit [lo, hi] in max_bins."""
+        span = hi - lo
+        magnitude = np.maximum(np.maximum(np.abs(lo), np.abs(hi)), 1.0)
+        with np.errstate(divide='ignore'):
+            # A single repeated value gets a width proportional to its size
+            fit = np.ceil(np.log2(np.where(span > 0, span, magnitude) / self.max_bins))
+        floor = np.ceil(np.log2(magnitude)) - MAGNITUDE_BITS
+        exponents = np.maximum(exponents, np.fmax(fit, floor)).astype('int64')
+        # Edge alignment can still leave one bin too many
+        while True:
+            width = np.exp2(exponents.astype('float64'))
+            too_wide = np.floor(hi / width) - np.floor(lo / width) + 1 > self.max_bins
+            if not too_wide.any():
+                return exponents
+            exponents[too_wide] += 1
+
+    def _fit(self, ids, lo, hi, exponents):
+        """
+        Widens the histograms `ids` to cover [lo, hi] with at least the given
+        exponents, folding already stored bins when the width doubles.
+        """
+        size = int(ids.max()) + 1 if len(ids) else 0
+        self.exponents = _grow(self.exponents, size, np.iinfo('int64').min)
+        self.lo = _grow(self.lo, size, np.inf)
+        self.hi = _grow(self.hi, size, -np.inf)
+
+        lo = np.fmin(self.lo[ids], lo)
+        hi = np.fmax(self.hi[ids], hi)
+        old = self.exponents[ids]
+        new = self._required_exponents(lo, hi, np.maximum(old, exponents))
+
+        self.lo[ids], self.hi[ids] = lo, hi
+        self.exponents[ids] = new
+
+        grown = (old != np.iinfo('int64').min) & (new > old)
+        if grown.any():
+            # Stored bins can belong to histograms this call does not touch
+            shift = np.zeros(len(self.exponents), dtype='int64')
+            shift[ids[grown]] = new[grown] - old[grown]
+            histogram_ids, bins = _decode(self.keys)
+            self.keys, self.counts = _sum_by_key(_encode(histogram_ids, bins >> shift[histogram_ids]), self.counts)
+
+    def _add(self, keys, counts):
+        self.keys, self.counts = _sum_by_key(np.concatenate([self.keys, keys]), np.concatenate([self.counts, counts]))
+
+    def update(self, values, keys):
+        """
+        Adds one chunk. `values` holds the numeric columns (NaN skipped),
+        `keys` the EquipmentType of each row.
+        """
+        type_codes = self.type_index.encode(keys)
+        n = len(self.parameters)
+        all_ids, all_values = [], []
+        for parameter_code, parameter in enumerate(self.parameters):
+            x = values[parameter].to_numpy(dtype='float64', na_value=np.nan)
+            valid = np.isfinite(x)
+            x = x[valid]
+            codes = type_codes[valid]
+            typed = codes >= 0
+            # Every value lands in the overall histogram and, if typed, its type's one
+            all_ids += [np.full(len(x), parameter_code, dtype='int64'), codes[typed] * n + parameter_code]
+            all_values += [x, x[typed]]
+
+        histogram_ids = np.concatenate(all_ids)
+        x = np.concatenate(all_values)
+        if not len(x):
+            return self
+
+        extremes = pd.Series(x).groupby(histogram_ids).agg(['min', 'max'])
+        ids = extremes.index.to_numpy(dtype='int64')
+        self._fit(ids, extremes['min'].to_numpy(), extremes['max'].to_numpy(), np.iinfo('int64').min)
+
+        width = np.exp2(self.exponents[histogram_ids].astype('float64'))
+        bins = np.floor(x / width).astype('int64')
+        keys = _encode(histogram_ids, bins)
+        self._add(keys, np.ones(len(keys), dtype='int64'))
+        return self
+
+    def merge(self, other):
+        """Adds the bins of another histogram to this one (in place) and returns self."""
+        if other.parameters != self.parameters:
+            raise ValueError("Cannot merge histograms with different parameters")
+
+        n = len(self.parameters)
+        other_ids = np.flatnonzero(np.isfinite(other.lo))
+        if not len(other_ids):
+            return self
+
+        # Re-key the other histogram onto this one's type codes
+        type_map = self.type_index.encode(other.types)
+        id_map = np.zeros(len(other.lo), dtype='int64')
+        id_map[other_ids] = type_map[other_ids // n] * n + other_ids % n
+        ids = id_map[other_ids]
+        self._fit(ids, other.lo[other_ids], other.hi[other_ids], other.exponents[other_ids])
+
+        histogram_ids, bins = _decode(other.keys)
+        shift = self.exponents[id_map[histogram_ids]] - other.exponents[histogram_ids]
+        self._add(_encode(id_map[histogram_ids], bins >> shift), other.counts)
+        return self
+
+    def _groups(self):
+        """Start offset and size of every histogram in the sorted key array."""
+        histogram_ids = self.keys >> HISTOGRAM_SHIFT
+        starts = np.flatnonzero(np.r_[True, histogram_ids[1:] != histogram_ids[:-1]]) if len(histogram_ids) else histogram_ids
+        return histogram_ids[starts], starts, np.diff(np.r_[starts, len(self.keys)])
+
+    def histograms(self, parameter=None, equipment_type=None):
+        """
+        Returns {type: {parameter: {"edges": [...], "counts": [...]}}} with
+        len(edges) == len(counts) + 1 and empty bins included.
+        equipment_type=None means the overall histogram; '*' every type.
+        """
+        histogram_ids, starts, sizes = self._groups()
+        n = len(self.parameters)
+        selected = np.ones(len(histogram_ids), dtype=bool)
+        if equipment_type != '*':
+            type_code = self.type_index.get(OVERALL_KEY if equipment_type is None else str(equipment_type))
+            selected &= histogram_ids // n == (-1 if type_code is None else type_code)
+        if parameter is not None:
+            parameter_code = self.parameters.index(parameter) if parameter in self.parameters else -1
+            selected &= histogram_ids % n == parameter_code
+
+        _, bins = _decode(self.keys)
+        result = {}
+        for histogram_id, start, size in zip(histogram_ids[selected].tolist(), starts[selected].tolist(), sizes[selected].tolist()):
+            first, last = bins[start], bins[start + size - 1]
+            counts = np.zeros(last - first + 1, dtype='int64')
+            counts[bins[start:start + size] - first] = self.counts[start:start + size]
+            width = math.ldexp(1.0, int(self.exponents[histogram_id]))
+            edges = np.arange(first, last + 2, dtype='float64') * width
+            result.setdefault(self.types[histogram_id // n], {})[self.parameters[histogram_id % n]] = {
+                "edges": edges.tolist(),
+                "counts": counts.tolist(),
+            }
+        return result
+
+    def totals(self):
+        """Value count of every histogram as {(type, parameter): count}."""
+        histogram_ids, starts, sizes = self._groups()
+        n = len(self.parameters)
+        totals = np.add.reduceat(self.counts, starts) if len(starts) else starts
+        return {
+            (self.types[histogram_id // n], self.parameters[histogram_id % n]): total
+            for histogram_id, total in zip(histogram_ids.tolist(), totals.tolist())
+        }
+
+    def extremes(self, labels):
+        """Exact (min, max) arrays for a list of (type, parameter) labels."""
+        n = len(self.parameters)
+        ids = np.array([
+            self.type_index.get(type_key) * n + self.parameters.index(parameter_key)
+            for type_key, parameter_key in labels
+        ], dtype='int64')
+        return self.lo[ids], self.hi[ids]
+
+    def to_dict(self):
+        """
+        JSON-friendly representation. Bins are stored per histogram (ids and
+        sizes) with small bin numbers instead of packed keys, to keep it compact.
+        """
+        histogram_ids, _, sizes = self._groups()
+        _, bins = _decode(self.keys)
+        return {
+            "version": 1,
+            "max_bins": self.max_bins,
+            "parameters": self.parameters,
+            "types": self.types,
+            "ids": histogram_ids.tolist(),
+            "sizes": sizes.tolist(),
+            "bins": bins.tolist(),
+            "counts": self.counts.tolist(),
+            "exponents": self.exponents.tolist(),
+            "lo": [None if not np.isfinite(v) else v for v in self.lo.tolist()],
+            "hi": [None if not np.isfinite(v) else v for v in self.hi.tolist()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["parameters"], data["max_bins"])
+        histogram.type_index = TypeIndex(data["types"])
+        histogram_ids = np.repeat(np.asarray(data["ids"], dtype='int64'), np.asarray(data["sizes"], dtype='int64'))
+        histogram.keys = _encode(histogram_ids, np.asarray(data["bins"], dtype='int64'))
+        histogram.counts = np.asarray(data["counts"], dtype='int64')
+        histogram.exponents = np.asarray(data["exponents"], dtype='int64')
+        histogram.lo = np.array(data["lo"], dtype='float64')
+        histogram.hi = np.array(data["hi"], dtype='float64')
+        # Histograms never updated have no range yet
+        histogram.lo[np.isnan(histogram.lo)] = np.inf
+        histogram.hi[np.isnan(histogram.hi)] = -np.inf
+        return histogram
+
+
+def overlap(a, b):
+    """
+    Overlap coefficient of two fixed-width histograms (histograms() entries):
+    the area shared by the two normalised distributions, 1.0 for identical
+    shapes and 0.0 for disjoint ones. Bin widths are powers of two, so the
+    finer histogram nests exactly into the bins of the coarser one.
+    """
+    width = max(a["edges"][1] - a["edges"][0], b["edges"][1] - b["edges"][0])
+
+    def density(histogram):
+        step = histogram["edges"][1] - histogram["edges"][0]
+        first = int(round(histogram["edges"][0] / step))
+        bins = (first + np.arange(len(histogram["counts"]))) // int(round(width / step))
+        counts = np.asarray(histogram["counts"], dtype='float64')
+        return bins, counts / counts.sum()
+
+    bins_a, density_a = density(a)
+    bins_b, density_b = density(b)
+    lo = min(bins_a[0], bins_b[0])
+    size = max(bins_a[-1], bins_b[-1]) - lo + 1
+    density_a = np.bincount(bins_a - lo, weights=density_a, minlength=size)
+    density_b = np.bincount(bins_b - lo, weights=density_b, minlength=size)
+    return float(np.minimum(density_a, density_b).sum())
+
+
+def quantile_bins(histogram, sketch, bins):
+    """
+    Equal-frequency histograms: `bins` bins per (type, parameter) whose edges
+    are the sketch quantiles, with the outer edges set to the exact min/max.
+    Returns {type: {parameter: {"edges": [...], "counts": [...]}}}.
+
+    The counts are the nominal share of each bin (total / bins, rounded),
+    not counted from the data: the values within a sketch's relative error
+    of an edge may fall on either side of it.
+    """
+    labels, edges = sketch.quantile_table(np.linspace(0, 1, bins + 1), equipment_type='*')
+    if not labels:
+        return {}
+    lo, hi = histogram.extremes(labels)
+    # Sketch quantiles are approximate and may land just outside the exact
+    # range; keep the edges inside it and non-decreasing
+    edges = np.maximum.accumulate(np.clip(edges, lo[:, None], hi[:, None]), axis=1)
+    edges[:, 0], edges[:, -1] = lo, hi
+    totals = histogram.totals()
+    total = np.array([totals.get(label, 0) for label in labels], dtype='int64')
+    # Counts follow the rank boundaries, so they always add up to the total
+    boundaries = np.round(np.linspace(0, 1, bins + 1)[None, :] * total[:, None]).astype('int64')
+    counts = np.diff(boundaries, axis=1)
+
+    result = {}
+    for (type_key, parameter_key), row_edges, row_counts in zip(labels, edges.tolist(), counts.tolist()):
+        result.setdefault(type_key, {})[parameter_key] = {"edges": row_edges, "counts": row_counts}
+    return result
@@ -0,0 +1,143 @@
+"""
+SQL query instrumentation: how many queries a request (or any block of
+code) runs, how long they take and which are the slowest.
+
+QueryRecorder hooks into connection.execute_wrapper, so it works with
+DEBUG off. QueryInstrumentationMiddleware records every request, adds a
+Server-Timing header in DEBUG and checks the view's entry in QUERY_BUDGETS;
+with QUERY_BUDGET_STRICT on (e.g. in tests) an exceeded budget raises
+QueryBudgetExceeded instead of being logged. query_budget() does the same
+check for a block of code.
+
+Under ASGI, Django runs the ORM work of a request (sync views, async ORM
+calls, sync_to_async) on one thread per request, so the middleware installs
+its wrapper on that thread's connection.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    """
+    Context manager recording the queries run on one database connection
+    (of the current thread): count, total duration in seconds and the
+    `keep` slowest as (duration, sql) pairs, slowest first.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, keep=5):
+        self.using = using
+        self.keep = keep
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if len(self.slowest) < self.keep or elapsed > self.slowest[-1][0]:
+                self.slowest.append((elapsed, sql))
+                self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+                del self.slowest[self.keep:]
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def report(self):
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f} ms"]
+        lines += [f"  {duration * 1000:.1f} ms: {sql}" for duration, sql in self.slowest]
+        return '\n'.join(lines)
+
+    def server_timing(self, total=None):
+        """Server-Timing header value: db time and count, the slowest queries and the total."""
+        metrics = [f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"']
+        for position, (duration, sql) in enumerate(self.slowest[:3], 1):
+            # Header values must stay on one line and inside the quotes
+            desc = ' '.join(sql.split()).replace('"', "'").replace('\\', '/')[:120]
+            metrics.append(f'sql-{position};dur={duration * 1000:.2f};desc="{desc}"')
+        if total is not None:
+            metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def query_budget(max_queries, using=DEFAULT_DB_ALIAS):
+    """
+    Raises QueryBudgetExceeded if the block runs more than `max_queries`
+    queries, e.g. in a test:
+
+        with query_budget(3):
+            client.get('/api/history/')
+    """
+    with QueryRecorder(using, keep=max_queries + 1) as recorder:
+        yield recorder
+    if recorder.count > max_queries:
+        raise QueryBudgetExceeded(f"Query budget of {max_queries} exceeded: {recorder.report()}")
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the queries of every request. Adds Server-Timing in DEBUG and
+    enforces QUERY_BUDGETS ({url name: max queries}) for the matched view.
+    Queries run while a streaming response is being sent are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.check(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.check(request, response, recorder, time.perf_counter() - start)
+
+    def check(self, request, response, recorder, total):
+        if settings.DEBUG:
+            response['Server-Timing'] = recorder.server_timing(total)
+
+        match = request.resolver_match
+        budget = settings.QUERY_BUDGETS.get(match.url_name) if match else None
+        if budget is not None and recorder.count > budget:
+            message = f"{request.method} {request.path} ({match.url_name}) exceeded its query budget of {budget}: {recorder.report()}"
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
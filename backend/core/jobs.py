@@ -0,0 +1,157 @@
+"""
+Background processing of uploads.
+
+ProcessingJob rows are the queue: enqueue() creates one and hands its id to
+a local thread pool, and the process_jobs management command drains any
+that are left over (e.g. after a restart). A worker claims a job with a
+conditional UPDATE, so a job runs once even if several workers see it.
+
+Housekeeping (sidecars, report pregeneration, file sweeps) runs on a pool
+of its own, so it never holds up the jobs.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .models import ProcessingJob, UploadedDataset
+from .reports import pregenerate_report
+from .utils import analyze_csv
+
+# Minimum change in progress between two database writes
+PROGRESS_STEP = 0.01
+
+# Pool name -> setting with its number of threads
+POOL_WORKERS = {'analytics': 'ANALYTICS_WORKERS', 'housekeeping': 'HOUSEKEEPING_WORKERS'}
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def _get_executor(pool):
+    with _executor_lock:
+        if pool not in _executors:
+            workers = getattr(settings, POOL_WORKERS[pool])
+            _executors[pool] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=pool)
+        return _executors[pool]
+
+
+def submit(fn, *args, pool='analytics'):
+    """Runs fn(*args) on the given pool once the current transaction commits."""
+    def task():
+        close_old_connections()
+        try:
+            return fn(*args)
+        finally:
+            connections.close_all()
+
+    transaction.on_commit(lambda: _get_executor(pool).submit(task))
+
+
+def submit_housekeeping(fn, *args):
+    """submit() on the housekeeping pool."""
+    submit(fn, *args, pool='housekeeping')
+
+
+def process_dataset(dataset, progress=None):
+    """
+    Runs the analytics pass for a saved dataset and stores the summary and
+    mergeable state on it. Returns the summary (with an "error" key on failure).
+    """
+    summary, accumulator = analyze_csv(dataset.file.path, write_sidecar=True, progress=progress)
+    return store_analytics(dataset, summary, accumulator)
+
+
+def store_analytics(dataset, summary, accumulator):
+    """
+    Saves the results of an analytics pass (see analyze_csv) on `dataset`
+    and returns its summary_data.
+    """
+    if accumulator:
+        dataset.analytics_state = accumulator.stats.to_dict()
+        dataset.quantile_sketches = accumulator.sketch.to_dict()
+        dataset.histograms = accumulator.histograms()
+
+    state = ProcessingJob.FAILED if "error" in summary else ProcessingJob.DONE
+    dataset.summary_data = {**summary, "status": state}
+    # An update, not save(): a dataset deleted during the pass (e.g. by
+    # retention) must not be inserted again
+    stored = UploadedDataset.objects.filter(pk=dataset.pk).update(
+        summary_data=dataset.summary_data,
+        analytics_state=dataset.analytics_state,
+        quantile_sketches=dataset.quantile_sketches,
+        histograms=dataset.histograms,
+    )
+    if stored and state == ProcessingJob.DONE and settings.REPORT_PREGENERATE:
+        submit_housekeeping(pregenerate_report, dataset.pk)
+    return dataset.summary_data
+
+
+def enqueue(dataset):
+    """Queues the analytics of `dataset` and returns the job."""
+    dataset.summary_data = {"status": ProcessingJob.QUEUED}
+    dataset.save(update_fields=['summary_data'])
+    job = ProcessingJob.objects.create(dataset=dataset)
+    # Only hand the job to a worker once the row is visible to other connections
+    submit(run_job, job.pk)
+    return job
+
+
+def run_job(job_id):
+    """Claims and runs one queued job. Returns False if it was already claimed."""
+    close_old_connections()
+    try:
+        claimed = ProcessingJob.objects.filter(pk=job_id, state=ProcessingJob.QUEUED).update(
+            state=ProcessingJob.RUNNING, started_at=timezone.now()
+        )
+        if not claimed:
+            return False
+
+        job = ProcessingJob.objects.select_related('dataset').get(pk=job_id)
+        dataset = job.dataset
+        UploadedDataset.objects.filter(pk=dataset.pk).update(summary_data={"status": ProcessingJob.RUNNING})
+
+        reported = [0.0]
+
+        def report(fraction):
+            if fraction - reported[0] >= PROGRESS_STEP:
+                reported[0] = fraction
+                ProcessingJob.objects.filter(pk=job_id).update(progress=fraction)
+
+        try:
+            summary = process_dataset(dataset, progress=report)
+        except Exception as e:
+            summary = {"error": str(e), "status": ProcessingJob.FAILED}
+            UploadedDataset.objects.filter(pk=dataset.pk).update(summary_data=summary)
+
+        failed = summary["status"] == ProcessingJob.FAILED
+        ProcessingJob.objects.filter(pk=job_id).update(
+            state=summary["status"],
+            progress=reported[0] if failed else 1.0,
+            error=summary.get("error", ""),
+            finished_at=timezone.now(),
+        )
+        return True
+    finally:
+        # Worker threads keep their own connections; don't leave them open
+        connections.close_all()
+
+
+def requeue_stale():
+    """
+    Puts RUNNING jobs back in the queue. Only safe when no worker is running,
+    i.e. at startup after a crash or restart.
+    """
+    return ProcessingJob.objects.filter(state=ProcessingJob.RUNNING).update(
+        state=ProcessingJob.QUEUED, progress=0.0, started_at=None
+    )
+
+
+def drain_queue():
+    """Runs every queued job in the current thread; returns how many ran."""
+    processed = 0
+    for job_id in list(ProcessingJob.objects.filter(state=ProcessingJob.QUEUED).values_list('pk', flat=True)):
+        processed += run_job(job_id)
+    return processed
@@ -0,0 +1,28 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from core.resumable import expire_sessions
+from core.retention import apply_retention, sweep_orphans
+
+
+class Command(BaseCommand):
+    help = "Applies the dataset retention policy to every user, removes orphaned files and expires idle upload sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=3600,
+                            help="Leave unreferenced files younger than this many seconds.")
+        parser.add_argument('--watch', action='store_true', help="Keep running (e.g. for age-based retention).")
+        parser.add_argument('--interval', type=float, default=3600.0, help="Seconds between runs with --watch.")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = sum(apply_retention(user) for user in User.objects.filter(datasets__isnull=False).distinct())
+            removed = sweep_orphans(grace=options['grace'])
+            expired = expire_sessions()
+            if deleted or removed or expired:
+                self.stdout.write(f"Deleted {deleted} dataset(s), removed {removed} orphaned path(s), expired {expired} upload session(s)")
+            if not options['watch']:
+                break
+            time.sleep(options['interval'])
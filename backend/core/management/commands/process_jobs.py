@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import drain_queue, requeue_stale
+
+
+class Command(BaseCommand):
+    help = "Runs queued upload analytics jobs (e.g. those left over after a restart)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help="Requeue jobs stuck in 'running' first (only when no server is processing jobs).")
+        parser.add_argument('--watch', action='store_true', help="Keep polling for new jobs.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Polling interval in seconds with --watch.")
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            self.stdout.write(f"Requeued {requeue_stale()} running job(s)")
+
+        while True:
+            processed = drain_queue()
+            if processed:
+                self.stdout.write(f"Processed {processed} job(s)")
+            if not options['watch']:
+                break
+            time.sleep(options['interval'])
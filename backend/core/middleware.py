@@ -0,0 +1,151 @@
+import re
+import zlib
+
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+from .aio import offload
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+# Already compressed formats are sent as they are
+UNCOMPRESSED_TYPES = {'application/pdf', 'application/zip'}
+
+# Under ASGI, bodies (or stream chunks) of this many bytes or more are
+# compressed on the offload pool instead of the event loop
+OFFLOAD_MIN_BYTES = 64 * 1024
+
+
+def _weaken_etag(response):
+    # The body changes with the encoding, so a strong ETag has to become weak
+    # (as GZipMiddleware does); If-None-Match still matches it
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+
+
+class _GzipCompressor:
+    """Incremental gzip with the process()/finish() interface of brotli.Compressor."""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Negotiated response compression: brotli when the client accepts it and
+    the brotli package is installed, gzip otherwise (as GZipMiddleware).
+
+    Under ASGI nothing is compressed in process_response, which Django would
+    run on its single thread for sync code: large bodies are compressed on
+    the offload pool (core.aio), and streams lazily, chunk by chunk as they
+    are sent.
+    """
+    brotli_quality = 5
+    # Random bytes in the gzip header, as GZipMiddleware (BREACH mitigation)
+    max_random_bytes = 100
+
+    def negotiate(self, request, response):
+        """Encoding to compress `response` with ('br' or 'gzip'), or None."""
+        if response.get('Content-Type', '').split(';')[0].strip() in UNCOMPRESSED_TYPES:
+            return None
+        # Not worth it for really short responses
+        if not response.streaming and len(response.content) < 200:
+            return None
+        if response.has_header('Content-Encoding'):
+            return None
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and re_accepts_brotli.search(accept):
+            return 'br'
+        if re_accepts_gzip.search(accept):
+            return 'gzip'
+        return None
+
+    def compress(self, encoding, content):
+        if encoding == 'br':
+            return brotli.compress(content, quality=self.brotli_quality)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def compressor(self, encoding):
+        if encoding == 'br':
+            return brotli.Compressor(quality=self.brotli_quality)
+        return _GzipCompressor()
+
+    def process_response(self, request, response):
+        encoding = self.negotiate(request, response)
+        if encoding is None:
+            return response
+        if response.streaming:
+            return self.compress_stream(response, encoding)
+        return self.set_content(response, encoding, self.compress(encoding, response.content))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        encoding = self.negotiate(request, response)
+        if encoding is None:
+            return response
+        if response.streaming:
+            return self.compress_stream(response, encoding)
+        if len(response.content) >= OFFLOAD_MIN_BYTES:
+            compressed = await offload(self.compress, encoding, response.content)
+        else:
+            compressed = self.compress(encoding, response.content)
+        return self.set_content(response, encoding, compressed)
+
+    def set_content(self, response, encoding, compressed):
+        # Only if it is actually shorter
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        return self.set_encoding(response, encoding)
+
+    def compress_stream(self, response, encoding):
+        if response.is_async:
+            response.streaming_content = self._acompress_sequence(response.streaming_content, encoding)
+        elif encoding == 'gzip':
+            response.streaming_content = compress_sequence(response.streaming_content, max_random_bytes=self.max_random_bytes)
+        else:
+            response.streaming_content = self._compress_sequence(response.streaming_content, encoding)
+        # The compressed size is only known once it has been sent
+        del response.headers['Content-Length']
+        return self.set_encoding(response, encoding)
+
+    def set_encoding(self, response, encoding):
+        _weaken_etag(response)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress_sequence(self, sequence, encoding):
+        compressor = self.compressor(encoding)
+        for chunk in sequence:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    async def _acompress_sequence(self, sequence, encoding):
+        compressor = self.compressor(encoding)
+        async for chunk in sequence:
+            if len(chunk) >= OFFLOAD_MIN_BYTES:
+                data = await offload(compressor.process, chunk)
+            else:
+                data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
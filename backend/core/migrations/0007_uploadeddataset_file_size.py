@@ -0,0 +1,33 @@
+import os
+
+from django.db import migrations, models
+
+
+def fill_file_sizes(apps, schema_editor):
+    UploadedDataset = apps.get_model('core', 'UploadedDataset')
+    for dataset in UploadedDataset.objects.filter(file_size=0).exclude(file=''):
+        try:
+            dataset.file_size = os.path.getsize(dataset.file.path)
+        except OSError:
+            continue
+        dataset.save(update_fields=['file_size'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_uploadeddataset_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddataset',
+            name='file_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddataset',
+            index=models.Index(fields=['user', 'upload_timestamp'], name='dataset_user_uploaded_idx'),
+        ),
+        migrations.RunPython(fill_file_sizes, migrations.RunPython.noop),
+    ]
@@ -1,32 +1,112 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
-import os
 
 class UploadedDataset(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='datasets')
     dataset_name = models.CharField(max_length=255)
     file = models.FileField(upload_to='datasets/')
+    # Bytes of the stored file, for the per-user storage limit (see core.retention)
+    file_size = models.BigIntegerField(default=0)
+    # SHA-256 of the file; identical uploads share one stored file
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
     upload_timestamp = models.DateTimeField(auto_now_add=True)
     summary_data = models.JSONField(blank=True, null=True)
+    # Mergeable per-column statistics (see core.stats.StatsState)
+    analytics_state = models.JSONField(blank=True, null=True)
+    # Per-type quantile sketches (see core.sketches.QuantileSketch)
+    quantile_sketches = models.JSONField(blank=True, null=True)
+    # Precomputed histograms (see core.histograms)
+    histograms = models.JSONField(blank=True, null=True)
 
     class Meta:
         ordering = ['-upload_timestamp']
+        indexes = [
+            # Retention and history scan a user's datasets newest first
+            models.Index(fields=['user', 'upload_timestamp'], name='dataset_user_uploaded_idx'),
+        ]
+
+    @classmethod
+    def find_processed(cls, content_hash, lock=False):
+        """
+        Latest successfully analysed dataset with this content, if any. With
+        lock=True (inside a transaction) its row stays locked until commit,
+        so it cannot be deleted, and its file swept, before a dataset that
+        shares the file is saved.
+        """
+        if not content_hash:
+            return None
+        queryset = cls.objects.filter(content_hash=content_hash, summary_data__status='done')
+        if lock:
+            queryset = queryset.select_for_update()
+        return queryset.order_by('-upload_timestamp').first()
 
     def save(self, *args, **kwargs):
-        # Retention Logic: Limit to last 5 uploads per user
-        if not self.pk:  # Only on creation
-            user_datasets = UploadedDataset.objects.filter(user=self.user).order_by('upload_timestamp')
-            if user_datasets.count() >= 5:
-                # Delete the oldest one
-                oldest_dataset = user_datasets.first()
-                if oldest_dataset:
-                    # Delete actual file from system
-                    if oldest_dataset.file:
-                        if os.path.isfile(oldest_dataset.file.path):
-                            os.remove(oldest_dataset.file.path)
-                    oldest_dataset.delete()
-        
+        # Retention is applied after the upload by core.retention
+        if self.file and not self.file_size:
+            self.file_size = self.file.size
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.dataset_name} ({self.user.username})"
+
+
+class ProcessingJob(models.Model):
+    """
+    Analytics run for an uploaded dataset. The table doubles as the job
+    queue: workers claim QUEUED rows (see core.jobs).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    dataset = models.OneToOneField(UploadedDataset, on_delete=models.CASCADE, related_name='job')
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=QUEUED, db_index=True)
+    progress = models.FloatField(default=0.0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Job {self.pk} for dataset {self.dataset_id} ({self.state})"
+
+
+class UploadSession(models.Model):
+    """
+    Resumable upload in progress (see core.resumable). The `received`
+    bytes so far are stored in `file_name`; the analytics state saved with
+    the last checkpoint covers the first `parsed` of them, so a session
+    survives a server restart.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    dataset_name = models.CharField(max_length=255)
+    # Name of the CSV once uploaded, and the storage name of the partial file
+    original_name = models.CharField(max_length=255)
+    file_name = models.CharField(max_length=255)
+    # Total bytes announced by the client, if known
+    size = models.BigIntegerField(blank=True, null=True)
+    received = models.BigIntegerField(default=0)
+    parsed = models.BigIntegerField(default=0)
+    # core.utils.SummaryAccumulator.to_dict()
+    analytics_state = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Upload {self.pk} of {self.dataset_name} ({self.received} bytes)"
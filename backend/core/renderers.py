@@ -0,0 +1,152 @@
+"""
+Renderers for the dataset data endpoint.
+
+The columnar renderers take {"rows": n, "columns": [...]} where every
+column is {"name", "dtype": "float64" | "int64", "values": ndarray} or
+{"name", "dtype": "dictionary", "codes": int32 ndarray (-1 = missing),
+"categories": [...]} (see core.utils.load_dataset_columns). Anything else,
+e.g. an error, is rendered as plain JSON.
+"""
+import json
+import struct
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Arrow IPC is optional
+    pyarrow = None
+
+
+def _is_columnar(data):
+    return isinstance(data, dict) and "columns" in data and "rows" in data
+
+
+def _json_bytes(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON. Views stream rows themselves (see
+    DatasetDataView); this renders anything else, e.g. errors, as one line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, separators=(',', ':')) + '\n').encode(self.charset)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    One JSON array per column instead of one object per row; text columns
+    are sent as integer codes plus their categories. NaN becomes null.
+    """
+    media_type = 'application/vnd.equipment.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if _is_columnar(data):
+            columns = []
+            for column in data["columns"]:
+                column = dict(column)
+                if column["dtype"] == "dictionary":
+                    column["codes"] = column["codes"].tolist()
+                elif column["dtype"] == "float64":
+                    values = column["values"]
+                    column["values"] = np.where(np.isnan(values), None, values).tolist()
+                else:
+                    column["values"] = column["values"].tolist()
+                columns.append(column)
+            data = {"rows": data["rows"], "columns": columns}
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+# Binary column layout: MAGIC, uint32 header length, JSON header, then each
+# column buffer (little endian) at an 8-byte aligned offset from the data
+# start, which is the first 8-byte boundary after the header. Clients can
+# wrap every buffer with numpy.frombuffer without copying.
+COLUMNS_MAGIC = b'EQCOLS1\n'
+
+
+def _align(offset):
+    return -(-offset // 8) * 8
+
+
+class NumpyColumnsRenderer(BaseRenderer):
+    """Raw little-endian column buffers with a JSON header (see COLUMNS_MAGIC)."""
+    media_type = 'application/vnd.equipment.columns'
+    format = 'npcols'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not _is_columnar(data):
+            return _json_bytes(data)
+
+        header = {"rows": data["rows"], "columns": []}
+        buffers = []
+        offset = 0
+        for column in data["columns"]:
+            if column["dtype"] == "dictionary":
+                values = np.ascontiguousarray(column["codes"], dtype='<i4')
+                entry = {"name": column["name"], "dtype": "<i4", "categories": column["categories"]}
+            else:
+                values = np.ascontiguousarray(column["values"], dtype='<f8' if column["dtype"] == "float64" else '<i8')
+                entry = {"name": column["name"], "dtype": values.dtype.str}
+            offset = _align(offset)
+            entry.update(offset=offset, length=len(values))
+            header["columns"].append(entry)
+            buffers.append((offset, values))
+            offset += values.nbytes
+
+        header = _json_bytes(header)
+        start = _align(len(COLUMNS_MAGIC) + 4 + len(header))
+        body = bytearray(start + _align(offset))
+        body[:len(COLUMNS_MAGIC)] = COLUMNS_MAGIC
+        body[len(COLUMNS_MAGIC):len(COLUMNS_MAGIC) + 4] = struct.pack('<I', len(header))
+        body[len(COLUMNS_MAGIC) + 4:len(COLUMNS_MAGIC) + 4 + len(header)] = header
+        for column_offset, values in buffers:
+            body[start + column_offset:start + column_offset + values.nbytes] = values.tobytes()
+        return bytes(body)
+
+
+class ArrowStreamRenderer(BaseRenderer):
+    """Arrow IPC stream; text columns become dictionary arrays. Needs pyarrow."""
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not _is_columnar(data):
+            return _json_bytes(data)
+
+        arrays = []
+        for column in data["columns"]:
+            if column["dtype"] == "dictionary":
+                codes = np.asarray(column["codes"])
+                indices = pyarrow.array(codes, mask=codes < 0, type=pyarrow.int32())
+                arrays.append(pyarrow.DictionaryArray.from_arrays(indices, pyarrow.array(column["categories"], pyarrow.string())))
+            else:
+                arrays.append(pyarrow.array(column["values"], from_pandas=True))
+        table = pyarrow.Table.from_arrays(arrays, names=[column["name"] for column in data["columns"]])
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+# Extra formats offered by the data endpoint (Arrow only if pyarrow is installed)
+DATA_RENDERERS = [NDJSONRenderer, ColumnarJSONRenderer, NumpyColumnsRenderer]
+if pyarrow is not None:
+    DATA_RENDERERS.append(ArrowStreamRenderer)
+
+COLUMNAR_FORMATS = {renderer.format for renderer in DATA_RENDERERS if renderer is not NDJSONRenderer}
@@ -0,0 +1,272 @@
+"""
+On-disk cache of generated PDF reports.
+
+A report is stored as `<dataset id>-<digest>.pdf` in REPORT_CACHE_DIR, where
+the digest covers summary_data and REPORT_TEMPLATE_VERSION, so a changed
+summary or template never serves a stale file. The directory is kept under
+REPORT_CACHE_MAX_BYTES by evicting the least recently used reports (file
+mtime is bumped on every hit).
+
+Batches of reports are rendered in a process pool whose workers build the
+ReportLab styles once (report_theme) and reuse them for every report.
+"""
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .utils import generate_pdf_report, render_pdf_report, report_context, report_theme
+
+try:
+    import pypdf
+except ImportError:  # Optional: needed to combine reports into one PDF
+    pypdf = None
+
+# Bump whenever generate_pdf_report changes its output
+REPORT_TEMPLATE_VERSION = 1
+
+
+def report_path(dataset):
+    payload = json.dumps(dataset.summary_data, sort_keys=True, default=str)
+    digest = hashlib.sha256(f"{REPORT_TEMPLATE_VERSION}:{payload}".encode()).hexdigest()[:20]
+    return os.path.join(settings.REPORT_CACHE_DIR, f"{dataset.pk}-{digest}.pdf")
+
+
+def get_report(dataset):
+    """Path of the cached report for `dataset`, generating it on a miss."""
+    path = report_path(dataset)
+    try:
+        # Mark as recently used
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    _store(path, generate_pdf_report(dataset).getbuffer())
+    return path
+
+
+def _store(path, data):
+    os.makedirs(settings.REPORT_CACHE_DIR, exist_ok=True)
+    # Write under a temporary name so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=settings.REPORT_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    enforce_cache_size(keep=path)
+
+
+def remove_reports(dataset_id):
+    """Evicts every cached report of a dataset."""
+    for path in glob.glob(os.path.join(settings.REPORT_CACHE_DIR, f"{dataset_id}-*.pdf")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def enforce_cache_size(keep=None):
+    """Deletes least recently used reports until the cache fits REPORT_CACHE_MAX_BYTES."""
+    entries = []
+    for path in glob.glob(os.path.join(settings.REPORT_CACHE_DIR, '*.pdf')):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= settings.REPORT_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def pregenerate_report(dataset_id):
+    """Background task: renders the report of a processed dataset into the cache."""
+    from .models import UploadedDataset
+
+    dataset = UploadedDataset.objects.select_related('user').filter(pk=dataset_id).first()
+    if dataset is None or not dataset.summary_data or "error" in dataset.summary_data:
+        return None
+    return get_report(dataset)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Each worker builds the report styles once, up front
+            _pool = ProcessPoolExecutor(max_workers=settings.REPORT_WORKERS, initializer=report_theme)
+        return _pool
+
+
+def _render(context):
+    return render_pdf_report(context).getvalue()
+
+
+def render_reports(datasets):
+    """
+    Yields (dataset, pdf bytes) for every dataset as soon as its report is
+    ready: cached reports first, the rest as the process pool finishes them.
+    Freshly rendered reports are added to the cache.
+    """
+    pending = []
+    for dataset in datasets:
+        path = report_path(dataset)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            pending.append(dataset)
+            continue
+        yield dataset, data
+
+    if not pending:
+        return
+    if len(pending) == 1 or settings.REPORT_WORKERS < 2:
+        for dataset in pending:
+            data = _render(report_context(dataset))
+            _store(report_path(dataset), data)
+            yield dataset, data
+        return
+
+    global _pool
+    pool = _get_pool()
+    try:
+        futures = {pool.submit(_render, report_context(dataset)): dataset for dataset in pending}
+        for future in as_completed(futures):
+            dataset = futures[future]
+            data = future.result()
+            _store(report_path(dataset), data)
+            yield dataset, data
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool next time
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def report_filename(dataset):
+    return f"report_{dataset.id}.pdf"
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink that hands out whatever zipfile has written so far."""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_reports_zip(datasets):
+    """Streams a ZIP with one report per dataset, entries in completion order."""
+    stream = _ZipStream()
+    # zipfile falls back to data descriptors on an unseekable stream
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for dataset, data in render_reports(datasets):
+            archive.writestr(report_filename(dataset), data)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def _render_cover(entries, first_page):
+    """Cover page listing every report and the page it starts on."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    theme = report_theme()
+    styles = theme["styles"]
+    rows = [["Dataset", "Uploaded by", "Date", "Page"]]
+    page = first_page
+    for context, pages in entries:
+        rows.append([Paragraph(context["dataset_name"], styles['Normal']), context["username"], context["date"], str(page)])
+        page += pages
+
+    table = Table(rows, colWidths=[3.5*inch, 1.6*inch, 1.2*inch, 0.7*inch], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), theme["deep_purple"]),
+        ('TEXTCOLOR', (0, 0), (-1, 0), theme["whitesmoke"]),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('LINEBELOW', (0, 1), (-1, -1), 0.5, colors.lightgrey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+    ]))
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    doc.build([Paragraph("Report Index", styles['SectionTitle']), Spacer(1, 0.1*inch), table])
+    return buffer.getvalue()
+
+
+def combined_report(datasets):
+    """
+    One PDF holding a cover index followed by the report of every dataset,
+    in the given order, with a bookmark per report. Needs pypdf.
+    """
+    if pypdf is None:
+        raise RuntimeError("Combining reports requires pypdf")
+
+    order = {dataset.pk: position for position, dataset in enumerate(datasets)}
+    readers = [None] * len(datasets)
+    for dataset, data in render_reports(datasets):
+        readers[order[dataset.pk]] = pypdf.PdfReader(io.BytesIO(data))
+
+    entries = [(report_context(dataset), len(reader.pages)) for dataset, reader in zip(datasets, readers)]
+    # The index may itself run over several pages, which moves every start page
+    cover_pages = 1
+    while True:
+        cover = pypdf.PdfReader(io.BytesIO(_render_cover(entries, cover_pages + 1)))
+        if len(cover.pages) == cover_pages:
+            break
+        cover_pages = len(cover.pages)
+
+    writer = pypdf.PdfWriter()
+    writer.append(cover)
+    for (context, _), reader in zip(entries, readers):
+        start = len(writer.pages)
+        writer.append(reader)
+        writer.add_outline_item(context["dataset_name"], start)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
@@ -0,0 +1,303 @@
+"""
+Resumable chunked uploads.
+
+A client creates a session, PUTs the file in chunks at byte offsets (in
+order; a chunk at the wrong offset is refused with the offset to continue
+from) and completes the session. Each chunk is appended to a partial file
+and its complete lines are analysed straight away (CSVChunkParser into a
+SummaryAccumulator), so completing a session only has to finish the last
+line and create the dataset; the columnar sidecar is written afterwards by
+the housekeeping pool.
+
+Sessions are rows (UploadSession) holding the byte counts and the
+accumulator state: after a restart the client asks for the offset and
+carries on. The parser and accumulator of a session stay live in the
+process between chunks; their state is only saved every
+UPLOAD_CHECKPOINT_BYTES (and with the last chunk), as serialising it costs
+far more than a chunk. When they are missing (a restart, another process)
+they are rebuilt from the last checkpoint and the partial file, which is
+the source of the unanalysed tail; bytes past `received` (from a chunk that
+failed half way) are overwritten.
+
+An invalid header ends the session. A row that cannot be parsed does not:
+like analyze_csv(), the rest of the file is still taken (just no longer
+analysed) and the dataset is created with the error in its summary.
+"""
+import hashlib
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import submit_housekeeping
+from .models import ProcessingJob, UploadedDataset, UploadSession
+from .reports import pregenerate_report
+from .retention import UPLOAD_DIR, apply_retention
+from .utils import CSVChunkParser, SummaryAccumulator, write_sidecar
+
+# Directory (under MEDIA_ROOT) of the partial files
+SESSION_DIR = 'uploads'
+PARTIAL_SUFFIX = '.part'
+
+# SHA-256 of each session's bytes so far, as (received, hasher). Per process
+# and lost on restart; complete_session() hashes the file when it is missing.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+# Live parser and accumulator of each session, as (received, parser,
+# accumulator). Per process, like _hashers; see _take_analysis().
+_analyses = {}
+_analyses_lock = threading.Lock()
+
+
+class OffsetMismatch(Exception):
+    """A chunk does not continue the upload; `expected` is where it should start."""
+
+    def __init__(self, expected):
+        super().__init__(f"Expected a chunk at offset {expected}")
+        self.expected = expected
+
+
+def create_session(user, dataset_name, original_name, size=None):
+    session = UploadSession(user=user, dataset_name=dataset_name, original_name=original_name, size=size)
+    session.file_name = f"{SESSION_DIR}/{session.pk}{PARTIAL_SUFFIX}"
+    path = default_storage.path(session.file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    session.save()
+    return session
+
+
+def _read(path, start, stop):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(stop - start)
+
+
+def _header(path, parsed):
+    """Header line of a partial file whose header has been parsed."""
+    if not parsed:
+        return None
+    with open(path, 'rb') as f:
+        return f.readline()
+
+
+def _update_hash(session, start, data):
+    with _hashers_lock:
+        received, hasher = _hashers.pop(session.pk, (0, hashlib.sha256()))
+        if received == start:
+            hasher.update(data)
+            _hashers[session.pk] = (start + len(data), hasher)
+
+
+def _take_analysis(session, path):
+    """
+    The parser and accumulator of a session at `received`: the live ones,
+    or rebuilt from the saved state and the bytes received since.
+    """
+    with _analyses_lock:
+        received, parser, accumulator = _analyses.pop(session.pk, (None, None, None))
+    if received == session.received:
+        return parser, accumulator
+    parser = CSVChunkParser(_header(path, session.parsed))
+    parser.pending = _read(path, session.parsed, session.received)
+    return parser, SummaryAccumulator.from_dict(session.analytics_state)
+
+
+def analysed_rows(session):
+    """Rows analysed so far, counting those after the last checkpoint when this process has them."""
+    with _analyses_lock:
+        received, _, accumulator = _analyses.get(session.pk, (None, None, None))
+    if received == session.received:
+        return accumulator.total_count
+    return (session.analytics_state or {}).get('total_count', 0)
+
+
+def _failed(state):
+    """Whether the analytics state records a parse error instead of results."""
+    return bool(state) and "error" in state
+
+
+def append_chunk(session_id, user, offset, data):
+    """
+    Appends `data` at byte `offset` and analyses the lines it completes.
+    A chunk that overlaps bytes already received (a retried request) is
+    accepted for its new part. Raises UploadSession.DoesNotExist,
+    OffsetMismatch, or ValueError if the header is invalid (the session is
+    then discarded); other parse errors are kept in the analytics state.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id, user=user)
+        if offset > session.received or offset + len(data) < session.received:
+            raise OffsetMismatch(session.received)
+        data = data[session.received - offset:]
+        if session.size is not None and session.received + len(data) > session.size:
+            raise ValueError(f"Chunk goes past the announced size of {session.size} bytes")
+        if not data:
+            return session
+
+        path = default_storage.path(session.file_name)
+        fields = ['received', 'updated_at']
+        parser = None
+        error = None
+        if not _failed(session.analytics_state):
+            parser, accumulator = _take_analysis(session, path)
+            try:
+                df = parser.feed(data)
+                if df is not None:
+                    accumulator.update(df)
+            except Exception as e:
+                if parser.header is None:
+                    error = e
+                else:
+                    # The rest is stored but no longer analysed
+                    session.analytics_state = {"error": str(e)}
+                    fields.append('analytics_state')
+                    parser = None
+
+        if error is None:
+            with open(path, 'r+b') as f:
+                f.seek(session.received)
+                f.write(data)
+                f.truncate()
+            _update_hash(session, session.received, data)
+
+            session.received += len(data)
+            if parser is not None:
+                if session.received - session.parsed >= settings.UPLOAD_CHECKPOINT_BYTES or session.received == session.size:
+                    # The incomplete last line is left to the next chunk
+                    session.parsed = session.received - len(parser.pending)
+                    session.analytics_state = accumulator.to_dict()
+                    fields += ['parsed', 'analytics_state']
+                with _analyses_lock:
+                    _analyses[session.pk] = (session.received, parser, accumulator)
+            session.save(update_fields=fields)
+            return session
+
+    # Not a valid CSV; nothing the client sends next can fix that
+    discard_session(session_id)
+    raise error
+
+
+def _file_hash(session):
+    with _hashers_lock:
+        received, hasher = _hashers.pop(session.pk, (None, None))
+    if received == session.received:
+        return hasher.hexdigest()
+    hasher = hashlib.sha256()
+    with open(default_storage.path(session.file_name), 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def complete_session(session_id, user):
+    """
+    Finishes an upload: analyses the last line and creates the dataset from
+    the accumulated analytics (or reuses an identical earlier upload).
+    Raises UploadSession.DoesNotExist, or ValueError if the upload is
+    incomplete or invalid.
+    """
+    # (stored, partial) path of the file while it is moved but not committed
+    moved = []
+    try:
+        return _complete_session(session_id, user, moved)
+    except Exception:
+        # No dataset refers to the file: put it back so the session can be completed again
+        for stored, partial in moved:
+            os.replace(stored, partial)
+        raise
+
+
+def _complete_session(session_id, user, moved):
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id, user=user)
+        if session.size is not None and session.received != session.size:
+            raise ValueError(f"Only {session.received} of {session.size} bytes received")
+
+        path = default_storage.path(session.file_name)
+        if _failed(session.analytics_state):
+            # A row that could not be parsed, as analyze_csv would report it
+            summary = {"error": session.analytics_state["error"]}
+        else:
+            parser, accumulator = _take_analysis(session, path)
+            try:
+                df = parser.finish()
+                if df is not None:
+                    accumulator.update(df)
+            except Exception as e:
+                summary = {"error": str(e)}
+            else:
+                summary = accumulator.summary() if accumulator.total_count else {"error": "Dataset is empty"}
+
+        content_hash = _file_hash(session)
+        dataset = UploadedDataset(user=user, dataset_name=session.dataset_name, content_hash=content_hash)
+        original = UploadedDataset.find_processed(content_hash, lock=True)
+        if original:
+            # Identical content uploaded before: share its file and analytics
+            dataset.file = original.file.name
+            dataset.summary_data = original.summary_data
+            dataset.analytics_state = original.analytics_state
+            dataset.quantile_sketches = original.quantile_sketches
+            dataset.histograms = original.histograms
+            transaction.on_commit(lambda: os.remove(path))
+        else:
+            name = default_storage.get_available_name(default_storage.generate_filename(f"{UPLOAD_DIR}/{session.original_name}"))
+            os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+            os.replace(path, default_storage.path(name))
+            moved.append((default_storage.path(name), path))
+            # Registered first, so it runs before any hook that could fail
+            transaction.on_commit(moved.clear)
+            dataset.file = name
+            if "error" in summary:
+                dataset.summary_data = {**summary, "status": ProcessingJob.FAILED}
+            else:
+                dataset.summary_data = {**summary, "status": ProcessingJob.DONE}
+                dataset.analytics_state = accumulator.stats.to_dict()
+                dataset.quantile_sketches = accumulator.sketch.to_dict()
+                dataset.histograms = accumulator.histograms()
+        dataset.save()
+        session.delete()
+
+        if not original and "error" not in summary:
+            submit_housekeeping(write_sidecar, dataset.file.path)
+            if settings.REPORT_PREGENERATE:
+                submit_housekeeping(pregenerate_report, dataset.pk)
+        apply_retention(user)
+        return dataset
+
+
+def discard_session(session_id):
+    """Deletes a session and its partial file."""
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+    with _analyses_lock:
+        _analyses.pop(session_id, None)
+    UploadSession.objects.filter(pk=session_id).delete()
+    path = default_storage.path(f"{SESSION_DIR}/{session_id}{PARTIAL_SUFFIX}")
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def expire_sessions(now=None):
+    """
+    Discards sessions idle for longer than UPLOAD_SESSION_MAX_AGE_HOURS and
+    partial files without a session. Returns the number of sessions removed.
+    """
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.UPLOAD_SESSION_MAX_AGE_HOURS)
+    expired = list(UploadSession.objects.filter(updated_at__lt=cutoff).values_list('pk', flat=True))
+    for session_id in expired:
+        discard_session(session_id)
+
+    session_dir = default_storage.path(SESSION_DIR)
+    if os.path.isdir(session_dir):
+        active = {f"{pk}{PARTIAL_SUFFIX}" for pk in UploadSession.objects.values_list('pk', flat=True)}
+        for entry in os.scandir(session_dir):
+            # Files are created just before their session row is committed
+            if entry.name not in active and entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+    return len(expired)
@@ -0,0 +1,127 @@
+"""
+Retention of uploaded datasets.
+
+apply_retention() decides which of a user's datasets fall outside the
+policy (RETENTION_MAX_DATASETS newest, RETENTION_MAX_AGE_DAYS, at most
+RETENTION_MAX_BYTES of files) and deletes their rows in bulk. Files and
+derived artifacts (columnar sidecar, cached reports) are unlinked afterwards
+by sweep_files() on the housekeeping pool, so an upload never waits for the
+filesystem. sweep_orphans() finds anything a crash left behind and is run
+by the enforce_retention management command.
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .columnar import SIDECAR_SUFFIX, remove_sidecar
+from .jobs import submit_housekeeping
+from .models import UploadedDataset
+from .reports import remove_reports
+
+# Directory (under MEDIA_ROOT) uploads are stored in, see UploadedDataset.file
+UPLOAD_DIR = 'datasets'
+
+
+def expired_datasets(user, now=None):
+    """
+    Ids and file names of the datasets of `user` outside the retention
+    policy, from one query over the (user, upload_timestamp) index. The
+    newest dataset is always kept.
+    """
+    max_count = settings.RETENTION_MAX_DATASETS
+    max_age = settings.RETENTION_MAX_AGE_DAYS
+    max_bytes = settings.RETENTION_MAX_BYTES
+    cutoff = (now or timezone.now()) - timedelta(days=max_age) if max_age is not None else None
+
+    rows = (
+        UploadedDataset.objects.filter(user=user)
+        .order_by('-upload_timestamp')
+        .values_list('pk', 'file', 'file_size', 'upload_timestamp')
+    )
+    expired = []
+    total = 0
+    # Files shared by several datasets (identical uploads) count once
+    counted = set()
+    for position, (pk, name, size, uploaded) in enumerate(rows):
+        if name not in counted:
+            counted.add(name)
+            total += size
+        if position == 0:
+            continue
+        if (
+            (max_count is not None and position >= max_count)
+            or (cutoff is not None and uploaded < cutoff)
+            or (max_bytes is not None and total > max_bytes)
+        ):
+            expired.append((pk, name))
+    return expired
+
+
+def apply_retention(user, now=None):
+    """
+    Deletes the datasets of `user` outside the retention policy and queues
+    their files for the sweeper. Returns the number of datasets deleted.
+    """
+    expired = expired_datasets(user, now)
+    if not expired:
+        return 0
+
+    dataset_ids = [pk for pk, _ in expired]
+    # Only the ids are fetched to cascade to the jobs, not the large JSON fields
+    UploadedDataset.objects.filter(pk__in=dataset_ids).only('pk').delete()
+    submit_housekeeping(sweep_files, dataset_ids, sorted({name for _, name in expired if name}))
+    return len(dataset_ids)
+
+
+def sweep_files(dataset_ids, file_names):
+    """
+    Unlinks the files of deleted datasets (unless an identical upload still
+    uses them) with their sidecars, and evicts the datasets' cached reports.
+    """
+    for name in file_names:
+        # Checked right before the unlink: an identical upload may have
+        # started sharing the file since the datasets were deleted
+        if UploadedDataset.objects.filter(file=name).exists():
+            continue
+        path = default_storage.path(name)
+        if os.path.isfile(path):
+            os.remove(path)
+        remove_sidecar(path)
+    for dataset_id in dataset_ids:
+        remove_reports(dataset_id)
+
+
+def sweep_orphans(grace=3600):
+    """
+    Removes uploads, sidecars and cached reports no dataset refers to any
+    more. Files younger than `grace` seconds are left alone, as their
+    dataset row may not be committed yet. Returns the number of paths removed.
+    """
+    removed = 0
+    upload_dir = default_storage.path(UPLOAD_DIR)
+    referenced = {os.path.basename(name) for name in UploadedDataset.objects.values_list('file', flat=True)}
+    cutoff = time.time() - grace
+
+    if os.path.isdir(upload_dir):
+        for entry in os.scandir(upload_dir):
+            name = entry.name[:-len(SIDECAR_SUFFIX)] if entry.name.endswith(SIDECAR_SUFFIX) else entry.name
+            if name in referenced or entry.stat().st_mtime > cutoff:
+                continue
+            if entry.is_dir():
+                remove_sidecar(os.path.join(upload_dir, name))
+            else:
+                os.remove(entry.path)
+            removed += 1
+
+    if os.path.isdir(settings.REPORT_CACHE_DIR):
+        dataset_ids = set(UploadedDataset.objects.values_list('pk', flat=True))
+        for entry in os.scandir(settings.REPORT_CACHE_DIR):
+            dataset_id = entry.name.split('-', 1)[0]
+            if dataset_id.isdigit() and int(dataset_id) not in dataset_ids and entry.stat().st_mtime <= cutoff:
+                os.remove(entry.path)
+                removed += 1
+    return removed
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import UploadedDataset
+from .models import UploadedDataset, ProcessingJob, UploadSession
+from .resumable import analysed_rows
+from .utils import is_csv_name
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,9 +23,31 @@ class UploadedDatasetSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'upload_timestamp', 'summary_data', 'file_path']
 
     def validate_file(self, value):
-        if not value.name.endswith('.csv'):
+        if not is_csv_name(value.name):
             raise serializers.ValidationError("Only CSV files are allowed.")
         return value
         
     def get_file_path(self, obj):
         return obj.file.url
+
+
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProcessingJob
+        fields = ['id', 'dataset', 'state', 'progress', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    # Bytes received so far: where the next chunk starts
+    offset = serializers.IntegerField(source='received', read_only=True)
+    rows = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'dataset_name', 'original_name', 'size', 'offset', 'rows', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+    def get_rows(self, obj):
+        """Rows analysed so far."""
+        return analysed_rows(obj)
@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import get_token_cache
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    get_token_cache().invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def evict_saved_user(sender, instance, **kwargs):
+    # The cache holds the User itself: any change (is_staff, is_active, ...)
+    # must be read again
+    get_token_cache().invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def evict_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    # The cached User also keeps its permission caches
+    if not action.startswith('post_'):
+        return
+    cache = get_token_cache()
+    if not reverse:
+        cache.invalidate_user(instance.pk)
+    elif pk_set is None:
+        # e.g. group.user_set.clear(): the users are not known
+        cache.clear()
+    else:
+        for user_id in pk_set:
+            cache.invalidate_user(user_id)
+
+
+@receiver(post_delete, sender=User)
+def evict_deleted_user(sender, instance, **kwargs):
+    get_token_cache().invalidate_user(instance.pk)
@@ -0,0 +1,226 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from .stats import OVERALL_KEY
+
+# Values closer to zero than this share the zero bin
+MIN_INDEXABLE = 1e-9
+
+# A bin is stored as one int64 key: the sketch id (type, parameter) in the
+# high 32 bits and an ordinal in the low 32 bits that sorts like the values
+# (negative bins, zero, positive bins), so sorting keys orders every sketch.
+SKETCH_SHIFT = 32
+SIGN_SHIFT = 24
+BIN_OFFSET = 1 << 23
+BIN_MASK = (1 << SIGN_SHIFT) - 1
+
+
+def _encode(sketch_ids, sign, index):
+    ordinal = ((sign + 1) << SIGN_SHIFT) + np.where(sign < 0, -index, index) + BIN_OFFSET
+    return (sketch_ids << SKETCH_SHIFT) | ordinal
+
+
+def _decode(keys):
+    ordinal = keys & ((1 << SKETCH_SHIFT) - 1)
+    sign = (ordinal >> SIGN_SHIFT) - 1
+    index = (ordinal & BIN_MASK) - BIN_OFFSET
+    return keys >> SKETCH_SHIFT, sign, np.where(sign < 0, -index, index)
+
+
+def _sum_by_key(keys, counts):
+    keys, inverse = np.unique(keys, return_inverse=True)
+    return keys, np.bincount(inverse, weights=counts, minlength=len(keys)).astype('int64')
+
+
+class TypeIndex:
+    """
+    Growing vocabulary of EquipmentType names -> integer codes. Code 0 is
+    reserved for the overall (all types) entry.
+    """
+
+    def __init__(self, types=None):
+        self.types = list(types) if types else [OVERALL_KEY]
+        self._codes = {type_key: code for code, type_key in enumerate(self.types)}
+
+    def get(self, type_key):
+        return self._codes.get(type_key)
+
+    def encode(self, keys):
+        """Code for each key (-1 for a missing type); unseen types are added."""
+        codes, uniques = pd.factorize(pd.Series(keys).astype(object))
+        uniques = pd.Index(uniques).astype(str)
+        known = pd.Index(self.types).get_indexer(uniques)
+        for position in np.flatnonzero(known < 0):
+            known[position] = self._codes[uniques[position]] = len(self.types)
+            self.types.append(uniques[position])
+        return np.where(codes >= 0, known[codes] if len(known) else codes, -1)
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketches (DDSketch) for every (EquipmentType, parameter)
+    pair plus an overall sketch per parameter.
+
+    Values are counted in logarithmic bins, so any quantile is answered with
+    a relative error of at most `relative_accuracy`. Merging two sketches
+    just adds bin counts, which makes results independent of how the data was
+    chunked or split across processes. Each sketch keeps at most `max_bins`
+    bins; beyond that the lowest bins are collapsed together.
+
+    All sketches share two sorted arrays (bin keys and counts), so building,
+    merging and querying are vectorised across types.
+    """
+
+    def __init__(self, parameters, relative_accuracy=0.01, max_bins=2048):
+        self.parameters = list(parameters)
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.type_index = TypeIndex()
+        self.keys = np.empty(0, dtype='int64')
+        self.counts = np.empty(0, dtype='int64')
+
+    @property
+    def types(self):
+        return self.type_index.types
+
+    def update(self, values, keys):
+        """
+        Adds one chunk. `values` holds the numeric columns (NaN skipped),
+        `keys` the EquipmentType of each row.
+        """
+        type_codes = self.type_index.encode(keys)
+        new_keys = []
+        for parameter_code, parameter in enumerate(self.parameters):
+            x = values[parameter].to_numpy(dtype='float64', na_value=np.nan)
+            valid = ~np.isnan(x)
+            x = x[valid]
+            codes = type_codes[valid]
+
+            magnitude = np.abs(x)
+            sign = np.where(magnitude < MIN_INDEXABLE, 0, np.sign(x)).astype('int64')
+            with np.errstate(divide='ignore'):
+                index = np.ceil(np.log(np.where(sign != 0, magnitude, 1.0)) / self.log_gamma).astype('int64')
+
+            # Every value lands in the overall sketch and, if typed, its type's sketch
+            typed = codes >= 0
+            overall_ids = np.full(len(x), parameter_code, dtype='int64')
+            type_ids = codes[typed] * len(self.parameters) + parameter_code
+            new_keys.append(_encode(overall_ids, sign, index))
+            new_keys.append(_encode(type_ids, sign[typed], index[typed]))
+
+        keys = np.concatenate(new_keys)
+        self._add(keys, np.ones(len(keys), dtype='int64'))
+        return self
+
+    def merge(self, other):
+        """Adds the bins of another sketch to this one (in place) and returns self."""
+        if other.parameters != self.parameters or other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different parameters or accuracy")
+
+        # Re-key the other sketch onto this sketch's type codes
+        sketch_ids, sign, index = _decode(other.keys)
+        type_map = self.type_index.encode(other.types)
+        n = len(self.parameters)
+        self._add(_encode(type_map[sketch_ids // n] * n + sketch_ids % n, sign, index), other.counts)
+        return self
+
+    def _add(self, keys, counts):
+        self.keys, self.counts = _sum_by_key(np.concatenate([self.keys, keys]), np.concatenate([self.counts, counts]))
+        self._collapse()
+
+    def _groups(self):
+        """Start offset and size of every sketch in the sorted key array."""
+        sketch_ids = self.keys >> SKETCH_SHIFT
+        starts = np.flatnonzero(np.r_[True, sketch_ids[1:] != sketch_ids[:-1]]) if len(sketch_ids) else sketch_ids
+        return sketch_ids[starts], starts, np.diff(np.r_[starts, len(self.keys)])
+
+    def _collapse(self):
+        """Keeps at most max_bins per sketch by folding the lowest bins together."""
+        _, starts, sizes = self._groups()
+        if not len(sizes) or sizes.max() <= self.max_bins:
+            return
+
+        group_start = np.repeat(starts, sizes)
+        excess = np.repeat(np.maximum(sizes - self.max_bins, 0), sizes)
+        position = np.arange(len(self.keys)) - group_start
+        # Bins below the cut are moved into the lowest bin that is kept
+        keys = np.where(position < excess, self.keys[group_start + excess], self.keys)
+        self.keys, self.counts = _sum_by_key(keys, self.counts)
+
+    def _bin_values(self, keys):
+        # Midpoint (in relative terms) of each bin
+        _, sign, index = _decode(keys)
+        value = 2 * np.power(self.gamma, index.astype('float64')) / (self.gamma + 1)
+        return np.where(sign == 0, 0.0, sign * value)
+
+    def quantile_table(self, qs, parameter=None, equipment_type=None):
+        """
+        Returns (labels, values): one (type, parameter) label per selected
+        sketch and a matching row of len(qs) quantiles (0 <= q <= 1).
+        equipment_type=None means the overall sketch; '*' selects every type.
+
+        Every sketch is a contiguous run of the sorted keys, so each quantile
+        is one vectorised binary search over the cumulative counts.
+        """
+        sketch_ids, starts, sizes = self._groups()
+        n = len(self.parameters)
+        selected = np.ones(len(sketch_ids), dtype=bool)
+        if equipment_type != '*':
+            type_code = self.type_index.get(OVERALL_KEY if equipment_type is None else str(equipment_type))
+            type_code = -1 if type_code is None else type_code
+            selected &= sketch_ids // n == type_code
+        if parameter is not None:
+            parameter_code = self.parameters.index(parameter) if parameter in self.parameters else -1
+            selected &= sketch_ids % n == parameter_code
+        sketch_ids, starts, sizes = sketch_ids[selected], starts[selected], sizes[selected]
+
+        cumulative = np.cumsum(self.counts)
+        before = np.where(starts > 0, cumulative[starts - 1], 0)
+        total = cumulative[starts + sizes - 1] - before if len(starts) else before
+        labels = [(self.types[code // n], self.parameters[code % n]) for code in sketch_ids.tolist()]
+
+        # First bin whose cumulative count exceeds rank q * (n - 1)
+        ranks = before[:, None] + np.asarray(qs, dtype='float64')[None, :] * (total - 1)[:, None]
+        positions = np.searchsorted(cumulative, ranks, side='right')
+        return labels, self._bin_values(self.keys[positions])
+
+    def quantiles(self, qs, parameter=None, equipment_type=None):
+        """
+        Returns {type: {parameter: {q: value}}} for the requested quantiles
+        (see quantile_table for the selection).
+        """
+        labels, values = self.quantile_table(qs, parameter, equipment_type)
+        result = {}
+        for (type_key, parameter_key), row in zip(labels, values.tolist()):
+            result.setdefault(type_key, {})[parameter_key] = dict(zip(qs, row))
+        return result
+
+    def quantile(self, q, parameter, equipment_type=None):
+        result = self.quantiles([q], parameter, equipment_type)
+        if not result:
+            return None
+        return next(iter(result.values()))[parameter][q]
+
+    def to_dict(self):
+        """JSON-friendly representation (bin keys and counts as lists)."""
+        return {
+            "version": 1,
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "parameters": self.parameters,
+            "types": self.types,
+            "keys": self.keys.tolist(),
+            "counts": self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["parameters"], data["relative_accuracy"], data["max_bins"])
+        sketch.type_index = TypeIndex(data["types"])
+        sketch.keys = np.asarray(data["keys"], dtype='int64')
+        sketch.counts = np.asarray(data["counts"], dtype='int64')
+        return sketch
@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+
+# Per-column fields kept in the state. m2 is the sum of squared deviations
+# from the mean (Welford), so variance = m2 / (count - 1).
+FIELDS = ['count', 'mean', 'm2', 'min', 'max', 'nulls']
+
+OVERALL_KEY = '__all__'
+
+
+def _aggregate(values, keys):
+    """
+    One vectorised groupby pass over a chunk: count/mean/m2/min/max/nulls
+    for every numeric column and every key.
+    """
+    grouped = values.groupby(keys, sort=False, observed=True)
+    stats = grouped.agg(['count', 'mean', 'var', 'min', 'max'])
+    size = grouped.size()
+
+    frame = {}
+    for col in values.columns:
+        count = stats[(col, 'count')].astype('float64')
+        frame[(col, 'count')] = count
+        frame[(col, 'mean')] = stats[(col, 'mean')].fillna(0.0)
+        frame[(col, 'm2')] = (stats[(col, 'var')] * (count - 1)).fillna(0.0)
+        frame[(col, 'min')] = stats[(col, 'min')]
+        frame[(col, 'max')] = stats[(col, 'max')]
+        frame[(col, 'nulls')] = (size - count).astype('float64')
+
+    frame = pd.DataFrame(frame, index=stats.index)
+    frame.index = frame.index.astype(str).astype(object)
+    return frame
+
+
+def _merge(a, b):
+    """
+    Combines two aggregate frames key by key (Chan et al. parallel update).
+    Keys or columns missing on one side count as empty.
+    """
+    index = a.index.union(b.index, sort=False)
+    columns = list(dict.fromkeys([col for col, _ in a.columns] + [col for col, _ in b.columns]))
+    a = a.reindex(index=index, columns=pd.MultiIndex.from_product([columns, FIELDS]))
+    b = b.reindex(index=index, columns=pd.MultiIndex.from_product([columns, FIELDS]))
+
+    frame = {}
+    for col in columns:
+        na = a[(col, 'count')].fillna(0.0)
+        nb = b[(col, 'count')].fillna(0.0)
+        mean_a = a[(col, 'mean')].fillna(0.0)
+        mean_b = b[(col, 'mean')].fillna(0.0)
+
+        n = na + nb
+        delta = mean_b - mean_a
+        weight = (nb / n.where(n > 0)).fillna(0.0)
+
+        frame[(col, 'count')] = n
+        frame[(col, 'mean')] = mean_a + delta * weight
+        frame[(col, 'm2')] = a[(col, 'm2')].fillna(0.0) + b[(col, 'm2')].fillna(0.0) + delta * delta * na * weight
+        frame[(col, 'min')] = np.fmin(a[(col, 'min')], b[(col, 'min')])
+        frame[(col, 'max')] = np.fmax(a[(col, 'max')], b[(col, 'max')])
+        frame[(col, 'nulls')] = a[(col, 'nulls')].fillna(0.0) + b[(col, 'nulls')].fillna(0.0)
+
+    return pd.DataFrame(frame, index=index)
+
+
+def _describe(row, col):
+    count = int(row[(col, 'count')])
+    m2 = row[(col, 'm2')]
+    variance = float(m2 / (count - 1)) if count > 1 else None
+    minimum = None if pd.isna(row[(col, 'min')]) else float(row[(col, 'min')])
+    maximum = None if pd.isna(row[(col, 'max')]) else float(row[(col, 'max')])
+    return {
+        "count": count,
+        "nulls": int(row[(col, 'nulls')]),
+        "mean": float(row[(col, 'mean')]) if count else None,
+        "variance": variance,
+        "std": float(np.sqrt(variance)) if variance is not None else None,
+        "min": minimum,
+        "max": maximum,
+        "range": maximum - minimum if count else None,
+    }
+
+
+def _to_lists(frame):
+    return {
+        col: {field: [None if pd.isna(v) else v for v in frame[(col, field)].tolist()] for field in FIELDS}
+        for col in dict.fromkeys(col for col, _ in frame.columns)
+    }
+
+
+def _from_lists(keys, columns):
+    frame = {}
+    for col, fields in columns.items():
+        for field in FIELDS:
+            frame[(col, field)] = pd.Series(fields[field], dtype='float64')
+    frame = pd.DataFrame(frame)
+    frame.index = pd.Index(keys, dtype=object)
+    return frame
+
+
+class StatsState:
+    """
+    Mergeable per-column statistics (count, mean, M2, min, max, null count),
+    kept overall and per EquipmentType.
+
+    States built from different chunks, processes or files combine with
+    merge(), so variance, std-dev and range can be answered from the stored
+    state without re-reading the CSV.
+    """
+
+    def __init__(self, overall=None, by_type=None):
+        empty = pd.DataFrame(columns=pd.MultiIndex.from_product([[], FIELDS]), dtype='float64')
+        self.overall = overall if overall is not None else empty
+        self.by_type = by_type if by_type is not None else empty
+
+    @classmethod
+    def from_frame(cls, values, keys):
+        """
+        Builds the state of one chunk. `values` holds the numeric columns
+        (already coerced, NaN for missing/invalid), `keys` the EquipmentType.
+        """
+        if values.empty:
+            return cls()
+        overall = _aggregate(values, np.zeros(len(values), dtype=np.int8))
+        overall.index = pd.Index([OVERALL_KEY], dtype=object)
+        by_type = _aggregate(values, keys)
+        return cls(overall, by_type)
+
+    def merge(self, other):
+        """Folds another state into this one (in place) and returns self."""
+        self.overall = _merge(self.overall, other.overall)
+        self.by_type = _merge(self.by_type, other.by_type)
+        return self
+
+    @property
+    def types(self):
+        return list(self.by_type.index)
+
+    def type_counts(self):
+        """Rows per EquipmentType, in order of first appearance."""
+        if self.by_type.empty:
+            return pd.Series(dtype='int64')
+        col = self.by_type.columns[0][0]
+        return (self.by_type[(col, 'count')] + self.by_type[(col, 'nulls')]).astype('int64')
+
+    def type_statistics(self):
+        """
+        Count, mean, min, max and std of every column per EquipmentType, as
+        columnar lists aligned with "types" (vectorised over all types).
+        """
+        result = {"types": self.types}
+        for col in dict.fromkeys(col for col, _ in self.by_type.columns):
+            count = self.by_type[(col, 'count')]
+            std = np.sqrt(self.by_type[(col, 'm2')] / (count - 1).where(count > 1))
+            fields = {
+                "count": count.astype('int64'),
+                "mean": self.by_type[(col, 'mean')].where(count > 0),
+                "min": self.by_type[(col, 'min')],
+                "max": self.by_type[(col, 'max')],
+                "std": std,
+            }
+            result[col] = {
+                field: values.astype(object).where(values.notna(), None).tolist()
+                for field, values in fields.items()
+            }
+        return result
+
+    def describe(self, equipment_type=None):
+        """
+        Returns count, nulls, mean, variance, std, min, max and range per
+        column, either overall or for a single EquipmentType.
+        """
+        frame = self.overall if equipment_type is None else self.by_type
+        key = OVERALL_KEY if equipment_type is None else str(equipment_type)
+        if key not in frame.index:
+            return {}
+        row = frame.loc[key]
+        return {col: _describe(row, col) for col in dict.fromkeys(col for col, _ in frame.columns)}
+
+    def to_dict(self):
+        """JSON-friendly representation (columnar lists, NaN as None)."""
+        return {
+            "version": 1,
+            "overall": _to_lists(self.overall),
+            "types": self.types,
+            "by_type": _to_lists(self.by_type),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        overall_keys = [OVERALL_KEY] if data["overall"] else []
+        overall = _from_lists(overall_keys, data["overall"])
+        by_type = _from_lists(data["types"], data["by_type"])
+        return cls(overall, by_type)
@@ -1,3 +1,1270 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import resumable
+from .aio import offload
+from .authentication import TokenCache, get_token_cache
+from .columnar import ColumnarDataset, ColumnarWriter
+from .downsample import lttb, minmax
+from .histograms import FixedWidthHistogram, quantile_bins
+from .instrumentation import query_budget
+from .jobs import drain_queue, requeue_stale, run_job, submit_housekeeping
+from .middleware import brotli
+from .renderers import COLUMNS_MAGIC, pyarrow
+from .reports import pypdf
+from .retention import apply_retention, sweep_orphans
+from .models import ProcessingJob, UploadedDataset, UploadSession
+from .sketches import QuantileSketch
+from .stats import StatsState
+from .utils import NUMERIC_COLUMNS, analyze_csv, process_csv_analytics
+
+
+def write_equipment_csv(path, rows, seed=0):
+    """
+    Equipment CSV whose first rows hold a type that never appears again and
+    whose readings drift upwards, so later chunks widen the histograms.
+    """
+    rng = np.random.default_rng(seed)
+    drift = np.linspace(0, 500, rows)
+    df = pd.DataFrame({
+        'Equipment Name': [f"EQ-{i}" for i in range(rows)],
+        'Type': rng.choice(['Pump', 'Valve', 'Reactor'], rows),
+        'Flowrate': (rng.normal(120, 15, rows) + drift).round(2),
+        'Pressure': rng.normal(5, 0.5, rows).round(2),
+        'Temperature': (rng.normal(110, 8, rows) + drift / 10).round(1),
+    })
+    df.loc[:4, 'Type'] = 'Boiler'
+    df.to_csv(path, index=False)
+    return df
+
+
+class DatasetAPIMixin:
+    """
+    Authenticated API client with a throwaway media directory; analytics
+    and reports run in the request unless asked for (no background work).
+    """
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        media = os.path.join(self.workdir, 'media')
+        overrides = override_settings(
+            MEDIA_ROOT=media,
+            REPORT_CACHE_DIR=os.path.join(media, 'reports'),
+            REPORT_PREGENERATE=False,
+            ANALYTICS_ASYNC_UPLOADS=False,
+            ALLOWED_HOSTS=['testserver'],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        get_token_cache().clear()
+
+        self.user = User.objects.create_user('tester', password='tester')
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get_or_create(user=user)[0].key)
+        return client
+
+    def write_csv(self, name, content):
+        path = os.path.join(self.workdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def upload(self, path, dataset_name='Equipment', client=None, query=''):
+        with open(path, 'rb') as f:
+            return (client or self.client).post(
+                f'/api/upload/{query}', {'file': f, 'dataset_name': dataset_name}, format='multipart',
+            )
+
+    def upload_dataset(self, path, **kwargs):
+        """Uploads `path` and returns the new dataset's id."""
+        response = self.upload(path, **kwargs)
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+
+class DatasetAPITestCase(DatasetAPIMixin, TestCase):
+    pass
+
+
+class TokenCacheTests(TestCase):
+    def test_entries_expire(self):
+        cache = TokenCache(max_size=4, ttl=60)
+        with mock.patch('core.authentication.time.monotonic', return_value=1000.0):
+            cache.set('a', 'credentials')
+        with mock.patch('core.authentication.time.monotonic', return_value=1059.0):
+            self.assertEqual(cache.get('a'), 'credentials')
+        with mock.patch('core.authentication.time.monotonic', return_value=1060.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['hits'], stats['misses']), (2, 1, 3, 1))
+
+
+class FixedWidthHistogramTests(TestCase):
+    def test_widening_with_a_type_missing_from_the_chunk(self):
+        # 'C' has the highest type code but is absent when 'A' widens
+        histogram = FixedWidthHistogram(['Flowrate'], max_bins=8)
+        histogram.update(pd.DataFrame({'Flowrate': [1.0, 2.0, 3.0]}), pd.Series(['A', 'B', 'C']))
+        histogram.update(pd.DataFrame({'Flowrate': [1.0, 200.0]}), pd.Series(['A', 'A']))
+
+        result = histogram.histograms(equipment_type='*')
+        self.assertEqual(sum(result['__all__']['Flowrate']['counts']), 5)
+        self.assertEqual(sum(result['A']['Flowrate']['counts']), 3)
+        self.assertEqual(result['C']['Flowrate']['counts'], [1])
+
+    def test_merge_matches_a_single_pass(self):
+        rng = np.random.default_rng(0)
+        values = pd.DataFrame({'Flowrate': np.r_[rng.normal(10, 1, 500), rng.normal(1000, 50, 500)]})
+        types = pd.Series(np.r_[rng.choice(['A', 'B', 'C'], 500), rng.choice(['A'], 500)])
+
+        single = FixedWidthHistogram(['Flowrate']).update(values, types)
+        merged = FixedWidthHistogram(['Flowrate']).update(values[:500], types[:500])
+        merged.merge(FixedWidthHistogram(['Flowrate']).update(values[500:], types[500:].reset_index(drop=True)))
+        self.assertEqual(merged.histograms(equipment_type='*'), single.histograms(equipment_type='*'))
+
+
+class QuantileBinsTests(TestCase):
+    def test_edges_stay_within_the_exact_range(self):
+        rng = np.random.default_rng(1)
+        values = pd.DataFrame({'Temperature': np.r_[np.full(5000, 60.0), rng.normal(60, 0.01, 100).round(1)]})
+        types = pd.Series(['Pump'] * len(values))
+        histogram = FixedWidthHistogram(['Temperature']).update(values, types)
+        sketch = QuantileSketch(['Temperature']).update(values, types)
+
+        for parameters in quantile_bins(histogram, sketch, 10).values():
+            edges = parameters['Temperature']['edges']
+            self.assertEqual(edges[0], values['Temperature'].min())
+            self.assertEqual(edges[-1], values['Temperature'].max())
+            self.assertTrue(np.all(np.diff(edges) >= 0), edges)
+
+
+class ColumnarWriterTests(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+
+    def test_text_after_numeric_chunks_is_kept(self):
+        file_path = os.path.join(self.workdir, 'data.csv')
+        writer = ColumnarWriter(file_path, {'Flowrate': 'Flowrate'})
+        writer.append(pd.DataFrame({'Flowrate': [1.0, 2.0], 'Reading': [1, 2]}))
+        writer.append(pd.DataFrame({'Flowrate': [3.0, 4.0], 'Reading': ['offline', '7']}))
+        writer.close()
+
+        frame = ColumnarDataset.open(file_path).frame()
+        self.assertEqual(frame['Reading'].astype(str).tolist(), ['1', '2', 'offline', '7'])
+        self.assertEqual(frame['Flowrate'].tolist(), [1.0, 2.0, 3.0, 4.0])
+
+
+class SummaryAccumulatorTests(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        self.path = os.path.join(self.workdir, 'equipment.csv')
+        self.df = write_equipment_csv(self.path, 2000)
+
+    def test_chunked_matches_unchunked(self):
+        whole = process_csv_analytics(self.path)
+        chunked = process_csv_analytics(self.path, chunksize=64)
+        self.assertNotIn('error', chunked)
+
+        self.assertEqual(chunked['total_count'], whole['total_count'])
+        self.assertEqual(chunked['equipment_type_distribution'], whole['equipment_type_distribution'])
+        for key in ('avg_flowrate', 'avg_pressure', 'avg_temperature'):
+            self.assertAlmostEqual(chunked[key], whole[key], places=9)
+        self.assertAlmostEqual(whole['avg_flowrate'], self.df['Flowrate'].mean(), places=9)
+
+        for column in NUMERIC_COLUMNS:
+            for field in ('count', 'mean', 'min', 'max', 'std'):
+                np.testing.assert_allclose(
+                    chunked['type_statistics'][column][field], whole['type_statistics'][column][field], rtol=1e-9,
+                )
+
+    def test_non_numeric_cell_in_a_late_chunk(self):
+        self.df['Flowrate'] = self.df['Flowrate'].astype(object)
+        self.df.loc[1990, 'Flowrate'] = 'abc'
+        self.df.to_csv(self.path, index=False)
+        summary = process_csv_analytics(self.path, chunksize=100)
+        self.assertNotIn('error', summary)
+        self.assertEqual(summary['total_count'], 2000)
+        expected = pd.to_numeric(self.df['Flowrate'], errors='coerce').mean()
+        self.assertAlmostEqual(summary['avg_flowrate'], expected, places=9)
+
+
+class StatsStateTests(TestCase):
+    def test_merge_matches_a_single_state(self):
+        rng = np.random.default_rng(2)
+        values = pd.DataFrame({'Flowrate': rng.normal(100, 10, 1000), 'Pressure': rng.normal(5, 1, 1000)})
+        values.loc[::50, 'Pressure'] = np.nan
+        keys = pd.Series(rng.choice(['Pump', 'Valve'], 1000))
+
+        single = StatsState.from_frame(values, keys)
+        merged = StatsState.from_frame(values[:300], keys[:300])
+        merged.merge(StatsState.from_frame(values[300:].reset_index(drop=True), keys[300:].reset_index(drop=True)))
+
+        for equipment_type in (None, 'Pump', 'Valve'):
+            expected = single.describe(equipment_type)
+            actual = merged.describe(equipment_type)
+            for column, fields in expected.items():
+                for field, value in fields.items():
+                    self.assertAlmostEqual(actual[column][field], value, places=6, msg=(equipment_type, column, field))
+
+        described = merged.describe()
+        self.assertEqual(described['Pressure']['nulls'], 20)
+        self.assertAlmostEqual(described['Flowrate']['std'], values['Flowrate'].std(), places=9)
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(4)
+        values = pd.DataFrame({'Flowrate': rng.normal(100, 10, 100)})
+        state = StatsState.from_frame(values, pd.Series(rng.choice(['Pump', 'Valve'], 100)))
+        restored = StatsState.from_dict(state.to_dict())
+        self.assertEqual(restored.describe('Pump'), state.describe('Pump'))
+        self.assertEqual(restored.type_statistics(), state.type_statistics())
+
+
+class QuantileSketchTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.values = pd.DataFrame({'Flowrate': rng.lognormal(4, 0.5, 5000)})
+        self.keys = pd.Series(rng.choice(['Pump', 'Valve'], 5000))
+
+    def test_quantiles_within_relative_accuracy(self):
+        sketch = QuantileSketch(['Flowrate'], relative_accuracy=0.01).update(self.values, self.keys)
+        for q in (0.01, 0.25, 0.5, 0.9, 0.99):
+            exact = np.quantile(self.values['Flowrate'], q, method='lower')
+            self.assertLess(abs(sketch.quantile(q, 'Flowrate') - exact) / exact, 0.011, q)
+
+    def test_merge_matches_a_single_pass(self):
+        single = QuantileSketch(['Flowrate']).update(self.values, self.keys)
+        merged = QuantileSketch(['Flowrate']).update(self.values[:1000], self.keys[:1000])
+        merged.merge(QuantileSketch(['Flowrate']).update(
+            self.values[1000:].reset_index(drop=True), self.keys[1000:].reset_index(drop=True),
+        ))
+        qs = [0.1, 0.5, 0.9]
+        self.assertEqual(merged.quantiles(qs, equipment_type='*'), single.quantiles(qs, equipment_type='*'))
+
+    def test_round_trip(self):
+        sketch = QuantileSketch(['Flowrate']).update(self.values, self.keys)
+        restored = QuantileSketch.from_dict(sketch.to_dict())
+        self.assertEqual(restored.quantiles([0.5], equipment_type='*'), sketch.quantiles([0.5], equipment_type='*'))
+
+
+class DownsampleTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.values = rng.normal(0, 1, 10_000)
+        self.values[1234] = 50.0
+        self.values[8765] = -50.0
+        self.values[::97] = np.nan
+
+    def test_minmax_keeps_the_extremes(self):
+        index, values = minmax(self.values, 100)
+        self.assertLessEqual(len(index), 100)
+        self.assertTrue((np.diff(index) > 0).all())
+        self.assertIn(1234, index)
+        self.assertIn(8765, index)
+        np.testing.assert_array_equal(values, self.values[index])
+        self.assertFalse(np.isnan(values).any())
+
+    def test_lttb(self):
+        index, values = lttb(self.values, 100)
+        self.assertEqual(len(index), 100)
+        self.assertTrue((np.diff(index) > 0).all())
+        self.assertEqual((index[0], index[-1]), (1, len(self.values) - 1))
+        self.assertIn(1234, index)
+        np.testing.assert_array_equal(values, self.values[index])
+
+    def test_short_series_are_kept(self):
+        for method in (minmax, lttb):
+            index, values = method([1.0, np.nan, 3.0], 10)
+            self.assertEqual(index.tolist(), [0, 2])
+            self.assertEqual(values.tolist(), [1.0, 3.0])
+
+
+class DataFidelityTests(DatasetAPITestCase):
+    """Cells that are not numbers are served as they are in the CSV."""
+
+    def setUp(self):
+        super().setUp()
+        rows = [f"EQ-{i},Pump,{100 + i}.5,5.1,80.2" for i in range(400)]
+        rows[-3] = "EQ-397,Valve,N/A-bad,5.1,80.2"
+        self.path = self.write_csv('equipment.csv', 'Equipment Name,Type,Flowrate,Pressure,Temperature\n' + '\n'.join(rows) + '\n')
+
+    def test_text_in_a_late_block(self):
+        # Small parse blocks: the text arrives after numeric ones were written
+        with mock.patch('core.uploads.PARSE_BLOCK_BYTES', 1024):
+            pk = self.upload_dataset(self.path)
+
+        records = self.client.get(f'/api/data/{pk}/').json()
+        self.assertEqual(records[-3]['Flowrate'], 'N/A-bad')
+        self.assertEqual(records[0]['Flowrate'], '100.5')
+
+        lines = b''.join(self.client.get(f'/api/data/{pk}/?stream=ndjson').streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[-3])['Flowrate'], 'N/A-bad')
+
+        # The analytics skip it
+        summary = self.client.get(f'/api/summary/{pk}/').json()['summary_data']
+        expected = np.mean([100 + i + 0.5 for i in range(400) if i != 397])
+        self.assertAlmostEqual(summary['avg_flowrate'], expected, places=9)
+        series = self.client.get(f'/api/series/{pk}/?parameter=Flowrate&max_points=1000').json()
+        self.assertEqual(series['total_points'], 400)
+        self.assertNotIn('N/A-bad', series['series']['Flowrate']['values'])
+
+    def test_text_in_the_first_rows(self):
+        pk = self.upload_dataset(self.write_csv('first.csv', 'Type,Flowrate,Pressure,Temperature\nPump,abc,1,2\nPump,3,1,2\n'))
+        records = self.client.get(f'/api/data/{pk}/').json()
+        self.assertEqual([record['Flowrate'] for record in records], ['abc', '3'])
+        summary = self.client.get(f'/api/summary/{pk}/').json()['summary_data']
+        self.assertEqual(summary['avg_flowrate'], 3.0)
+
+
+class QueryBudgetTests(DatasetAPITestCase):
+    """The dataset endpoints stay within their QUERY_BUDGETS with a cold token cache."""
+
+    def setUp(self):
+        super().setUp()
+        path = os.path.join(self.workdir, 'equipment.csv')
+        write_equipment_csv(path, 500)
+        self.pk = self.upload_dataset(path)
+
+    def assertWithinBudget(self, name, url):
+        get_token_cache().clear()
+        with query_budget(settings.QUERY_BUDGETS[name]):
+            response = self.client.get(url)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_summary(self):
+        response = self.assertWithinBudget('dataset-summary', f'/api/summary/{self.pk}/')
+        self.assertEqual(response.data['summary_data']['total_count'], 500)
+
+    def test_data(self):
+        self.assertWithinBudget('dataset-data', f'/api/data/{self.pk}/')
+        response = self.assertWithinBudget('dataset-data', f'/api/data/{self.pk}/?limit=10&offset=5')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_history(self):
+        self.assertWithinBudget('upload-history', '/api/history/')
+
+    def test_report(self):
+        response = self.assertWithinBudget('dataset-report', f'/api/report/{self.pk}/')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+
+class JobQueueTests(DatasetAPITestCase):
+    """Jobs are only handed to the pool on commit, which never comes here."""
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.workdir, 'equipment.csv')
+        self.df = write_equipment_csv(self.path, 500)
+
+    def enqueue_upload(self):
+        response = self.upload(self.path, query='?async=true')
+        self.assertEqual(response.status_code, 202, response.data)
+        return response.data['id'], response.data['job']['id']
+
+    def history_status(self):
+        return [dataset['summary_data']['status'] for dataset in self.client.get('/api/history/').json()]
+
+    def test_pending_dataset_in_history(self):
+        other = os.path.join(self.workdir, 'other.csv')
+        write_equipment_csv(other, 100, seed=1)
+        self.upload_dataset(other, dataset_name='Sync')
+        pk, job_id = self.enqueue_upload()
+        self.assertEqual(self.history_status(), ['queued', 'done'])
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').json()['state'], 'queued')
+
+        self.assertEqual(drain_queue(), 1)
+        self.assertEqual(self.history_status(), ['done', 'done'])
+        summary = self.client.get(f'/api/summary/{pk}/').json()['summary_data']
+        self.assertEqual(summary['total_count'], len(self.df))
+
+    def test_run_job_claims_once(self):
+        _, job_id = self.enqueue_upload()
+        self.assertTrue(run_job(job_id))
+        self.assertFalse(run_job(job_id))
+        job = ProcessingJob.objects.get(pk=job_id)
+        self.assertEqual((job.state, job.progress, job.error), (ProcessingJob.DONE, 1.0, ''))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_job(self):
+        path = self.write_csv('short.csv', 'Type,Flowrate,Pressure,Temperature\n')
+        response = self.upload(path, query='?async=true')
+        self.assertEqual(response.status_code, 202, response.data)
+        run_job(response.data['job']['id'])
+        job = self.client.get(f"/api/jobs/{response.data['job']['id']}/").json()
+        self.assertEqual(job['state'], 'failed')
+        self.assertEqual(job['error'], 'Dataset is empty')
+        self.assertEqual(self.history_status(), ['failed'])
+
+    def test_requeue_stale(self):
+        _, job_id = self.enqueue_upload()
+        # A worker that died mid-job
+        ProcessingJob.objects.filter(pk=job_id).update(state=ProcessingJob.RUNNING, progress=0.4)
+        self.assertEqual(drain_queue(), 0)
+
+        self.assertEqual(requeue_stale(), 1)
+        job = ProcessingJob.objects.get(pk=job_id)
+        self.assertEqual((job.state, job.progress, job.started_at), (ProcessingJob.QUEUED, 0.0, None))
+        self.assertEqual(drain_queue(), 1)
+        self.assertEqual(ProcessingJob.objects.get(pk=job_id).state, ProcessingJob.DONE)
+
+
+class AsyncUploadTests(DatasetAPIMixin, TransactionTestCase):
+    """Jobs run on the worker pool, which needs committed rows."""
+
+    def wait_for_job(self, job_id, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.client.get(f'/api/jobs/{job_id}/').data
+            if job['state'] in ('done', 'failed') or time.monotonic() > deadline:
+                return job
+            time.sleep(0.05)
+
+    def test_async_upload_runs_as_a_job(self):
+        path = os.path.join(self.workdir, 'equipment.csv')
+        df = write_equipment_csv(path, 2000)
+
+        response = self.upload(path, query='?async=true')
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertIn(response.data['summary_data']['status'], ('queued', 'running', 'done'))
+        job = self.wait_for_job(response.data['job']['id'])
+        self.assertEqual(job['state'], 'done', job)
+        self.assertEqual(job['progress'], 1.0)
+
+        summary = self.client.get(f"/api/summary/{response.data['id']}/").json()['summary_data']
+        self.assertEqual(summary['status'], 'done')
+        self.assertEqual(summary['total_count'], len(df))
+        self.assertAlmostEqual(summary['avg_flowrate'], df['Flowrate'].mean(), places=6)
+
+    def test_jobs_do_not_wait_for_housekeeping(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        # Occupies every housekeeping thread
+        for _ in range(settings.HOUSEKEEPING_WORKERS):
+            submit_housekeeping(release.wait, 30)
+
+        path = os.path.join(self.workdir, 'equipment.csv')
+        write_equipment_csv(path, 500)
+        response = self.upload(path, query='?async=true')
+        self.assertEqual(self.wait_for_job(response.data['job']['id'], timeout=10)['state'], 'done')
+
+    def test_async_upload_with_an_invalid_header(self):
+        path = self.write_csv('bad.csv', "a,b\n1,2\n")
+        response = self.upload(path, query='?async=true')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(os.listdir(os.path.join(self.workdir, 'media', 'datasets')), [])
+
+
+class TokenCacheSignalTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+
+    def test_cached_credentials(self):
+        self.assertEqual(self.client.get('/api/history/').status_code, 200)
+        hits = get_token_cache().stats()['hits']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/history/').status_code, 200)
+        self.assertEqual(get_token_cache().stats()['hits'], hits + 1)
+
+    def test_staff_flag_removed(self):
+        self.assertEqual(self.client.get('/api/auth-cache/').status_code, 200)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth-cache/').status_code, 403)
+
+    def test_user_deactivated(self):
+        self.assertEqual(self.client.get('/api/history/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/history/').status_code, 401)
+
+    def test_token_deleted(self):
+        self.assertEqual(self.client.get('/api/history/').status_code, 200)
+        Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get('/api/history/').status_code, 401)
+
+    def test_user_deleted(self):
+        self.assertEqual(self.client.get('/api/history/').status_code, 200)
+        self.user.delete()
+        self.assertEqual(get_token_cache().stats()['size'], 0)
+
+    def test_group_changes(self):
+        group = Group.objects.create(name='operators')
+        self.client.get('/api/history/')
+        self.user.groups.add(group)
+        self.assertEqual(get_token_cache().stats()['size'], 0)
+
+        self.client.get('/api/history/')
+        group.user_set.clear()
+        self.assertEqual(get_token_cache().stats()['size'], 0)
+
+
+@override_settings(RETENTION_MAX_DATASETS=1)
+class DedupRetentionTests(DatasetAPITestCase):
+    """Identical uploads share one stored file, whoever uploaded them."""
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user('other', password='other')
+        self.other_client = self.client_for(self.other)
+        self.paths = {}
+        for seed, name in enumerate(['shared', 'a', 'b']):
+            self.paths[name] = os.path.join(self.workdir, f'{name}.csv')
+            write_equipment_csv(self.paths[name], 300, seed=seed)
+        # The sweep runs right away instead of on the housekeeping pool
+        sweep = mock.patch('core.retention.submit_housekeeping', side_effect=lambda fn, *args: fn(*args))
+        sweep.start()
+        self.addCleanup(sweep.stop)
+
+    def stored_path(self, pk):
+        return UploadedDataset.objects.get(pk=pk).file.path
+
+    def test_shared_file_outlives_the_original(self):
+        original = self.upload_dataset(self.paths['shared'])
+        copy = self.upload_dataset(self.paths['shared'], client=self.other_client)
+        path = self.stored_path(original)
+        self.assertEqual(self.stored_path(copy), path)
+        self.assertEqual(len(os.listdir(os.path.dirname(path))), 2)  # the file and its sidecar
+
+        # Retention drops the original; the copy still uses its file
+        self.upload_dataset(self.paths['a'])
+        self.assertFalse(UploadedDataset.objects.filter(pk=original).exists())
+        self.assertTrue(os.path.isfile(path))
+        records = self.other_client.get(f'/api/data/{copy}/').json()
+        self.assertEqual(len(records), 300)
+
+        # Reports are per dataset, as they show the owner and dataset name
+        response = self.other_client.get(f'/api/report/{copy}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([name.split('-')[0] for name in os.listdir(settings.REPORT_CACHE_DIR)], [str(copy)])
+
+        # Once the last user of the file is gone, so is the file
+        self.upload_dataset(self.paths['b'], client=self.other_client)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + '.columns'))
+        self.assertEqual(os.listdir(settings.REPORT_CACHE_DIR), [])
+
+    def test_copy_of_an_expired_upload(self):
+        original = self.upload_dataset(self.paths['shared'])
+        path = self.stored_path(original)
+        self.upload_dataset(self.paths['a'])
+        self.assertFalse(os.path.exists(path))
+
+        # Nothing left to share: the upload is stored and analysed again
+        copy = self.upload_dataset(self.paths['shared'], client=self.other_client)
+        self.assertTrue(os.path.isfile(self.stored_path(copy)))
+        summary = self.other_client.get(f'/api/summary/{copy}/').json()['summary_data']
+        self.assertEqual(summary['total_count'], 300)
+
+
+@override_settings(UPLOAD_CHECKPOINT_BYTES=16 * 1024)
+class ResumableUploadTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.workdir, 'equipment.csv')
+        write_equipment_csv(self.path, 3000)
+        with open(self.path, 'rb') as f:
+            self.data = f.read()
+
+    def start(self, size=True):
+        response = self.client.post('/api/uploads/', {
+            'filename': 'equipment.csv', 'dataset_name': 'Chunked', 'size': len(self.data) if size else None,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def put(self, session_id, offset, end):
+        return self.client.generic(
+            'PUT', f'/api/uploads/{session_id}/', self.data[offset:end], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {offset}-{end - 1}/{len(self.data)}',
+        )
+
+    def send(self, session_id, start=0, stop=None, step=12000):
+        stop = len(self.data) if stop is None else stop
+        for offset in range(start, stop, step):
+            response = self.put(session_id, offset, min(offset + step, stop))
+            self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+    def complete(self, session_id):
+        return self.client.post(f'/api/uploads/{session_id}/complete/')
+
+    def assertSummaryMatches(self, summary):
+        expected, _ = analyze_csv(self.path)
+        self.assertEqual(summary['total_count'], expected['total_count'])
+        self.assertEqual(summary['equipment_type_distribution'], expected['equipment_type_distribution'])
+        self.assertAlmostEqual(summary['avg_flowrate'], expected['avg_flowrate'], places=9)
+        for column in NUMERIC_COLUMNS:
+            np.testing.assert_allclose(
+                summary['type_statistics'][column]['std'], expected['type_statistics'][column]['std'], rtol=1e-9,
+            )
+
+    def test_chunks_match_a_single_pass(self):
+        session_id = self.start(size=False)
+        response = self.send(session_id, step=7001)
+        self.assertEqual(response.data['offset'], len(self.data))
+        # Rows since the last checkpoint are counted too
+        self.assertEqual(response.data['rows'], self.data.count(b'\n') - 1)
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertLess(session.parsed, session.received)
+
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertSummaryMatches(response.data['summary_data'])
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_restart_resumes_from_the_checkpoint(self):
+        session_id = self.start()
+        self.send(session_id, stop=40000)
+        # What a restarted server knows: the row and the partial file
+        resumable._analyses.clear()
+        resumable._hashers.clear()
+        self.assertLess(self.client.get(f'/api/uploads/{session_id}/').data['rows'], 3000)
+        self.send(session_id, start=40000)
+
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertSummaryMatches(response.data['summary_data'])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(UploadedDataset.objects.get(pk=response.data['id']).content_hash,
+                             hashlib.sha256(f.read()).hexdigest())
+
+    def test_chunk_at_the_wrong_offset(self):
+        session_id = self.start()
+        self.send(session_id, stop=10000)
+        response = self.put(session_id, 12000, 15000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 10000)
+
+    def test_replayed_chunks(self):
+        session_id = self.start()
+        self.send(session_id, stop=10000)
+        # The same chunk again (e.g. its response was lost), then one overlapping it
+        self.assertEqual(self.put(session_id, 5000, 10000).data['offset'], 10000)
+        self.assertEqual(self.put(session_id, 8000, 14000).data['offset'], 14000)
+        self.send(session_id, start=14000)
+
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertSummaryMatches(response.data['summary_data'])
+
+    def test_complete_before_every_byte_arrived(self):
+        session_id = self.start()
+        self.send(session_id, stop=10000)
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], f"Only 10000 of {len(self.data)} bytes received")
+
+        self.send(session_id, start=10000)
+        self.assertEqual(self.complete(session_id).status_code, 201)
+
+    def test_complete_an_identical_upload(self):
+        original = UploadedDataset.objects.get(pk=self.upload_dataset(self.path))
+        session_id = self.start()
+        self.send(session_id)
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 201, response.data)
+        dataset = UploadedDataset.objects.get(pk=response.data['id'])
+        self.assertEqual(dataset.file.name, original.file.name)
+        self.assertEqual(dataset.summary_data, original.summary_data)
+
+    def test_failed_completion_keeps_the_file(self):
+        session_id = self.start()
+        self.send(session_id)
+        partial = os.path.join(settings.MEDIA_ROOT, UploadSession.objects.get(pk=session_id).file_name)
+        with mock.patch('core.resumable.apply_retention', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                resumable.complete_session(session_id, self.user)
+        self.assertTrue(os.path.isfile(partial))
+        self.assertFalse(UploadedDataset.objects.exists())
+
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertSummaryMatches(response.data['summary_data'])
+        self.assertTrue(os.path.isfile(UploadedDataset.objects.get(pk=response.data['id']).file.path))
+
+
+class CompressionTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        path = os.path.join(self.workdir, 'equipment.csv')
+        write_equipment_csv(path, 300)
+        self.pk = self.upload_dataset(path)
+        self.data_url = f'/api/data/{self.pk}/'
+        self.plain = self.client.get(self.data_url).content
+
+    def get(self, url, encoding, **headers):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=encoding, **headers)
+
+    def test_gzip(self):
+        response = self.get(self.data_url, 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.plain)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_preferred(self):
+        response = self.get(self.data_url, 'gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.plain)
+
+    def test_identity(self):
+        response = self.client.get(self.data_url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_pdf_is_sent_as_it_is(self):
+        response = self.get(f'/api/report/{self.pk}/', 'gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streams(self):
+        url = self.data_url + '?stream=ndjson'
+        plain = b''.join(self.client.get(url).streaming_content)
+        response = self.get(url, 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+        if brotli is not None:
+            response = self.get(url, 'br')
+            self.assertEqual(brotli.decompress(b''.join(response.streaming_content)), plain)
+
+    def test_etag_round_trip(self):
+        plain = self.client.get(self.data_url)
+        self.assertTrue(plain['ETag'].startswith('"'))
+        compressed = self.get(self.data_url, 'gzip')
+        self.assertEqual(compressed['ETag'], 'W/' + plain['ETag'])
+
+        # Either form of the tag matches, whatever the encoding
+        for etag in (plain['ETag'], compressed['ETag']):
+            for encoding in ('gzip', 'br', ''):
+                response = self.get(self.data_url, encoding, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304, (etag, encoding))
+                self.assertEqual(response.content, b'')
+
+    async def test_async_bodies_and_streams(self):
+        client = AsyncClient()
+        headers = {'Authorization': self.client._credentials['HTTP_AUTHORIZATION'], 'Accept-Encoding': 'gzip'}
+        # Everything goes through the offload pool
+        with mock.patch('core.middleware.OFFLOAD_MIN_BYTES', 0), \
+                mock.patch('core.middleware.offload', wraps=offload) as offloaded:
+            response = await client.get(self.data_url, headers=headers)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), self.plain)
+            self.assertEqual(offloaded.call_count, 1)
+
+            response = await client.get(self.data_url + '?stream=json', headers=headers)
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(json.loads(gzip.decompress(body)), json.loads(self.plain))
+            self.assertGreater(offloaded.call_count, 1)
+
+
+class SeriesTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        path = os.path.join(self.workdir, 'equipment.csv')
+        self.df = write_equipment_csv(path, 5000)
+        self.pk = self.upload_dataset(path)
+        self.url = f'/api/series/{self.pk}/'
+
+    def test_every_parameter(self):
+        data = self.client.get(self.url, {'max_points': 200}).json()
+        self.assertEqual(data['total_points'], 5000)
+        self.assertEqual(data['method'], 'minmax')
+        self.assertEqual(sorted(data['series']), sorted(NUMERIC_COLUMNS))
+        flowrate = data['series']['Flowrate']
+        self.assertLessEqual(len(flowrate['index']), 200)
+        self.assertEqual(max(flowrate['values']), self.df['Flowrate'].max())
+        self.assertEqual(min(flowrate['values']), self.df['Flowrate'].min())
+        self.assertEqual(flowrate['values'], self.df['Flowrate'].iloc[flowrate['index']].tolist())
+
+    def test_lttb(self):
+        data = self.client.get(self.url, {'parameter': 'Pressure,Temperature', 'max_points': 50, 'method': 'lttb'}).json()
+        self.assertEqual(sorted(data['series']), ['Pressure', 'Temperature'])
+        self.assertEqual(len(data['series']['Pressure']['index']), 50)
+
+    @override_settings(ANALYTICS_MAX_SERIES_POINTS=300)
+    def test_max_points_is_capped(self):
+        data = self.client.get(self.url, {'parameter': 'Flowrate', 'max_points': 100000, 'method': 'lttb'}).json()
+        self.assertEqual(len(data['series']['Flowrate']['index']), 300)
+        data = self.client.get(self.url, {'parameter': 'Flowrate', 'max_points': 1, 'method': 'lttb'}).json()
+        self.assertEqual(len(data['series']['Flowrate']['index']), 3)
+
+    def test_invalid_parameters(self):
+        for query in ({'parameter': 'Flowrate,Speed'}, {'max_points': 'many'}, {'method': 'average'}):
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('error', response.json())
+
+    def test_other_users_dataset(self):
+        other = self.client_for(User.objects.create_user('other', password='other'))
+        self.assertEqual(other.get(self.url).status_code, 404)
+
+
+class PaginationTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        path = os.path.join(self.workdir, 'equipment.csv')
+        write_equipment_csv(path, 250)
+        self.pk = self.upload_dataset(path)
+        self.url = f'/api/data/{self.pk}/'
+        self.records = self.client.get(self.url).json()
+
+    def walk(self, url):
+        pages = []
+        while url:
+            page = self.client.get(url).json()
+            self.assertEqual(page['count'], 250)
+            pages.append(page)
+            url = page['next']
+        return pages
+
+    def test_offset_pages(self):
+        pages = self.walk(self.url + '?limit=100')
+        self.assertEqual([len(page['results']) for page in pages], [100, 100, 50])
+        self.assertEqual([row for page in pages for row in page['results']], self.records)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertIn('offset=100', pages[2]['previous'])
+
+    def test_cursor_pages(self):
+        pages = self.walk(self.url + '?cursor=&limit=100')
+        self.assertEqual([row for page in pages for row in page['results']], self.records)
+        self.assertNotIn('offset=', pages[1]['next'])
+        self.assertIn('cursor=', pages[1]['next'])
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    def test_without_the_sidecar(self):
+        path = UploadedDataset.objects.get(pk=self.pk).file.path
+        shutil.rmtree(path + '.columns')
+        page = self.client.get(self.url, {'offset': 240, 'limit': 20}).json()
+        self.assertEqual(page['count'], 250)
+        self.assertEqual(page['results'], self.records[240:])
+        self.assertIsNone(page['next'])
+
+    def test_past_the_end(self):
+        page = self.client.get(self.url, {'offset': 1000}).json()
+        self.assertEqual(page['results'], [])
+        self.assertIsNone(page['next'])
+
+    @override_settings(DATA_MAX_PAGE_SIZE=30)
+    def test_limit_is_capped(self):
+        page = self.client.get(self.url, {'limit': 1000}).json()
+        self.assertEqual(len(page['results']), 30)
+        self.assertIn('limit=30', page['next'])
+
+    def test_invalid_parameters(self):
+        for query in ({'limit': 0}, {'offset': -1}, {'limit': 'ten'}, {'cursor': 'not a cursor'}):
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, 400, query)
+
+
+@override_settings(DATA_STREAM_CHUNK_SIZE=64)
+class StreamingTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        path = os.path.join(self.workdir, 'equipment.csv')
+        write_equipment_csv(path, 300)
+        self.pk = self.upload_dataset(path)
+        self.url = f'/api/data/{self.pk}/'
+        self.records = self.client.get(self.url).json()
+
+    def stream(self, query='', **headers):
+        response = self.client.get(self.url + query, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        # One chunk of rows at a time, plus the brackets of the array
+        self.assertGreaterEqual(len(chunks), 300 // 64)
+        return response, b''.join(chunks)
+
+    def test_json_array(self):
+        response, body = self.stream('?stream=json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(body), self.records)
+
+    def test_ndjson(self):
+        for query, headers in (('?stream=ndjson', {}), ('', {'HTTP_ACCEPT': 'application/x-ndjson'})):
+            response, body = self.stream(query, **headers)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            self.assertEqual([json.loads(line) for line in body.decode().splitlines()], self.records)
+
+    def test_without_the_sidecar(self):
+        shutil.rmtree(UploadedDataset.objects.get(pk=self.pk).file.path + '.columns')
+        _, body = self.stream('?stream=json')
+        self.assertEqual(json.loads(body), self.records)
+        _, body = self.stream('?stream=ndjson')
+        self.assertEqual([json.loads(line) for line in body.decode().splitlines()], self.records)
+
+    def test_missing_values_are_null(self):
+        path = self.write_csv('gaps.csv', 'Type,Flowrate,Pressure,Temperature\nPump,1.5,,80\nValve,2.5,4.0,\n')
+        self.url = f'/api/data/{self.upload_dataset(path)}/'
+        response = self.client.get(self.url, {'stream': 'json'})
+        body = b''.join(response.streaming_content)
+        self.assertNotIn(b'NaN', body)
+        self.assertEqual([(row['Pressure'], row['Temperature']) for row in json.loads(body)], [(None, 80.0), (4.0, None)])
+
+    def test_errors_as_ndjson(self):
+        other = self.client_for(User.objects.create_user('other', password='other'))
+        response = other.get(self.url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content.count(b'\n'), 1)
+        self.assertIn('detail', json.loads(response.content))
+
+
+def decode_npcols(body):
+    """Rows of a NumpyColumnsRenderer body, as {name: list}."""
+    if body[:len(COLUMNS_MAGIC)] != COLUMNS_MAGIC:
+        raise ValueError("Not a column layout")
+    length, = struct.unpack('<I', body[len(COLUMNS_MAGIC):len(COLUMNS_MAGIC) + 4])
+    header = json.loads(body[len(COLUMNS_MAGIC) + 4:len(COLUMNS_MAGIC) + 4 + length])
+    start = -(-(len(COLUMNS_MAGIC) + 4 + length) // 8) * 8
+    columns = {}
+    for column in header['columns']:
+        # Every buffer is aligned, so it can be wrapped without a copy
+        offset = start + column['offset']
+        if offset % 8:
+            raise ValueError(f"Column {column['name']} is not aligned")
+        values = np.frombuffer(body, dtype=column['dtype'], count=column['length'], offset=offset)
+        if 'categories' in column:
+            columns[column['name']] = [column['categories'][code] if code >= 0 else None for code in values]
+        else:
+            columns[column['name']] = [None if value != value else value.item() for value in values]
+    return header['rows'], columns
+
+
+class ColumnarFormatTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        rows = [f"EQ-{i},{'Pump' if i % 3 else 'Valve'},{100 + i / 4},{'' if i == 7 else 5 + i / 100},80.5,{i}" for i in range(200)]
+        path = self.write_csv('equipment.csv', 'Equipment Name,Type,Flowrate,Pressure,Temperature,Batch\n' + '\n'.join(rows) + '\n')
+        self.pk = self.upload_dataset(path)
+        self.url = f'/api/data/{self.pk}/'
+        self.records = self.client.get(self.url).json()
+
+    def as_columns(self):
+        return {name: [record[name] for record in self.records] for name in self.records[0]}
+
+    def assertColumnsMatch(self, rows, columns):
+        self.assertEqual(rows, 200)
+        self.assertEqual(columns, self.as_columns())
+
+    def get(self, format, accept=None):
+        if accept:
+            response = self.client.get(self.url, HTTP_ACCEPT=accept)
+        else:
+            response = self.client.get(self.url, {'format': format})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def decode_columnar(self, data):
+        columns = {}
+        for column in data['columns']:
+            if column['dtype'] == 'dictionary':
+                columns[column['name']] = [column['categories'][code] if code >= 0 else None for code in column['codes']]
+            else:
+                columns[column['name']] = column['values']
+        return data['rows'], columns
+
+    def test_columnar_json(self):
+        for response in (self.get('columnar'), self.get(None, 'application/vnd.equipment.columnar+json')):
+            self.assertEqual(response['Content-Type'], 'application/vnd.equipment.columnar+json')
+            data = response.json()
+            self.assertEqual({column['name']: column['dtype'] for column in data['columns']}['Type'], 'dictionary')
+            self.assertColumnsMatch(*self.decode_columnar(data))
+
+    def test_numpy_columns(self):
+        for response in (self.get('npcols'), self.get(None, 'application/vnd.equipment.columns')):
+            self.assertEqual(response['Content-Type'], 'application/vnd.equipment.columns')
+            self.assertColumnsMatch(*decode_npcols(response.content))
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow(self):
+        response = self.get('arrow')
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        self.assertTrue(pyarrow.types.is_dictionary(table.schema.field('Type').type))
+        self.assertColumnsMatch(table.num_rows, table.to_pydict())
+
+    def test_without_the_sidecar(self):
+        shutil.rmtree(UploadedDataset.objects.get(pk=self.pk).file.path + '.columns')
+        self.assertColumnsMatch(*self.decode_columnar(self.get('columnar').json()))
+        self.assertColumnsMatch(*decode_npcols(self.get('npcols').content))
+
+    def test_errors_are_json(self):
+        other = self.client_for(User.objects.create_user('other', password='other'))
+        response = other.get(self.url, {'format': 'npcols'})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', json.loads(response.content))
+
+
+@override_settings(REPORT_WORKERS=1)
+class ReportBatchTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = []
+        for seed in range(3):
+            path = os.path.join(self.workdir, f'equipment-{seed}.csv')
+            write_equipment_csv(path, 100, seed=seed)
+            self.ids.append(self.upload_dataset(path, dataset_name=f'Plant {seed}'))
+
+    def batch(self, **data):
+        return self.client.post('/api/reports/', data, format='json')
+
+    def read_zip(self, response):
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_zip_of_every_dataset(self):
+        archive = self.read_zip(self.batch())
+        self.assertEqual(sorted(archive.namelist()), sorted(f'report_{pk}.pdf' for pk in self.ids))
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+        # Rendered reports are cached for the single report endpoint
+        self.assertEqual(len(os.listdir(settings.REPORT_CACHE_DIR)), 3)
+
+    @override_settings(REPORT_WORKERS=2)
+    def test_zip_rendered_in_parallel(self):
+        archive = self.read_zip(self.batch(ids=self.ids[:2]))
+        self.assertEqual(sorted(archive.namelist()), sorted(f'report_{pk}.pdf' for pk in self.ids[:2]))
+
+    def test_cached_reports_are_not_rendered_again(self):
+        self.assertEqual(self.client.get(f'/api/report/{self.ids[0]}/').status_code, 200)
+        with mock.patch('core.reports._render', side_effect=AssertionError('rendered')):
+            archive = self.read_zip(self.batch(ids=[self.ids[0]]))
+        self.assertEqual(archive.namelist(), [f'report_{self.ids[0]}.pdf'])
+
+    @skipIf(pypdf is None, "pypdf is not installed")
+    def test_combined_pdf(self):
+        order = [self.ids[2], self.ids[0], self.ids[2]]
+        response = self.batch(ids=order, output='pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        reader = pypdf.PdfReader(io.BytesIO(response.content))
+
+        # Requested order, without repeats, after the cover index
+        titles = [item.title for item in reader.outline]
+        self.assertEqual(titles, ['Plant 2', 'Plant 0'])
+        starts = [reader.get_destination_page_number(item) for item in reader.outline]
+        self.assertEqual(starts[0], 1)
+        cover = reader.pages[0].extract_text()
+        self.assertIn('Report Index', cover)
+        self.assertLess(cover.index('Plant 2'), cover.index('Plant 0'))
+        single = pypdf.PdfReader(io.BytesIO(b''.join(self.client.get(f'/api/report/{self.ids[2]}/').streaming_content)))
+        self.assertEqual(starts[1], 1 + len(single.pages))
+
+    def test_invalid_requests(self):
+        other = self.client_for(User.objects.create_user('other', password='other'))
+        self.assertEqual(self.batch(output='docx').status_code, 400)
+        self.assertEqual(self.batch(ids='all').status_code, 400)
+        self.assertEqual(self.batch(ids=[self.ids[0], 9999]).status_code, 404)
+        self.assertEqual(other.post('/api/reports/', {'ids': self.ids}, format='json').status_code, 404)
+        self.assertEqual(other.post('/api/reports/', {}, format='json').status_code, 400)
+        with override_settings(REPORT_BATCH_MAX=2):
+            self.assertEqual(self.batch().status_code, 400)
+
+
+class CompareTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.frames, self.ids = [], []
+        for seed in range(2):
+            path = os.path.join(self.workdir, f'equipment-{seed}.csv')
+            df = write_equipment_csv(path, 1000, seed=seed)
+            if seed:
+                # A type only the second dataset has
+                df.loc[10:19, 'Type'] = 'Mixer'
+                df.to_csv(path, index=False)
+            self.frames.append(df)
+            self.ids.append(self.upload_dataset(path, dataset_name=f'Run {seed}'))
+
+    def compare(self, **params):
+        params.setdefault('ids', ','.join(map(str, self.ids)))
+        return self.client.get('/api/compare/', params)
+
+    def test_side_by_side(self):
+        data = self.compare(q='50,95').json()
+        self.assertEqual([d['source'] for d in data['datasets']], ['stored', 'stored'])
+        self.assertEqual(data['baseline'], self.ids[0])
+
+        overall = data['types']['__all__']
+        self.assertEqual(overall['rows'], [1000, 1000])
+        flowrate = overall['parameters']['Flowrate']
+        means = [df['Flowrate'].mean() for df in self.frames]
+        np.testing.assert_allclose(flowrate['mean'], means, rtol=1e-9)
+        np.testing.assert_allclose(flowrate['delta']['mean'], [0, means[1] - means[0]], rtol=1e-9, atol=1e-9)
+        self.assertEqual(flowrate['max'], [df['Flowrate'].max() for df in self.frames])
+        for values, df in zip(flowrate['p95'], self.frames):
+            self.assertAlmostEqual(values / df['Flowrate'].quantile(0.95), 1, delta=0.02)
+        self.assertEqual(flowrate['overlap'][0], 1.0)
+        self.assertTrue(0 < flowrate['overlap'][1] <= 1)
+
+        mixer = data['types']['Mixer']
+        self.assertEqual(mixer['rows'], [None, 10])
+        self.assertEqual(mixer['parameters']['Pressure']['overlap'], [None, None])
+
+    def test_baseline(self):
+        data = self.compare(baseline=self.ids[1]).json()
+        deltas = data['types']['__all__']['delta']['rows']
+        self.assertEqual(deltas, [0, 0])
+        mean = data['types']['__all__']['parameters']['Temperature']
+        self.assertEqual(mean['delta']['mean'][1], 0)
+        self.assertAlmostEqual(mean['delta']['mean'][0], mean['mean'][0] - mean['mean'][1])
+
+    def test_datasets_without_state_are_analysed_once(self):
+        UploadedDataset.objects.filter(pk=self.ids[1]).update(analytics_state=None, quantile_sketches=None, histograms=None)
+        data = self.compare().json()
+        self.assertEqual([d['source'] for d in data['datasets']], ['stored', 'analysed'])
+        self.assertIsNotNone(UploadedDataset.objects.get(pk=self.ids[1]).analytics_state)
+        self.assertEqual([d['source'] for d in self.compare().json()['datasets']], ['stored', 'stored'])
+
+    def test_dataset_that_cannot_be_analysed(self):
+        dataset = UploadedDataset.objects.get(pk=self.ids[1])
+        UploadedDataset.objects.filter(pk=dataset.pk).update(analytics_state=None)
+        os.remove(dataset.file.path)
+        shutil.rmtree(dataset.file.path + '.columns')
+        response = self.compare()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Run 1', response.json()['error'])
+
+    def test_processing_datasets(self):
+        UploadedDataset.objects.filter(pk=self.ids[1]).update(summary_data={'status': 'queued'})
+        self.assertEqual(self.compare().status_code, 409)
+
+    def test_invalid_requests(self):
+        other = self.client_for(User.objects.create_user('other', password='other'))
+        ids = ','.join(map(str, self.ids))
+        for params in ({'ids': str(self.ids[0])}, {'ids': 'a,b'}, {'baseline': 9999}, {'q': '50,101'}):
+            self.assertEqual(self.compare(**params).status_code, 400, params)
+        with override_settings(COMPARE_MAX_DATASETS=1):
+            self.assertEqual(self.compare().status_code, 400)
+        self.assertEqual(other.get('/api/compare/', {'ids': ids}).status_code, 404)
+
+
+@override_settings(RETENTION_MAX_DATASETS=None, RETENTION_MAX_AGE_DAYS=None, RETENTION_MAX_BYTES=None)
+class RetentionTests(DatasetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        sweep = mock.patch('core.retention.submit_housekeeping', side_effect=lambda fn, *args: fn(*args))
+        sweep.start()
+        self.addCleanup(sweep.stop)
+        self.seed = 0
+
+    def upload_new(self, client=None, rows=100):
+        self.seed += 1
+        path = os.path.join(self.workdir, f'equipment-{self.seed}.csv')
+        write_equipment_csv(path, rows, seed=self.seed)
+        pk = self.upload_dataset(path, client=client)
+        # The report is cached too, and must go with the dataset
+        self.assertEqual((client or self.client).get(f'/api/report/{pk}/').status_code, 200)
+        return pk
+
+    def assertRemoved(self, pk, path):
+        self.assertFalse(UploadedDataset.objects.filter(pk=pk).exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + '.columns'))
+        self.assertFalse([name for name in os.listdir(settings.REPORT_CACHE_DIR) if name.startswith(f'{pk}-')])
+
+    def test_max_datasets(self):
+        first = self.upload_new()
+        path = UploadedDataset.objects.get(pk=first).file.path
+        with override_settings(RETENTION_MAX_DATASETS=2):
+            kept = [self.upload_new(), self.upload_new()]
+        self.assertRemoved(first, path)
+        self.assertEqual(sorted(UploadedDataset.objects.values_list('pk', flat=True)), sorted(kept))
+
+    @override_settings(RETENTION_MAX_AGE_DAYS=30)
+    def test_max_age_keeps_the_newest(self):
+        old, newest = self.upload_new(), self.upload_new()
+        path = UploadedDataset.objects.get(pk=old).file.path
+        UploadedDataset.objects.update(upload_timestamp=timezone.now() - timedelta(days=40))
+
+        self.assertEqual(apply_retention(self.user), 1)
+        self.assertRemoved(old, path)
+        self.assertTrue(UploadedDataset.objects.filter(pk=newest).exists())
+
+    def test_max_bytes_counts_shared_files_once(self):
+        first = self.upload_new(rows=400)
+        size = UploadedDataset.objects.get(pk=first).file_size
+        # A copy of the same content shares the file and adds nothing
+        with open(UploadedDataset.objects.get(pk=first).file.path, 'rb') as f:
+            copy = self.client.post('/api/upload/', {'file': f, 'dataset_name': 'Copy'}, format='multipart').data['id']
+        with override_settings(RETENTION_MAX_BYTES=size + 10):
+            self.assertEqual(apply_retention(self.user), 0)
+            self.upload_new(rows=5)
+        self.assertFalse(UploadedDataset.objects.filter(pk__in=[first, copy]).exists())
+
+    def test_other_users_are_left_alone(self):
+        other = self.client_for(User.objects.create_user('other', password='other'))
+        theirs = self.upload_new(client=other)
+        with override_settings(RETENTION_MAX_DATASETS=1):
+            self.upload_new()
+            self.upload_new()
+        self.assertTrue(UploadedDataset.objects.filter(pk=theirs).exists())
+
+    def test_sweep_orphans(self):
+        kept = self.upload_new()
+        upload_dir = os.path.dirname(UploadedDataset.objects.get(pk=kept).file.path)
+        stale = []
+        for name in ('lost.csv', 'lost.csv.columns', 'fresh.csv'):
+            path = os.path.join(upload_dir, name)
+            if name.endswith('.columns'):
+                os.makedirs(path)
+            else:
+                open(path, 'w').close()
+            stale.append(path)
+        stale.append(os.path.join(settings.REPORT_CACHE_DIR, '9999-abc.pdf'))
+        open(stale[-1], 'w').close()
+        for path in stale:
+            if 'fresh' not in path:
+                os.utime(path, (time.time() - 7200, time.time() - 7200))
+
+        self.assertEqual(sweep_orphans(grace=3600), 3)
+        self.assertEqual([os.path.exists(path) for path in stale], [False, False, True, False])
+        self.assertEqual(self.client.get(f'/api/data/{kept}/').status_code, 200)
+        self.assertEqual(len(os.listdir(settings.REPORT_CACHE_DIR)), 1)
+
+    def test_enforce_retention_command(self):
+        for _ in range(3):
+            self.upload_new()
+        out = io.StringIO()
+        with override_settings(RETENTION_MAX_DATASETS=1):
+            call_command('enforce_retention', grace=0, stdout=out)
+        self.assertIn('Deleted 2 dataset(s)', out.getvalue())
+        self.assertEqual(UploadedDataset.objects.count(), 1)
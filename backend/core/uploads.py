@@ -0,0 +1,248 @@
+"""
+Upload handlers. They run while Django parses the multipart body, so they
+see every chunk of an uploaded file exactly once.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+
+from .columnar import ColumnarWriter, remove_sidecar
+from .utils import CSVChunkParser, SummaryAccumulator, is_csv_name
+
+# Received bytes are parsed in blocks of about this size (handlers get 64 KB
+# pieces, too small to parse one by one efficiently)
+PARSE_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes the SHA-256 of each uploaded file as it streams in and records
+    it in request.upload_hashes[field_name]. The data is passed on unchanged
+    to the next handler, which stores the file as usual.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_hashes'):
+            self.request.upload_hashes = {}
+        self.request.upload_hashes[self.field_name] = self.hasher.hexdigest()
+        # Let the next handler build the file object
+        return None
+
+
+def upload_hash(request, field_name='file'):
+    """
+    SHA-256 of an uploaded file, as recorded by HashingUploadHandler, or
+    computed from the stored upload if the handler is not installed.
+    """
+    django_request = getattr(request, '_request', request)
+    digest = getattr(django_request, 'upload_hashes', {}).get(field_name)
+    if digest:
+        return digest
+
+    upload = request.FILES.get(field_name)
+    if upload is None:
+        return ''
+    hasher = hashlib.sha256()
+    for chunk in upload.chunks():
+        hasher.update(chunk)
+    upload.seek(0)
+    return hasher.hexdigest()
+
+
+class StreamedUploadedFile(UploadedFile):
+    """
+    A CSV that StreamingCSVUploadHandler has already stored (as
+    `storage_name`) and, unless it only stored it, analysed: `summary` and
+    `accumulator` are then what analyze_csv() would return for it, and its
+    columnar sidecar is written.
+    """
+
+    def __init__(self, storage_name, name, content_type, size, charset, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.storage_name = storage_name
+        self.summary = None
+        self.accumulator = None
+
+    @property
+    def analysed(self):
+        return self.summary is not None
+
+    def open(self, mode='rb'):
+        self.file = default_storage.open(self.storage_name, mode)
+        return self
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def discard(self):
+        """Deletes the stored file and its sidecar (e.g. the upload was rejected)."""
+        path = default_storage.path(self.storage_name)
+        if os.path.isfile(path):
+            os.remove(path)
+        remove_sidecar(path)
+
+
+class StreamingCSVUploadHandler(FileUploadHandler):
+    """
+    Receives CSV uploads in a single pass: every chunk is written straight
+    to its final place in storage (`model_field`'s upload_to), hashed, and
+    parsed into the analytics accumulator and the columnar sidecar, so the
+    stored file never has to be read again. The file comes out as a
+    StreamedUploadedFile.
+
+    The header is validated as soon as it arrives. An invalid file is
+    skipped (the rest of it is read but not stored) and the error recorded
+    in request.upload_errors[field_name]. Files is_csv_name() does not
+    accept are left to the next handlers.
+
+    With analyze=False (the analytics are left to a job) the file is only
+    stored, hashed and its header validated.
+    """
+
+    def __init__(self, request, model_field, analyze=True):
+        super().__init__(request)
+        self.model_field = model_field
+        self.analyze = analyze
+        self.active = False
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        # Files the serializer would refuse are left to the other handlers
+        self.active = is_csv_name(file_name)
+        if not self.active:
+            return
+
+        self.storage_name, self.file = self._create(self.model_field.generate_filename(None, file_name))
+        self.hasher = hashlib.sha256()
+        self.parser = CSVChunkParser(all_columns=True)
+        self.accumulator = SummaryAccumulator()
+        self.writer = None
+        self.error = None
+        self.blocks = []
+        self.buffered = 0
+        # The data stops here
+        raise StopFutureHandlers()
+
+    def _create(self, name):
+        """Reserves a free storage name, as Storage.save() does, and opens it for writing."""
+        while True:
+            name = default_storage.get_available_name(name)
+            path = default_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                return name, open(path, 'xb')
+            except FileExistsError:
+                continue
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        self.file.write(raw_data)
+        self.hasher.update(raw_data)
+        if not self.analyzing():
+            return None
+        self.blocks.append(raw_data)
+        self.buffered += len(raw_data)
+        # Until the header is complete every piece is parsed, so that a bad
+        # file is rejected with its first chunk
+        if self.parser.header is None or self.buffered >= PARSE_BLOCK_BYTES:
+            self._analyze(self.parser.feed, self._take_blocks())
+            if self.invalid_header():
+                self._reject()
+                raise SkipFile()
+        return None
+
+    def analyzing(self):
+        # Without the analytics only the header is parsed
+        return self.analyze or self.parser.header is None
+
+    def _take_blocks(self):
+        data = b''.join(self.blocks)
+        self.blocks = []
+        self.buffered = 0
+        return data
+
+    def _analyze(self, parse, *args):
+        # After an error the rest of the file is only stored, as analyze_csv
+        # keeps the file and reports the error in the summary
+        if self.error:
+            return
+        try:
+            df = parse(*args)
+            if df is not None and self.analyze:
+                if self.writer is None:
+                    self.writer = ColumnarWriter(self.file.name, self.parser.sources)
+                self.accumulator.update(df)
+                self.writer.append(df)
+        except Exception as e:
+            self.error = str(e)
+
+    def invalid_header(self):
+        return self.error is not None and self.parser.header is None
+
+    def _reject(self):
+        self.active = False
+        self._remove()
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = self.error
+
+    def _remove(self):
+        self.file.close()
+        if self.writer:
+            self.writer.abort()
+        os.remove(self.file.name)
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if self.analyzing():
+            self._analyze(self.parser.feed, self._take_blocks())
+            self._analyze(self.parser.finish)
+        self.file.close()
+
+        upload = StreamedUploadedFile(self.storage_name, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra)
+        if self.invalid_header():
+            # A header without a newline; too late to skip the file
+            self._reject()
+            return upload
+
+        # Only stored: the summary stays None
+        if self.analyze and self.error:
+            upload.summary = {"error": self.error}
+        elif self.analyze and not self.accumulator.total_count:
+            upload.summary = {"error": "Dataset is empty"}
+        elif self.analyze:
+            upload.summary = self.accumulator.summary()
+            upload.accumulator = self.accumulator
+        if self.writer and upload.accumulator:
+            self.writer.close()
+        elif self.writer:
+            self.writer.abort()
+
+        if not hasattr(self.request, 'upload_hashes'):
+            self.request.upload_hashes = {}
+        self.request.upload_hashes[self.field_name] = self.hasher.hexdigest()
+        return upload
+
+    def upload_interrupted(self):
+        if self.active:
+            self._remove()
+
+
+def upload_error(request, field_name='file'):
+    """Why StreamingCSVUploadHandler rejected an uploaded file, or None."""
+    django_request = getattr(request, '_request', request)
+    return getattr(django_request, 'upload_errors', {}).get(field_name)
@@ -3,8 +3,10 @@ print("LOADING CORE URLS")
 
 from .views import (
     RegisterView, LoginView, 
-    UploadCSVView, UploadHistoryView, DatasetSummaryView,
-    DatasetReportView, DatasetDataView
+    UploadCSVView, UploadSessionListView, UploadSessionView, UploadSessionCompleteView, UploadHistoryView, DatasetSummaryView,
+    DatasetReportView, ReportBatchView, DatasetDataView, DatasetPercentilesView,
+    DatasetHistogramView, DatasetSeriesView, DatasetCompareView, JobStatusView,
+    AuthCacheStatsView
 )
 
 urlpatterns = [
@@ -14,8 +16,20 @@ urlpatterns = [
     
     # Data
     path('upload/', UploadCSVView.as_view(), name='upload-csv'),
+    path('uploads/', UploadSessionListView.as_view(), name='upload-sessions'),
+    path('uploads/<uuid:pk>/', UploadSessionView.as_view(), name='upload-session'),
+    path('uploads/<uuid:pk>/complete/', UploadSessionCompleteView.as_view(), name='upload-session-complete'),
     path('history/', UploadHistoryView.as_view(), name='upload-history'),
     path('summary/<int:pk>/', DatasetSummaryView.as_view(), name='dataset-summary'),
     path('data/<int:pk>/', DatasetDataView.as_view(), name='dataset-data'),
     path('report/<int:pk>/', DatasetReportView.as_view(), name='dataset-report'),
+    path('reports/', ReportBatchView.as_view(), name='report-batch'),
+    path('series/<int:pk>/', DatasetSeriesView.as_view(), name='dataset-series'),
+    path('percentiles/<int:pk>/', DatasetPercentilesView.as_view(), name='dataset-percentiles'),
+    path('histograms/<int:pk>/', DatasetHistogramView.as_view(), name='dataset-histograms'),
+    path('compare/', DatasetCompareView.as_view(), name='dataset-compare'),
+    path('jobs/<int:pk>/', JobStatusView.as_view(), name='job-status'),
+
+    # Monitoring
+    path('auth-cache/', AuthCacheStatsView.as_view(), name='auth-cache-stats'),
 ]
@@ -1,86 +1,541 @@
+import io
+import json
+import logging
+import os
 import pandas as pd
 import numpy as np
+from django.conf import settings
+
+from .columnar import ColumnarDataset, ColumnarWriter
+from .histograms import FixedWidthHistogram, quantile_bins
+from .sketches import QuantileSketch
+from .stats import StatsState
+
+logger = logging.getLogger(__name__)
 
 REQUIRED_COLUMNS = ['EquipmentType', 'Flowrate', 'Pressure', 'Temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+
+# Map known aliases to standard names
+COLUMN_MAPPING = {
+    'type': 'EquipmentType',
+    'equipment type': 'EquipmentType',
+    'equipmenttype': 'EquipmentType',
+    'equipment_type': 'EquipmentType',
+    'flowrate': 'Flowrate',
+    'flow rate': 'Flowrate',
+    'flow_rate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+    'temp': 'Temperature'
+}
+
 
-def process_csv_analytics(file_path):
+def is_csv_name(name):
+    """Whether an uploaded file name is accepted as a CSV (the same rule everywhere)."""
+    return name.endswith('.csv')
+
+
+def resolve_columns(columns):
     """
-    Parses CSV and returns summary statistics.
+    Maps original column names to standard names (case insensitive).
+    Columns without a known alias are left out.
     """
-    try:
-        df = pd.read_csv(file_path)
-        
-        # Normalize columns: strip spaces, lower case, handles aliases
-        # Map known aliases to standard names
-        column_mapping = {
-            'type': 'EquipmentType',
-            'equipment type': 'EquipmentType',
-            'equipmenttype': 'EquipmentType',
-            'equipment_type': 'EquipmentType',
-            'flowrate': 'Flowrate',
-            'flow rate': 'Flowrate',
-            'flow_rate': 'Flowrate',
-            'pressure': 'Pressure',
-            'temperature': 'Temperature',
-            'temp': 'Temperature'
-        }
-        
-        # Rename columns based on mapping (case insensitive)
-        new_columns = {}
-        for col in df.columns:
-            col_lower = col.strip().lower()
-            if col_lower in column_mapping:
-                new_columns[col] = column_mapping[col_lower]
-        
-        df.rename(columns=new_columns, inplace=True)
+    # Normalize columns: strip spaces, lower case, handles aliases
+    new_columns = {}
+    for col in columns:
+        col_lower = col.strip().lower()
+        if col_lower in COLUMN_MAPPING:
+            new_columns[col] = COLUMN_MAPPING[col_lower]
+    return new_columns
+
+
+def sniff_header(file_path):
+    """
+    Phase one of the reader: parses only the header row.
+    Returns (sources, error). `sources` maps each standard column to the
+    original header it was resolved from; `error` describes missing columns
+    and is None for a valid header.
+    """
+    header = list(pd.read_csv(file_path, nrows=0).columns)
+    mapping = resolve_columns(header)
+
+    sources = {}
+    for col in header:
+        if col in mapping:
+            sources.setdefault(mapping[col], col)
+
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in sources]
+    if missing_cols:
+        found = [mapping.get(col, col) for col in header]
+        return sources, f"Missing columns: {', '.join(missing_cols)}. Found: {found}"
+    return sources, None
+
+
+def read_csv_chunks(file_path, chunksize=None, progress=None, **kwargs):
+    """
+    Yields the CSV as DataFrames.
+    Files larger than ANALYTICS_STREAMING_THRESHOLD are read in chunks of
+    ANALYTICS_CHUNK_SIZE rows, smaller ones in a single piece. Extra keyword
+    arguments (usecols, dtype, ...) are passed on to pd.read_csv.
+
+    `progress`, if given, is called with the fraction of the file read so
+    far after every chunk.
+    """
+    size = os.path.getsize(file_path)
+    if chunksize is None and size > settings.ANALYTICS_STREAMING_THRESHOLD:
+        chunksize = settings.ANALYTICS_CHUNK_SIZE
+
+    with open(file_path, 'rb') as handle:
+        if chunksize:
+            with pd.read_csv(handle, chunksize=chunksize, **kwargs) as reader:
+                for df in reader:
+                    yield df
+                    if progress:
+                        progress(min(handle.tell() / size, 1.0) if size else 1.0)
+        else:
+            yield pd.read_csv(handle, **kwargs)
+            if progress:
+                progress(1.0)
+
+
+def load_dataset_frame(file_path):
+    """
+    Whole dataset with its original column names, memory-mapped from the
+    sidecar when available.
+    """
+    columnar = ColumnarDataset.open(file_path)
+    if columnar is None:
+        return pd.read_csv(file_path)
+    return columnar.frame(original_names=True)
+
+
+def load_dataset_page(file_path, offset, limit):
+    """
+    Rows [offset, offset + limit) with their original column names, and the
+    total row count. The sidecar is sliced directly (no parsing); without it
+    the CSV is read, skipping the rows before offset, and the count is None.
+    """
+    columnar = ColumnarDataset.open(file_path)
+    if columnar is not None:
+        return columnar.frame(start=offset, stop=offset + limit, original_names=True), columnar.rows
 
-        # Validation
-        missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-        if missing_cols:
-            return {"error": f"Missing columns: {', '.join(missing_cols)}. Found: {list(df.columns)}"}
+    return pd.read_csv(file_path, skiprows=range(1, offset + 1), nrows=limit), None
 
-        # Basic Checks
+
+def load_dataset_columns(file_path):
+    """
+    Whole dataset as {"rows": n, "columns": [...]}, one numpy array per
+    column under its original name (see core.renderers for the layout).
+    Sidecar columns are handed out memory-mapped; text is dictionary-encoded.
+    """
+    columns = []
+    columnar = ColumnarDataset.open(file_path)
+    if columnar is not None:
+        for name, column in columnar.columns.items():
+            values = columnar.array(name)
+            if column["encoding"] == "dictionary":
+                columns.append({"name": column["source"], "dtype": "dictionary", "codes": values, "categories": columnar.categories(name)})
+            elif column.get("integral"):
+                columns.append({"name": column["source"], "dtype": "int64", "values": values.astype('int64')})
+            else:
+                columns.append({"name": column["source"], "dtype": "float64", "values": values})
+        return {"rows": columnar.rows, "columns": columns}
+
+    df = pd.read_csv(file_path)
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_integer_dtype(series):
+            columns.append({"name": name, "dtype": "int64", "values": series.to_numpy(dtype='int64')})
+        elif pd.api.types.is_numeric_dtype(series):
+            columns.append({"name": name, "dtype": "float64", "values": series.to_numpy(dtype='float64', na_value=np.nan)})
+        else:
+            codes, categories = pd.factorize(series)
+            columns.append({"name": name, "dtype": "dictionary", "codes": codes.astype('int32'), "categories": [str(c) for c in categories]})
+    return {"rows": len(df), "columns": columns}
+
+
+def iter_dataset_json(file_path, chunksize, lines=False):
+    """
+    Yields the dataset as JSON text, chunk by chunk: one JSON array, or one
+    object per line with lines=True (NDJSON). NaN becomes null. Only one
+    chunk of rows is held in memory at a time.
+    """
+    columnar = ColumnarDataset.open(file_path)
+    if columnar is not None:
+        chunks = columnar.chunks(chunksize, original_names=True)
+    else:
+        chunks = read_csv_chunks(file_path, chunksize)
+
+    first = True
+    if not lines:
+        yield '['
+    for df in chunks:
         if df.empty:
-            return {"error": "Dataset is empty"}
+            continue
+        rows = [json.dumps(row, separators=(',', ':')) for row in frame_to_records(df)]
+        if lines:
+            yield '\n'.join(rows) + '\n'
+        else:
+            yield ('' if first else ',') + ','.join(rows)
+        first = False
+    if not lines:
+        yield ']'
 
-        # Analytics
-        total_count = len(df)
-        
-        # Equipment Type Distribution
-        type_dist = df['EquipmentType'].value_counts().to_dict()
-        
-        # Averages (handling potential non-numeric data gracefully)
-        avg_flowrate = pd.to_numeric(df['Flowrate'], errors='coerce').mean()
-        avg_pressure = pd.to_numeric(df['Pressure'], errors='coerce').mean()
-        avg_temperature = pd.to_numeric(df['Temperature'], errors='coerce').mean()
-
-        # Handle NaNs (replace with 0 or None for JSON serialization)
-        summary = {
-            "total_count": int(total_count),
-            "avg_flowrate": float(avg_flowrate) if not np.isnan(avg_flowrate) else 0.0,
-            "avg_pressure": float(avg_pressure) if not np.isnan(avg_pressure) else 0.0,
-            "avg_temperature": float(avg_temperature) if not np.isnan(avg_temperature) else 0.0,
-            "equipment_type_distribution": type_dist
+
+def load_numeric_columns(file_path, columns):
+    """
+    {standard column: float64 array} for the given numeric columns,
+    memory-mapped from the sidecar when available (invalid values -> NaN).
+    """
+    columnar = ColumnarDataset.open(file_path)
+    if columnar is not None:
+        return {col: columnar.numbers(col) for col in columns}
+
+    sources, error = sniff_header(file_path)
+    if error:
+        raise ValueError(error)
+    df = pd.read_csv(file_path, usecols=[sources[col] for col in columns])
+    return {
+        col: pd.to_numeric(df[sources[col]], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        for col in columns
+    }
+
+
+def frame_to_records(df):
+    """
+    DataFrame -> list of row dicts with NaN replaced by None (valid JSON).
+    """
+    df = df.astype(object)
+    return df.where(pd.notnull(df), None).to_dict(orient='records')
+
+
+class SummaryAccumulator:
+    """
+    Running aggregates behind summary_data, updated one chunk at a time.
+    Only counts, sums, the mergeable StatsState, the quantile sketches and
+    the histograms are kept, so memory does not grow with row count.
+    """
+
+    def __init__(self):
+        self.total_count = 0
+        self.sums = dict.fromkeys(NUMERIC_COLUMNS, 0.0)
+        self.counts = dict.fromkeys(NUMERIC_COLUMNS, 0)
+        self.stats = StatsState()
+        self.sketch = QuantileSketch(NUMERIC_COLUMNS, settings.ANALYTICS_QUANTILE_ACCURACY, settings.ANALYTICS_SKETCH_MAX_BINS)
+        self.histogram = FixedWidthHistogram(NUMERIC_COLUMNS, settings.ANALYTICS_HISTOGRAM_BINS)
+
+    def update(self, df):
+        self.total_count += len(df)
+
+        # Non-numeric values are coerced to NaN and skipped, as in mean()
+        values = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce')
+        for col in NUMERIC_COLUMNS:
+            self.sums[col] += float(values[col].sum())
+            self.counts[col] += int(values[col].count())
+
+        # One groupby pass per chunk feeds both the per-type statistics and
+        # the type distribution
+        self.stats.merge(StatsState.from_frame(values, df['EquipmentType']))
+        self.sketch.update(values, df['EquipmentType'])
+        self.histogram.update(values, df['EquipmentType'])
+
+    def mean(self, col):
+        if not self.counts[col]:
+            return 0.0
+        return self.sums[col] / self.counts[col]
+
+    def summary(self):
+        # Types are kept in order of first appearance, so a stable sort breaks
+        # ties exactly like value_counts() on the whole file
+        type_dist = self.stats.type_counts().sort_values(ascending=False, kind='stable').to_dict()
+        return {
+            "total_count": int(self.total_count),
+            "avg_flowrate": self.mean('Flowrate'),
+            "avg_pressure": self.mean('Pressure'),
+            "avg_temperature": self.mean('Temperature'),
+            "equipment_type_distribution": type_dist,
+            "type_statistics": self.stats.type_statistics(),
+        }
+
+    def histograms(self):
+        """
+        Fixed-width (mergeable state) and equal-frequency histograms of every
+        parameter, overall and per type, as stored on the dataset.
+        """
+        return {
+            "fixed": self.histogram.to_dict(),
+            "quantile": quantile_bins(self.histogram, self.sketch, settings.ANALYTICS_QUANTILE_BINS),
         }
-        
-        return summary
+
+    def to_dict(self):
+        """Complete state, so a pass can be resumed later (see core.resumable)."""
+        return {
+            "total_count": self.total_count,
+            "sums": self.sums,
+            "counts": self.counts,
+            "stats": self.stats.to_dict(),
+            "sketch": self.sketch.to_dict(),
+            "histogram": self.histogram.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        accumulator = cls()
+        if data:
+            accumulator.total_count = data["total_count"]
+            accumulator.sums = data["sums"]
+            accumulator.counts = data["counts"]
+            accumulator.stats = StatsState.from_dict(data["stats"])
+            accumulator.sketch = QuantileSketch.from_dict(data["sketch"])
+            accumulator.histogram = FixedWidthHistogram.from_dict(data["histogram"])
+        return accumulator
+
+
+def complete_lines_end(data):
+    """
+    Length of the longest prefix of `data` made of whole CSV lines. Newlines
+    inside quoted fields don't end a line (`data` must start outside quotes).
+    """
+    end = data.rfind(b'\n') + 1
+    while end and data.count(b'"', 0, end) % 2:
+        end = data.rfind(b'\n', 0, end - 1) + 1
+    return end
+
+
+class CSVChunkParser:
+    """
+    Parses a CSV arriving as arbitrary byte chunks (an upload in progress)
+    into DataFrames of complete rows with standard column names.
+
+    feed() takes the next bytes and returns the rows they complete, or None;
+    a partial last line is kept in `pending` until more data or finish().
+    The header is validated as soon as it is complete (ValueError if
+    required columns are missing). `header` resumes a parser whose header
+    was already seen. With all_columns=True every column is parsed (e.g.
+    for the columnar sidecar), otherwise only the required ones.
+    """
+
+    def __init__(self, header=None, all_columns=False):
+        self.header = None
+        self.all_columns = all_columns
+        self.pending = b''
+        if header is not None:
+            self._set_header(header)
+
+    def _set_header(self, header):
+        sources, error = sniff_header(io.BytesIO(header))
+        if error:
+            raise ValueError(error)
+        self.header = header
+        self.sources = sources
+        self.usecols = None if self.all_columns else [sources[col] for col in REQUIRED_COLUMNS]
+        self.renames = {original: col for col, original in sources.items()}
+        self.dtype = {sources['EquipmentType']: 'category'}
+
+    def feed(self, data):
+        data = self.pending + data
+        if self.header is None:
+            end = data.find(b'\n') + 1
+            if not end:
+                self.pending = data
+                return None
+            self._set_header(data[:end])
+            data = data[end:]
+        end = complete_lines_end(data)
+        self.pending = data[end:]
+        return self._parse(data[:end])
+
+    def finish(self):
+        """Rows of a last line without a trailing newline."""
+        data, self.pending = self.pending, b''
+        if self.header is None:
+            if data.strip():
+                self._set_header(data)
+            return None
+        return self._parse(data)
+
+    def _parse(self, lines):
+        if not lines.strip():
+            return None
+        # Numeric columns are coerced by the accumulator, as in analyze_csv
+        df = pd.read_csv(io.BytesIO(self.header + lines), usecols=self.usecols, dtype=self.dtype, low_memory=False)
+        return df.rename(columns=self.renames)
+
+
+def process_csv_analytics(file_path, chunksize=None):
+    """
+    Parses CSV and returns summary statistics.
+    Large files are streamed in chunks (see read_csv_chunks), so peak memory
+    depends on the chunk size and not on the file size.
+    """
+    summary, _ = analyze_csv(file_path, chunksize)
+    return summary
+
+
+def analyze_csv(file_path, chunksize=None, write_sidecar=False, progress=None):
+    """
+    Single analytics pass over the CSV.
+    Returns (summary, accumulator); the accumulator carries the mergeable
+    state (stats, sketch) and is None when the summary is an error.
+
+    The header is validated before any data is parsed, then only the
+    columns that are needed are read, with EquipmentType as category. The
+    numeric columns keep the type pandas infers for each chunk (text if a
+    cell is not a number) and are coerced by the accumulator, so a bad
+    value late in the file costs nothing extra.
+
+    With write_sidecar=True the same pass also writes the columnar sidecar
+    (see core.columnar), so every column is read; otherwise an existing
+    sidecar is used instead of the CSV.
+
+    `progress` is called with the fraction processed so far (0..1).
+    """
+    try:
+        if not write_sidecar:
+            columnar = ColumnarDataset.open(file_path)
+            if columnar is not None:
+                chunks = columnar.chunks(chunksize or settings.ANALYTICS_CHUNK_SIZE, columns=REQUIRED_COLUMNS)
+                return _analyze_chunks(chunks, progress=progress, total_rows=columnar.rows)
+
+        # Phase 1: header only, so invalid files are rejected without a parse
+        sources, error = sniff_header(file_path)
+        if error:
+            return {"error": error}, None
+
+        # Phase 2: parse with usecols/dtype pushdown
+        usecols = None if write_sidecar else [sources[col] for col in REQUIRED_COLUMNS]
+        renames = {original: col for col, original in sources.items()}
+        dtype = {sources['EquipmentType']: 'category'}
+        # low_memory=False: one type per column and chunk instead of mixed
+        # types when a bad value shows up part way through a chunk
+        chunks = read_csv_chunks(file_path, chunksize, progress, usecols=usecols, dtype=dtype, low_memory=False)
+        return _analyze_chunks(chunks, renames, sources if write_sidecar else None, file_path)
 
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(e)}, None
+
+
+def write_sidecar(file_path):
+    """
+    Writes the columnar sidecar of a CSV whose analytics are already known
+    (e.g. computed while it was uploaded). Returns False for an invalid file.
+    """
+    sources, error = sniff_header(file_path)
+    if error:
+        return False
+    renames = {original: col for col, original in sources.items()}
+    writer = ColumnarWriter(file_path, sources)
+    try:
+        for df in read_csv_chunks(file_path, dtype={sources['EquipmentType']: 'category'}):
+            df.rename(columns=renames, inplace=True)
+            writer.append(df)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+    return True
+
+
+def _analyze_chunks(chunks, renames=None, sidecar_sources=None, file_path=None, progress=None, total_rows=None):
+    accumulator = SummaryAccumulator()
+    writer = None
+    if sidecar_sources is not None:
+        writer = ColumnarWriter(file_path, sidecar_sources)
+
+    try:
+        for df in chunks:
+            if renames:
+                df.rename(columns=renames, inplace=True)
+            accumulator.update(df)
+            if writer:
+                writer.append(df)
+            # CSV chunks report progress by bytes read (see read_csv_chunks)
+            if progress and total_rows:
+                progress(min(accumulator.total_count / total_rows, 1.0))
+    except Exception:
+        if writer:
+            writer.abort()
+        raise
+
+    # Basic Checks
+    if accumulator.total_count == 0:
+        if writer:
+            writer.abort()
+        return {"error": "Dataset is empty"}, None
+
+    if writer:
+        writer.close()
+    return accumulator.summary(), accumulator
+
+
+_report_theme = None
+
+
+def report_theme():
+    """
+    ReportLab style sheet and colours of the report. Built once per process
+    and shared by every report rendered in it.
+    """
+    global _report_theme
+    if _report_theme is None:
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+        styles = getSampleStyleSheet()
+
+        # Custom Styles
+        # Use explicit Hex for colors to avoid AttributeError if standard color name is missing
+        white_color = colors.HexColor('#FFFFFF')
+        whitesmoke_color = colors.HexColor('#F5F5F5')
+        deep_purple = colors.HexColor('#2D1B69')
+
+        styles.add(ParagraphStyle(name='HeaderTitle', parent=styles['Heading1'], fontName='Helvetica-Bold', fontSize=24, textColor=white_color, alignment=1)) # Center
+        styles.add(ParagraphStyle(name='HeaderSub', parent=styles['Normal'], fontName='Helvetica', fontSize=12, textColor=whitesmoke_color, alignment=1))
+        styles.add(ParagraphStyle(name='SectionTitle', parent=styles['Heading2'], fontName='Helvetica-Bold', fontSize=18, textColor=deep_purple, spaceAfter=12))
+        styles.add(ParagraphStyle(name='CardValue', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=20, textColor=deep_purple, alignment=1))
+        styles.add(ParagraphStyle(name='CardLabel', parent=styles['Normal'], fontName='Helvetica', fontSize=10, textColor=colors.gray, alignment=1))
+
+        # Colors scheme (Frontend Palette)
+        palette = [
+            '#2D1B69', '#673AB7', '#E91E63', '#03A9F4',
+            '#00BCD4', '#009688', '#4CAF50', '#FFC107', '#FF5722'
+        ]
+
+        _report_theme = {
+            "styles": styles,
+            "whitesmoke": whitesmoke_color,
+            "deep_purple": deep_purple,
+            "palette": [colors.HexColor(color_hex) for color_hex in palette],
+        }
+    return _report_theme
+
+
+def report_context(dataset):
+    """Plain values a report is rendered from, so it can be built in another process."""
+    return {
+        "id": dataset.id,
+        "dataset_name": dataset.dataset_name,
+        "username": dataset.user.username,
+        "date": dataset.upload_timestamp.strftime('%Y-%m-%d'),
+        "summary": dataset.summary_data,
+    }
 
-import io
 
 def generate_pdf_report(dataset):
     """
     Generates a PDF report for the given dataset summary.
     Returns a BytesIO buffer containing the PDF.
     """
+    return render_pdf_report(report_context(dataset))
+
+
+def render_pdf_report(context):
+    """Renders the report of a report_context() dict into a BytesIO buffer."""
     # Lazy Import to prevent startup crashes if reportlab has issues
     from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
     from reportlab.lib import colors
     from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     from reportlab.lib.units import inch
     from reportlab.graphics.shapes import Drawing
     from reportlab.graphics.charts.barcharts import VerticalBarChart
@@ -89,25 +544,17 @@ def generate_pdf_report(dataset):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
     elements = []
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles
-    # Use explicit Hex for colors to avoid AttributeError if standard color name is missing
-    white_color = colors.HexColor('#FFFFFF')
-    whitesmoke_color = colors.HexColor('#F5F5F5')
-    deep_purple = colors.HexColor('#2D1B69')
-    
-    styles.add(ParagraphStyle(name='HeaderTitle', parent=styles['Heading1'], fontName='Helvetica-Bold', fontSize=24, textColor=white_color, alignment=1)) # Center
-    styles.add(ParagraphStyle(name='HeaderSub', parent=styles['Normal'], fontName='Helvetica', fontSize=12, textColor=whitesmoke_color, alignment=1))
-    styles.add(ParagraphStyle(name='SectionTitle', parent=styles['Heading2'], fontName='Helvetica-Bold', fontSize=18, textColor=deep_purple, spaceAfter=12))
-    styles.add(ParagraphStyle(name='CardValue', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=20, textColor=deep_purple, alignment=1))
-    styles.add(ParagraphStyle(name='CardLabel', parent=styles['Normal'], fontName='Helvetica', fontSize=10, textColor=colors.gray, alignment=1))
+    theme = report_theme()
+    styles = theme["styles"]
+    whitesmoke_color = theme["whitesmoke"]
+    deep_purple = theme["deep_purple"]
+    palette = theme["palette"]
 
     # --- 1. Modern Dark Header ---
     header_data = [
         [Paragraph(f"Analysis Report", styles['HeaderTitle'])],
-        [Paragraph(f"{dataset.dataset_name}", styles['HeaderSub'])],
-        [Paragraph(f"Uploaded by: {dataset.user.username} | Date: {dataset.upload_timestamp.strftime('%Y-%m-%d')}", styles['HeaderSub'])]
+        [Paragraph(f"{context['dataset_name']}", styles['HeaderSub'])],
+        [Paragraph(f"Uploaded by: {context['username']} | Date: {context['date']}", styles['HeaderSub'])]
     ]
     
     header_table = Table(header_data, colWidths=[7.5*inch])
@@ -123,7 +570,7 @@ def generate_pdf_report(dataset):
     # --- 2. Key Metrics Cards ---
     elements.append(Paragraph("Key Metrics", styles['SectionTitle']))
     
-    summary = dataset.summary_data
+    summary = context['summary']
     if not summary or "error" in summary:
         elements.append(Paragraph("No valid analysis data found.", styles['Normal']))
     else:
@@ -199,23 +646,16 @@ def generate_pdf_report(dataset):
             bc.categoryAxis.labels.angle = 45 # Rotate 45 degrees to prevent overlap
             bc.categoryAxis.categoryNames = labels
             
-            # Colors scheme (Frontend Palette)
-            palette = [
-                '#2D1B69', '#673AB7', '#E91E63', '#03A9F4', 
-                '#00BCD4', '#009688', '#4CAF50', '#FFC107', '#FF5722'
-            ]
-            
             # Apply individual bar colors
             for i in range(len(values)):
-                color_hex = palette[i % len(palette)]
-                bc.bars[(0, i)].fillColor = colors.HexColor(color_hex)
+                bc.bars[(0, i)].fillColor = palette[i % len(palette)]
             
             # Legend
             legend = Legend()
             legend.x = 380 # Positioned to the right of the wider chart
             legend.y = 250
             legend.alignment = 'right'
-            legend.colorNamePairs = [(colors.HexColor(palette[i % len(palette)]), labels[i]) for i in range(len(values))]
+            legend.colorNamePairs = [(palette[i % len(palette)], labels[i]) for i in range(len(values))]
             # legend.columnCount = 1  # Not supported in this version
             legend.fontSize = 10
             legend.dx = 8 
@@ -228,10 +668,9 @@ def generate_pdf_report(dataset):
     
     try:
         doc.build(elements)
-    except Exception as e:
-        # Fallback if build fails (e.g. font issues)
-        print(f"PDF Build Error: {e}") 
-        raise e
+    except Exception:
+        logger.exception("PDF build failed for dataset %s", dataset.pk)
+        raise
 
     buffer.seek(0)
     return buffer
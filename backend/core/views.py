@@ -1,29 +1,164 @@
+import base64
+import hashlib
+import os
+import re
+
 from django.shortcuts import get_object_or_404
+from django.db.models.fields.json import KT
+from django.db import transaction
+from django.utils.cache import get_conditional_response
 from django.contrib.auth import authenticate
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
-from .models import UploadedDataset
-from .serializers import UserSerializer, UploadedDatasetSerializer
-from django.http import HttpResponse
-from .utils import process_csv_analytics, generate_pdf_report
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from .models import UploadedDataset, ProcessingJob, UploadSession
+from .serializers import UserSerializer, UploadedDatasetSerializer, ProcessingJobSerializer, UploadSessionSerializer
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from .jobs import enqueue, process_dataset, store_analytics
+from .aio import AsyncAPIView, offload, streaming_content
+from .authentication import get_token_cache
+from .compare import STATE_FIELDS as ANALYTICS_STATE_FIELDS, compare, load_states
+from .resumable import OffsetMismatch, append_chunk, complete_session, create_session, discard_session
+from .retention import apply_retention
+from .reports import REPORT_TEMPLATE_VERSION, combined_report, get_report, iter_reports_zip
+from .renderers import COLUMNAR_FORMATS, DATA_RENDERERS, NDJSONRenderer
+from .uploads import StreamedUploadedFile, StreamingCSVUploadHandler, upload_error, upload_hash
+from .histograms import FixedWidthHistogram
+from .sketches import QuantileSketch
+from .stats import OVERALL_KEY
+from .downsample import METHODS as DOWNSAMPLING_METHODS
+from .utils import NUMERIC_COLUMNS, is_csv_name, iter_dataset_json, load_dataset_columns, load_dataset_frame, load_dataset_page, load_numeric_columns, frame_to_records
 
 # ... (Previous imports)
 
-class DatasetReportView(APIView):
+class DatasetETagMixin:
+    """
+    Conditional GET for dataset endpoints. Datasets never change once
+    processed, so the ETag is the dataset id plus its content hash (and the
+    requested representation). A matching If-None-Match is answered with
+    304 from a single small query, before any file is opened. Views whose
+    output also depends on code (e.g. the report template) set etag_salt.
+    """
+    etag = None
+    etag_salt = ''
+
+    def etag_queryset(self, request, pk):
+        return (
+            UploadedDataset.objects.filter(pk=pk, user=request.user)
+            .values('id', 'content_hash', 'upload_timestamp', status=KT('summary_data__status'))
+        )
+
+    def check_etag(self, request, pk):
+        """Returns a 304 response if the client copy is current, else None."""
+        return self.conditional_response(request, self.etag_queryset(request, pk).first())
+
+    async def acheck_etag(self, request, pk):
+        return self.conditional_response(request, await self.etag_queryset(request, pk).afirst())
+
+    def conditional_response(self, request, row):
+        # Missing datasets and results still being computed are not cached
+        if row is None or row['status'] in (ProcessingJob.QUEUED, ProcessingJob.RUNNING):
+            return None
+
+        version = row['content_hash'][:20] or str(int(row['upload_timestamp'].timestamp() * 1e6))
+        accepted = getattr(request, 'accepted_renderer', None)
+        representation = f"{self.etag_salt}:{accepted.format if accepted else ''}?{sorted(request.query_params.lists())}"
+        variant = hashlib.md5(representation.encode()).hexdigest()[:8]
+        self.etag = f'"{row["id"]}-{version}-{variant}"'
+        return get_conditional_response(request, etag=self.etag)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            # Revalidate on every use; unchanged datasets cost a 304
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class DatasetReportView(DatasetETagMixin, AsyncAPIView):
     """
     Generate and download PDF report.
     """
     permission_classes = [permissions.IsAuthenticated]
+    # A new template makes cached copies stale, as it does the report cache
+    etag_salt = f"template-{REPORT_TEMPLATE_VERSION}"
+
+    async def get(self, request, pk):
+        not_modified = await self.acheck_etag(request, pk)
+        if not_modified:
+            return not_modified
+        dataset = await aget_dataset(UploadedDataset.objects.select_related('user'), pk=pk, user=request.user)
+        # Served from the on-disk cache; generated on a miss (off the event loop)
+        report = await offload(open_report, dataset)
 
-    def get(self, request, pk):
-        dataset = get_object_or_404(UploadedDataset, pk=pk, user=request.user)
-        pdf_buffer = generate_pdf_report(dataset)
-        
         filename = f"report_{dataset.id}.pdf"
-        response = HttpResponse(pdf_buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return FileResponse(report, as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+def open_report(dataset):
+    return open(get_report(dataset), 'rb')
+
+
+async def aget_dataset(queryset, **lookup):
+    """Async get_object_or_404."""
+    try:
+        return await queryset.aget(**lookup)
+    except UploadedDataset.DoesNotExist:
+        raise Http404("No UploadedDataset matches the given query.")
+
+
+class ReportBatchView(APIView):
+    """
+    Reports of several datasets in one download, rendered in parallel.
+    POST {"ids": [...], "output": "zip" | "pdf"}; without ids, every dataset
+    of the user. "zip" streams one PDF per dataset, "pdf" returns a single
+    document with a cover index.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        output = request.data.get('output', 'zip')
+        if output not in ('zip', 'pdf'):
+            return Response({"error": "output must be 'zip' or 'pdf'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        datasets = UploadedDataset.objects.filter(user=request.user).select_related('user').order_by('upload_timestamp')
+        ids = request.data.get('ids')
+        if ids is not None:
+            try:
+                ids = [int(i) for i in ids]
+            except (TypeError, ValueError):
+                return Response({"error": "ids must be a list of dataset ids"}, status=status.HTTP_400_BAD_REQUEST)
+            by_id = {dataset.pk: dataset for dataset in datasets.filter(pk__in=ids)}
+            missing = [i for i in ids if i not in by_id]
+            if missing:
+                return Response({"error": f"Datasets not found: {missing}"}, status=status.HTTP_404_NOT_FOUND)
+            # Keep the requested order, without repeats
+            datasets = [by_id[i] for i in dict.fromkeys(ids)]
+        else:
+            datasets = list(datasets)
+
+        if not datasets:
+            return Response({"error": "No datasets to report on"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(datasets) > settings.REPORT_BATCH_MAX:
+            return Response({"error": f"At most {settings.REPORT_BATCH_MAX} datasets per batch"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if output == 'pdf':
+            try:
+                pdf = combined_report(datasets)
+            except RuntimeError as e:
+                return Response({"error": str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+            response = HttpResponse(pdf, content_type='application/pdf')
+            response['Content-Disposition'] = 'attachment; filename="reports.pdf"'
+            return response
+
+        response = StreamingHttpResponse(iter_reports_zip(datasets), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="reports.zip"'
         return response
 
 
@@ -46,73 +181,521 @@ class LoginView(APIView):
 class UploadCSVView(generics.CreateAPIView):
     """
     Upload CSV, run analytics, and save summary.
+
+    CSV files are stored, hashed and analysed while the request body is
+    read (StreamingCSVUploadHandler); one whose header is invalid is
+    refused with 400 before the rest of it is stored. With ?async=true (or
+    ANALYTICS_ASYNC_UPLOADS) the file is only stored and the analytics run
+    in a background worker: the response is 202 with the job to poll at
+    /api/jobs/<id>/. An async form field is only seen once the file has
+    been received, so it defers the analytics of files the handler does not
+    take, not of streamed ones.
     """
     serializer_class = UploadedDatasetSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Before the body is parsed (request.data is first read by the handler)
+        handler = StreamingCSVUploadHandler(request._request, UploadedDataset._meta.get_field('file'),
+                                            analyze=not self.is_async(read_body=False))
+        request._request.upload_handlers = [handler, *request._request.upload_handlers]
+
+    def is_async(self, read_body=True):
+        value = self.request.query_params.get('async')
+        if value is None and read_body:
+            value = self.request.data.get('async')
+        if value is None:
+            return settings.ANALYTICS_ASYNC_UPLOADS
+        return str(value).lower() in ('1', 'true', 'yes')
+
+    def create(self, request, *args, **kwargs):
+        self.job = None
+        # Parsing the body runs the upload handlers, which may refuse the file
+        request.data
+        error = upload_error(request)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            response = super().create(request, *args, **kwargs)
+        except ValidationError:
+            # The handler already stored the file
+            upload = request.FILES.get('file')
+            if isinstance(upload, StreamedUploadedFile):
+                upload.discard()
+            raise
+        if self.job:
+            response.status_code = status.HTTP_202_ACCEPTED
+            response.data['job'] = ProcessingJobSerializer(self.job).data
+        return response
+
     def perform_create(self, serializer):
-        # 1. Save the file first
-        dataset = serializer.save(user=self.request.user)
-        
-        # 2. Process Analytics
-        summary = process_csv_analytics(dataset.file.path)
-        
-        # 3. Update model with summary
-        if "error" in summary:
-            # If analytics fail, we might want to delete the file or keep it with error
-            dataset.summary_data = summary
-            dataset.save()
-            # Alternatively raise error, but let's keep it to show user the issue
+        # 1. Identical content uploaded before (by anyone): reuse its stored
+        # file and analytics instead of storing and parsing it again
+        content_hash = upload_hash(self.request)
+        upload = serializer.validated_data['file']
+        streamed = isinstance(upload, StreamedUploadedFile)
+        with transaction.atomic():
+            # The original stays locked until the copy is saved (see find_processed)
+            original = UploadedDataset.find_processed(content_hash, lock=True)
+            if original:
+                serializer.save(
+                    user=self.request.user,
+                    file=original.file.name,
+                    content_hash=content_hash,
+                    summary_data=original.summary_data,
+                    analytics_state=original.analytics_state,
+                    quantile_sketches=original.quantile_sketches,
+                    histograms=original.histograms,
+                )
+        if original:
+            if streamed:
+                upload.discard()
+            apply_retention(self.request.user)
+            return
+
+        # 2. A streamed CSV was stored and analysed as it was received:
+        # only its results are left to save
+        if streamed and upload.analysed:
+            dataset = serializer.save(user=self.request.user, file=upload.storage_name, content_hash=content_hash)
+            store_analytics(dataset, upload.summary, upload.accumulator)
+            apply_retention(self.request.user)
+            return
+
+        # 3. Save the file first (a streamed one is already stored)
+        if streamed:
+            dataset = serializer.save(user=self.request.user, file=upload.storage_name, content_hash=content_hash)
+        else:
+            dataset = serializer.save(user=self.request.user, content_hash=content_hash)
+
+        # 4. Process Analytics (now, or queued for a worker)
+        if self.is_async():
+            self.job = enqueue(dataset)
         else:
-            dataset.summary_data = summary
-            dataset.save()
-            
-        # 4. Enforce "Last 5" Rule
-        # Get all datasets for this user, ordered by upload_timestamp desc
-        user_datasets = UploadedDataset.objects.filter(user=self.request.user).order_by('-upload_timestamp')
-        if user_datasets.count() > 5:
-            # Delete the oldest ones
-            # Slicing from 5 to end gives the ones to delete
-            datasets_to_delete = user_datasets[5:]
-            for d in datasets_to_delete:
-                d.delete()
-
-class UploadHistoryView(generics.ListAPIView):
+            # Errors are kept in summary_data to show the user the issue
+            process_dataset(dataset)
+
+        # 5. Drop the user's datasets that fall outside the retention policy
+        apply_retention(self.request.user)
+
+class UploadSessionListView(APIView):
+    """
+    Start a resumable upload (see core.resumable).
+    POST {"filename", "dataset_name", "size"} (size optional) -> 201 with the
+    session; then PUT the chunks to /api/uploads/<id>/ and POST
+    /api/uploads/<id>/complete/.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        filename = os.path.basename(str(request.data.get('filename', '')))
+        if not is_csv_name(filename):
+            return Response({"error": "Only CSV files are allowed."}, status=status.HTTP_400_BAD_REQUEST)
+        size = request.data.get('size')
+        if size is not None:
+            try:
+                size = int(size)
+            except (TypeError, ValueError):
+                size = -1
+            if size < 0:
+                return Response({"error": "size must be a number of bytes"}, status=status.HTTP_400_BAD_REQUEST)
+        dataset_name = request.data.get('dataset_name') or filename
+        session = create_session(request.user, dataset_name, filename, size)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class UploadSessionView(APIView):
+    """
+    GET: the session, with the offset to continue from (e.g. after a dropped
+    connection or a server restart).
+    PUT: the next chunk as the raw request body, at the offset given by
+    Content-Range ("bytes <first>-<last>/<total or *>") or ?offset=. A chunk
+    that doesn't continue the upload gets 409 with the expected offset.
+    DELETE: abandon the upload.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        session = UploadSession.objects.filter(pk=pk, user=request.user).first()
+        if session is None:
+            return Response({"error": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(UploadSessionSerializer(session).data)
+
+    def put(self, request, pk):
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if length > settings.UPLOAD_CHUNK_MAX_BYTES:
+            return Response({"error": f"Chunks are limited to {settings.UPLOAD_CHUNK_MAX_BYTES} bytes"},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        content_range = request.headers.get('Content-Range')
+        try:
+            if content_range:
+                match = CONTENT_RANGE.match(content_range)
+                if not match or int(match[2]) - int(match[1]) + 1 != length:
+                    raise ValueError
+                offset = int(match[1])
+            else:
+                offset = int(request.query_params['offset'])
+        except (KeyError, ValueError):
+            return Response({"error": "A valid Content-Range header or offset is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = request.stream.read(length) if length else b''
+        if len(data) != length:
+            return Response({"error": "Incomplete chunk"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            session = append_chunk(pk, request.user, offset, data)
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+        except OffsetMismatch as e:
+            return Response({"error": str(e), "offset": e.expected}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data)
+
+    def delete(self, request, pk):
+        if not UploadSession.objects.filter(pk=pk, user=request.user).exists():
+            return Response({"error": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+        discard_session(pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionCompleteView(APIView):
+    """
+    Finish a resumable upload: 201 with the dataset, whose summary was
+    computed while the chunks arrived.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            dataset = complete_session(pk, request.user)
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadedDatasetSerializer(dataset, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+class UploadHistoryView(AsyncAPIView):
     """
     Get last 5 uploads for the authenticated user.
     """
-    serializer_class = UploadedDatasetSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
+    async def get(self, request):
         # Explicitly order by latest first and limit to 5
-        return UploadedDataset.objects.filter(user=self.request.user).order_by('-upload_timestamp')[:5]
+        queryset = UploadedDataset.objects.filter(user=request.user).defer(*ANALYTICS_STATE_FIELDS).order_by('-upload_timestamp')[:5]
+        datasets = [dataset async for dataset in queryset]
+        return Response(UploadedDatasetSerializer(datasets, many=True, context={'request': request}).data)
 
-class DatasetSummaryView(generics.RetrieveAPIView):
+class DatasetSummaryView(DatasetETagMixin, AsyncAPIView):
     """
     Get specific dataset details including summary.
     """
-    serializer_class = UploadedDatasetSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
-    
-    def get_queryset(self):
-        return UploadedDataset.objects.filter(user=self.request.user)
 
-class DatasetDataView(APIView):
+    async def get(self, request, pk):
+        not_modified = await self.acheck_etag(request, pk)
+        if not_modified:
+            return not_modified
+        # The serializer never reads the (large) analytics state
+        queryset = UploadedDataset.objects.defer(*ANALYTICS_STATE_FIELDS)
+        dataset = await aget_dataset(queryset, pk=pk, user=request.user)
+        return Response(UploadedDatasetSerializer(dataset, context={'request': request}).data)
+
+class DatasetDataView(DatasetETagMixin, AsyncAPIView):
     """
     Get full dataset content as JSON.
+
+    With limit/offset or cursor only one page of rows is returned, as
+    {"count", "next", "previous", "results"}; pages are sliced straight out
+    of the columnar sidecar, so every page costs the same. An empty cursor
+    starts at the first row, and the links then carry cursors.
+
+    With stream=json (or stream=ndjson / Accept: application/x-ndjson) the
+    rows are streamed chunk by chunk with constant memory.
+
+    Compact formats are picked by content negotiation (Accept header or
+    ?format=): columnar JSON, a raw NumPy column layout and, with pyarrow,
+    Arrow IPC (see core.renderers).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + DATA_RENDERERS
+    offload_render = True
+
+    async def get(self, request, pk):
+        not_modified = await self.acheck_etag(request, pk)
+        if not_modified:
+            return not_modified
+        dataset = await aget_dataset(UploadedDataset.objects.all(), pk=pk, user=request.user)
+        params = request.query_params
+        if request.accepted_renderer.format in COLUMNAR_FORMATS:
+            try:
+                return Response(await offload(load_dataset_columns, dataset.file.path))
+            except Exception as e:
+                return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if 'limit' in params or 'offset' in params or 'cursor' in params:
+            return await self.get_page(request, dataset)
+        stream = params.get('stream')
+        if stream is None and request.accepted_renderer.format == NDJSONRenderer.format:
+            stream = 'ndjson'
+        if stream in ('json', 'ndjson'):
+            lines = stream == 'ndjson'
+            return StreamingHttpResponse(
+                streaming_content(request, iter_dataset_json(dataset.file.path, settings.DATA_STREAM_CHUNK_SIZE, lines=lines)),
+                content_type='application/x-ndjson' if lines else 'application/json',
+            )
+        try:
+            return Response(await offload(load_dataset_records, dataset.file.path))
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def get_page(self, request, dataset):
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', settings.DATA_PAGE_SIZE))
+            offset = decode_cursor(params['cursor']) if 'cursor' in params else int(params.get('offset', 0))
+        except ValueError:
+            return Response({"error": "limit, offset and cursor must be valid"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({"error": "limit must be positive and offset not negative"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, settings.DATA_MAX_PAGE_SIZE)
+
+        try:
+            records, count = await offload(load_page_records, dataset.file.path, offset, limit)
+            if count is None:
+                count = (dataset.summary_data or {}).get('total_count', 0)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        url = request.build_absolute_uri()
+        use_cursor = 'cursor' in params
+
+        def link(page_offset):
+            if use_cursor:
+                return replace_query_param(url, 'cursor', encode_cursor(page_offset))
+            return replace_query_param(replace_query_param(url, 'offset', page_offset), 'limit', limit)
+
+        return Response({
+            "count": count,
+            "next": link(offset + limit) if offset + limit < count else None,
+            "previous": link(max(offset - limit, 0)) if offset > 0 else None,
+            "results": records,
+        })
+
+
+def load_dataset_records(path):
+    # Columnar sidecar if present, CSV otherwise; NaNs become None for valid JSON
+    return frame_to_records(load_dataset_frame(path))
+
+
+def load_page_records(path, offset, limit):
+    df, count = load_dataset_page(path, offset, limit)
+    return frame_to_records(df), count
+
+
+def encode_cursor(offset):
+    """Opaque cursor for a row offset (datasets never change, so offsets are stable)."""
+    return base64.urlsafe_b64encode(f"o={offset}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        key, _, value = base64.urlsafe_b64decode(cursor.encode()).decode().partition('=')
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if key != 'o':
+        raise ValueError("Invalid cursor")
+    return int(value)
+
+
+class DatasetSeriesView(APIView):
+    """
+    Downsampled (row index, value) series of numeric parameters for trend
+    charts, so transfer and drawing are bounded by the chart width.
+
+    Query params: parameter (comma separated, default all numeric columns),
+    max_points (default ANALYTICS_SERIES_POINTS, capped at
+    ANALYTICS_MAX_SERIES_POINTS), method ('minmax' or 'lttb').
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
-        dataset = get_object_or_404(UploadedDataset, pk=pk, user=request.user)
+        dataset = get_object_or_404(UploadedDataset.objects.only('id', 'file'), pk=pk, user=request.user)
+
+        parameters = request.query_params.get('parameter')
+        parameters = parameters.split(',') if parameters else NUMERIC_COLUMNS
+        unknown = [p for p in parameters if p not in NUMERIC_COLUMNS]
+        if unknown:
+            return Response({"error": f"Unknown parameter: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            max_points = int(request.query_params.get('max_points', settings.ANALYTICS_SERIES_POINTS))
+        except ValueError:
+            return Response({"error": "max_points must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        max_points = min(max(max_points, 3), settings.ANALYTICS_MAX_SERIES_POINTS)
+        method = request.query_params.get('method', 'minmax')
+        if method not in DOWNSAMPLING_METHODS:
+            return Response({"error": "method must be 'minmax' or 'lttb'"}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            import pandas as pd
-            df = pd.read_csv(dataset.file.path)
-            # Replace NaNs with None for valid JSON
-            df = df.where(pd.notnull(df), None)
-            return Response(df.to_dict(orient='records'))
+            columns = load_numeric_columns(dataset.file.path, parameters)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        series = {}
+        for parameter, values in columns.items():
+            index, sampled = DOWNSAMPLING_METHODS[method](values, max_points)
+            series[parameter] = {"index": index.tolist(), "values": sampled.tolist()}
+        total = len(next(iter(columns.values()))) if columns else 0
+        return Response({"total_points": total, "method": method, "series": series})
+
+
+class DatasetPercentilesView(APIView):
+    """
+    Percentiles per EquipmentType and parameter, answered from the stored
+    quantile sketches (no file access).
+
+    Query params: q (comma separated percentiles, default 50,95,99),
+    parameter (optional), type (omit for overall, '*' for every type).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        dataset = get_object_or_404(UploadedDataset.objects.only('id', 'quantile_sketches'), pk=pk, user=request.user)
+        if not dataset.quantile_sketches:
+            return Response({"error": "No percentile data for this dataset"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            percents = [float(p) for p in request.query_params.get('q', '50,95,99').split(',')]
+        except ValueError:
+            return Response({"error": "q must be a comma separated list of numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if any(p < 0 or p > 100 for p in percents):
+            return Response({"error": "Percentiles must be between 0 and 100"}, status=status.HTTP_400_BAD_REQUEST)
+
+        sketch = QuantileSketch.from_dict(dataset.quantile_sketches)
+        result = sketch.quantiles(
+            [p / 100 for p in percents],
+            parameter=request.query_params.get('parameter'),
+            equipment_type=request.query_params.get('type'),
+        )
+        percentiles = {
+            equipment_type: {
+                parameter: {f"p{q * 100:g}": value for q, value in values.items()}
+                for parameter, values in parameters.items()
+            }
+            for equipment_type, parameters in result.items()
+        }
+        return Response({"relative_accuracy": sketch.relative_accuracy, "percentiles": percentiles})
+
+
+class DatasetHistogramView(APIView):
+    """
+    Histograms precomputed at upload, so charts cost O(bins) instead of
+    downloading every row.
+
+    Query params: kind ('fixed' equal-width bins, default, or 'quantile'
+    equal-frequency bins), parameter (optional), type (omit for overall,
+    '*' for every type).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        dataset = get_object_or_404(UploadedDataset.objects.only('id', 'histograms'), pk=pk, user=request.user)
+        if not dataset.histograms:
+            return Response({"error": "No histogram data for this dataset"}, status=status.HTTP_404_NOT_FOUND)
+
+        kind = request.query_params.get('kind', 'fixed')
+        parameter = request.query_params.get('parameter')
+        equipment_type = request.query_params.get('type')
+        if kind == 'fixed':
+            histogram = FixedWidthHistogram.from_dict(dataset.histograms["fixed"])
+            histograms = histogram.histograms(parameter=parameter, equipment_type=equipment_type)
+        elif kind == 'quantile':
+            stored = dataset.histograms["quantile"]
+            if equipment_type != '*':
+                key = OVERALL_KEY if equipment_type is None else equipment_type
+                stored = {key: stored[key]} if key in stored else {}
+            histograms = {
+                type_key: {p: h for p, h in parameters.items() if parameter is None or p == parameter}
+                for type_key, parameters in stored.items()
+            }
+            histograms = {type_key: parameters for type_key, parameters in histograms.items() if parameters}
+        else:
+            return Response({"error": "kind must be 'fixed' or 'quantile'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"kind": kind, "histograms": histograms})
+
+
+class DatasetCompareView(APIView):
+    """
+    Compares several datasets from their stored aggregate state: per type
+    and parameter, count, mean, std, min, max and percentiles side by side,
+    deltas from the baseline dataset and histogram overlap with it.
+
+    Query params: ids (comma separated, in display order), baseline (one of
+    ids, default the first), q (comma separated percentiles, default 50,95,99).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            ids = list(dict.fromkeys(int(i) for i in request.query_params.get('ids', '').split(',') if i))
+            baseline = int(request.query_params.get('baseline', ids[0] if ids else 0))
+            percents = [float(p) for p in request.query_params.get('q', '50,95,99').split(',')]
+        except ValueError:
+            return Response({"error": "ids, baseline and q must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 2 <= len(ids) <= settings.COMPARE_MAX_DATASETS:
+            return Response({"error": f"Compare between 2 and {settings.COMPARE_MAX_DATASETS} datasets"}, status=status.HTTP_400_BAD_REQUEST)
+        if baseline not in ids:
+            return Response({"error": "baseline must be one of ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if any(p < 0 or p > 100 for p in percents):
+            return Response({"error": "Percentiles must be between 0 and 100"}, status=status.HTTP_400_BAD_REQUEST)
+
+        by_id = {d.pk: d for d in UploadedDataset.objects.filter(pk__in=ids, user=request.user)}
+        missing = [i for i in ids if i not in by_id]
+        if missing:
+            return Response({"error": f"Datasets not found: {missing}"}, status=status.HTTP_404_NOT_FOUND)
+        datasets = [by_id[i] for i in ids]
+
+        pending = [d.pk for d in datasets if (d.summary_data or {}).get("status") in (ProcessingJob.QUEUED, ProcessingJob.RUNNING)]
+        if pending:
+            return Response({"error": f"Datasets still processing: {pending}"}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            analysed = load_states(datasets)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "datasets": [
+                {"id": d.pk, "dataset_name": d.dataset_name, "source": "analysed" if d.pk in analysed else "stored"}
+                for d in datasets
+            ],
+            "baseline": baseline,
+            "types": compare(datasets, [p / 100 for p in percents], baseline=ids.index(baseline)),
+        })
+
+
+class AuthCacheStatsView(APIView):
+    """
+    Size and hit/miss counters of this process's token cache (staff only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_token_cache().stats())
+
+
+class JobStatusView(generics.RetrieveAPIView):
+    """
+    State, progress (0..1) and error of a background upload job.
+    """
+    serializer_class = ProcessingJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ProcessingJob.objects.filter(dataset__user=self.request.user)
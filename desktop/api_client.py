@@ -1,5 +1,7 @@
 import requests
 
+from columnar_data import COLUMNS_MEDIA_TYPE, decode_columns
+
 class APIClient:
     def __init__(self, base_url="http://127.0.0.1:8000/api/"):
         self.base_url = base_url
@@ -38,6 +40,17 @@ class APIClient:
             print(f"Upload Error: {e}")
             return None
 
+    def get_job(self, job_id):
+        """Fetches state/progress of a background upload job."""
+        url = f"{self.base_url}jobs/{job_id}/"
+        try:
+            response = self.session.get(url)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Job Fetch Error: {e}")
+            return {}
+
     def get_history(self):
         """Fetches upload history."""
         url = f"{self.base_url}history/"
@@ -50,15 +63,29 @@ class APIClient:
             return []
 
     def get_dataset_data(self, dataset_id):
-        """Fetches full data for a dataset."""
+        """
+        Fetches full data for a dataset in the binary column format and
+        returns it as a ColumnarTable (arrays are views on the response body).
+        """
         url = f"{self.base_url}data/{dataset_id}/"
         try:
-            response = self.session.get(url)
+            response = self.session.get(url, headers={'Accept': COLUMNS_MEDIA_TYPE})
             response.raise_for_status()
-            return response.json()
+            return decode_columns(response.content)
         except Exception as e:
             print(f"Data Fetch Error: {e}")
-            return []
+            return None
+
+    def get_dataset_page(self, dataset_id, offset=0, limit=1000):
+        """Fetches one page of rows ({'count', 'next', 'previous', 'results'})."""
+        url = f"{self.base_url}data/{dataset_id}/"
+        try:
+            response = self.session.get(url, params={'offset': offset, 'limit': limit})
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Data Page Fetch Error: {e}")
+            return {}
 
     def get_dataset_summary(self, dataset_id):
         """Fetches summary stats for a dataset."""
@@ -71,6 +98,34 @@ class APIClient:
             print(f"Summary Fetch Error: {e}")
             return {}
 
+    def get_dataset_series(self, dataset_id, parameter, max_points=1000, method='minmax'):
+        """Fetches a downsampled trend series ({'index': [...], 'values': [...]})."""
+        url = f"{self.base_url}series/{dataset_id}/"
+        params = {'parameter': parameter, 'max_points': max_points, 'method': method}
+        try:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            return response.json().get('series', {}).get(parameter, {})
+        except Exception as e:
+            print(f"Series Fetch Error: {e}")
+            return {}
+
+    def get_histograms(self, dataset_id, parameter=None, equipment_type=None, kind='fixed'):
+        """Fetches precomputed histograms ({type: {parameter: {edges, counts}}})."""
+        url = f"{self.base_url}histograms/{dataset_id}/"
+        params = {'kind': kind}
+        if parameter:
+            params['parameter'] = parameter
+        if equipment_type:
+            params['type'] = equipment_type
+        try:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            return response.json().get('histograms', {})
+        except Exception as e:
+            print(f"Histogram Fetch Error: {e}")
+            return {}
+
     def download_report(self, dataset_id, save_path):
         """Downloads the PDF report."""
         url = f"{self.base_url}report/{dataset_id}/"
@@ -0,0 +1,67 @@
+import json
+import struct
+
+import numpy as np
+
+# Must match core.renderers on the server
+COLUMNS_MEDIA_TYPE = 'application/vnd.equipment.columns'
+COLUMNS_MAGIC = b'EQCOLS1\n'
+
+
+class ColumnarTable:
+    """
+    Dataset held as one numpy array per column. Text columns stay as int32
+    codes plus a categories list until a value is actually needed.
+    """
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        # name -> {"values": ndarray} or {"codes": ndarray, "categories": [...]}
+        self._columns = columns
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __len__(self):
+        return self.rows
+
+    def __bool__(self):
+        return self.rows > 0
+
+    def find(self, *names):
+        """First of `names` that is a column here, or None."""
+        return next((name for name in names if name in self._columns), None)
+
+    def is_numeric(self, name):
+        return "values" in self._columns[name]
+
+    def column(self, name):
+        """Numeric columns as-is; text columns decoded (None where missing)."""
+        column = self._columns[name]
+        if "values" in column:
+            return column["values"]
+        categories = np.array(list(column["categories"]) + [None], dtype=object)
+        return categories[column["codes"]]
+
+
+def decode_columns(body):
+    """
+    Decodes the binary column layout. Every column is a numpy view on
+    `body` (no copy), so it stays valid as long as the arrays are alive.
+    """
+    if body[:len(COLUMNS_MAGIC)] != COLUMNS_MAGIC:
+        raise ValueError("Not a column payload")
+    (header_length,) = struct.unpack_from('<I', body, len(COLUMNS_MAGIC))
+    header_start = len(COLUMNS_MAGIC) + 4
+    header = json.loads(body[header_start:header_start + header_length])
+    data_start = -(-(header_start + header_length) // 8) * 8
+
+    columns = {}
+    for column in header["columns"]:
+        values = np.frombuffer(body, dtype=column["dtype"], count=column["length"], offset=data_start + column["offset"])
+        if "categories" in column:
+            columns[column["name"]] = {"codes": values, "categories": column["categories"]}
+        else:
+            columns[column["name"]] = {"values": values}
+    return ColumnarTable(header["rows"], columns)
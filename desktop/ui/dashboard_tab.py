@@ -1,11 +1,14 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QTableWidget, QTableWidgetItem, QMessageBox, QTabWidget, QComboBox, QFrame
+import numpy as np
 from ui.widgets.chart_widget import ChartWidget
 
 class DashboardTab(QWidget):
     def __init__(self, api_client):
         super().__init__()
         self.api_client = api_client
-        self.current_data = [] # Store current dataset
+        self.current_data = None # Store current dataset (ColumnarTable)
+        self.current_summary = {}
+        self.current_histograms = {}
         self.current_id = None
         self.init_ui()
 
@@ -84,7 +87,11 @@ class DashboardTab(QWidget):
         # Controls for Chart
         chart_controls = QHBoxLayout()
         self.chart_selector = QComboBox()
-        self.chart_selector.addItems(["Type Distribution", "Flowrate", "Pressure", "Temperature"])
+        self.chart_selector.addItems([
+            "Type Distribution", "Flowrate", "Pressure", "Temperature",
+            "Flowrate by Type", "Pressure by Type", "Temperature by Type",
+            "Flowrate Distribution", "Pressure Distribution", "Temperature Distribution"
+        ])
         self.chart_selector.currentTextChanged.connect(self.update_chart)
         chart_controls.addWidget(QLabel("Select Chart:"))
         chart_controls.addWidget(self.chart_selector)
@@ -114,6 +121,8 @@ class DashboardTab(QWidget):
                 self.status_label.setText(f"Uploaded: {dataset_name}")
                 
                 # Fetch full data content for table and charts
+                self.current_id = response['id']
+                self.current_histograms = {}
                 full_data = self.api_client.get_dataset_data(response['id'])
                 
                 if full_data:
@@ -141,20 +150,49 @@ class DashboardTab(QWidget):
     def populate_table(self, data):
         if not data: return
         
-        headers = list(data[0].keys())
+        headers = data.columns
         self.table_widget.setColumnCount(len(headers))
         self.table_widget.setRowCount(len(data))
         self.table_widget.setHorizontalHeaderLabels(headers)
 
-        for row_idx, row_data in enumerate(data):
-            for col_idx, header in enumerate(headers):
-                val = row_data.get(header, "")
+        # Filled column by column straight from the arrays
+        for col_idx, header in enumerate(headers):
+            values = data.column(header)
+            if values.dtype.kind == 'f':
+                values = np.where(np.isnan(values), None, values)
+            for row_idx, val in enumerate(values.tolist()):
                 self.table_widget.setItem(row_idx, col_idx, QTableWidgetItem(str(val)))
 
     def update_chart(self):
+        chart_type = self.chart_selector.currentText()
+
+        # Per-type charts come from the precomputed summary, not the rows
+        if chart_type == "Type Distribution" and self.current_summary.get('equipment_type_distribution'):
+            self.chart_view.plot_type_distribution(self.current_summary['equipment_type_distribution'])
+            return
+        if chart_type.endswith(" by Type"):
+            if self.current_summary.get('type_statistics'):
+                self.chart_view.plot_type_statistics(self.current_summary['type_statistics'], chart_type[:-len(" by Type")])
+            return
+        if chart_type.endswith(" Distribution") and chart_type != "Type Distribution":
+            parameter = chart_type[:-len(" Distribution")]
+            if self.current_id is not None:
+                # Histograms are precomputed server-side; fetch once per dataset
+                if not self.current_histograms:
+                    self.current_histograms = self.api_client.get_histograms(self.current_id).get('__all__', {})
+                if parameter in self.current_histograms:
+                    self.chart_view.plot_histogram(self.current_histograms[parameter], parameter)
+            return
+
+        if chart_type in ("Flowrate", "Pressure", "Temperature") and self.current_id is not None:
+            # Downsampled server-side to about one point per pixel
+            series = self.api_client.get_dataset_series(self.current_id, chart_type, max_points=max(self.chart_view.width(), 100))
+            if series:
+                self.chart_view.plot_series(series, chart_type)
+                return
+
         if not self.current_data: return
         
-        chart_type = self.chart_selector.currentText()
         if chart_type == "Type Distribution":
             self.chart_view.plot_bar(self.current_data)
         else:
@@ -162,6 +200,7 @@ class DashboardTab(QWidget):
 
     def load_dataset(self, dataset_id, dataset_name="Dataset"):
         self.current_id = dataset_id
+        self.current_histograms = {}
         self.status_label.setText(f"Loaded: {dataset_name}")
         self.pdf_btn.setEnabled(True)
 
@@ -177,6 +216,8 @@ class DashboardTab(QWidget):
 
     def update_stats(self, summary):
         if not summary: return
+        self.current_summary = summary
+        self.update_chart()
         self.lbl_total_val.setText(str(summary.get('total_count', 0)))
         self.lbl_flow_val.setText(f"{summary.get('avg_flowrate', 0):.2f}")
         self.lbl_press_val.setText(f"{summary.get('avg_pressure', 0):.2f}")
@@ -20,14 +20,17 @@ class ChartWidget(QWidget):
         self.canvas.axes.clear()
         
         # Logic to extract types similar to frontend
-        # data is list of dicts: [{'Equipment Name': 'Pump-1', 'Type': 'Pump', ...}]
-        type_counts = {}
-        for item in data:
-            etype = item.get('Type') or item.get('Equipment Type') or item.get('equipment_type') or 'Unknown'
-            type_counts[etype] = type_counts.get(etype, 0) + 1
-        
-        labels = list(type_counts.keys())
-        counts = list(type_counts.values())
+        # data is a ColumnarTable; missing types count as 'Unknown'
+        type_column = data.find('Type', 'Equipment Type', 'equipment_type')
+        if type_column:
+            types = data.column(type_column)
+            types = np.where(types == None, 'Unknown', types).astype(str)
+            uniques, first, counts = np.unique(types, return_index=True, return_counts=True)
+            # Keep the order of first appearance
+            order = np.argsort(first)
+            labels, counts = uniques[order].tolist(), counts[order].tolist()
+        else:
+            labels, counts = ['Unknown'], [len(data)]
         
         self.canvas.axes.bar(labels, counts, color='skyblue')
         self.canvas.axes.set_title("Equipment Type Distribution")
@@ -38,13 +41,71 @@ class ChartWidget(QWidget):
         self.canvas.fig.tight_layout() # Fix layout
         self.canvas.draw()
 
+    def plot_type_distribution(self, distribution):
+        """Bar chart straight from summary['equipment_type_distribution']."""
+        self.canvas.axes.clear()
+
+        labels = list(distribution.keys())
+        counts = list(distribution.values())
+
+        self.canvas.axes.bar(labels, counts, color='skyblue')
+        self.canvas.axes.set_title("Equipment Type Distribution")
+        self.canvas.axes.set_ylabel("Count")
+        self.canvas.axes.set_xticks(range(len(labels)))
+        self.canvas.axes.set_xticklabels(labels, rotation=45, ha='right')
+        self.canvas.fig.tight_layout()
+        self.canvas.draw()
+
+    def plot_type_statistics(self, type_statistics, parameter):
+        """Per-type mean with min/max range, from summary['type_statistics']."""
+        self.canvas.axes.clear()
+
+        stats = type_statistics.get(parameter, {})
+        labels = type_statistics.get('types', [])
+        means = [m if m is not None else np.nan for m in stats.get('mean', [])]
+        lower = [m - lo if m is not None and lo is not None else 0 for m, lo in zip(stats.get('mean', []), stats.get('min', []))]
+        upper = [hi - m if m is not None and hi is not None else 0 for m, hi in zip(stats.get('mean', []), stats.get('max', []))]
+
+        self.canvas.axes.bar(labels, means, yerr=[lower, upper], capsize=4, color='mediumpurple')
+        self.canvas.axes.set_title(f"{parameter} by Equipment Type (mean, min-max)")
+        self.canvas.axes.set_ylabel(parameter)
+        self.canvas.axes.set_xticks(range(len(labels)))
+        self.canvas.axes.set_xticklabels(labels, rotation=45, ha='right')
+        self.canvas.fig.tight_layout()
+        self.canvas.draw()
+
+    def plot_histogram(self, histogram, parameter):
+        """Distribution from a precomputed histogram ({'edges': [...], 'counts': [...]})."""
+        self.canvas.axes.clear()
+
+        edges = np.asarray(histogram.get('edges', []), dtype=float)
+        counts = histogram.get('counts', [])
+        if len(counts):
+            self.canvas.axes.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color='coral', edgecolor='white')
+        self.canvas.axes.set_title(f"{parameter} Distribution")
+        self.canvas.axes.set_xlabel(parameter)
+        self.canvas.axes.set_ylabel("Count")
+        self.canvas.fig.tight_layout()
+        self.canvas.draw()
+
+    def plot_series(self, series, parameter):
+        """Trend from a server-side downsampled series ({'index': [...], 'values': [...]})."""
+        self.canvas.axes.clear()
+
+        self.canvas.axes.plot(series.get('index', []), series.get('values', []), linestyle='-', linewidth=1, color='coral')
+        self.canvas.axes.set_title(f"{parameter} Trend")
+        self.canvas.axes.set_xlabel("Row")
+        self.canvas.axes.set_ylabel(parameter)
+        self.canvas.draw()
+
     def plot_line(self, data, parameter):
         self.canvas.axes.clear()
         
-        # Filter items that have the parameter
-        valid_items = [item for item in data if item.get(parameter) is not None]
         # Just plot index vs value for simplicity as per requirements (trend)
-        values = [float(item[parameter]) for item in valid_items if str(item[parameter]).replace('.','',1).isdigit()]
+        values = np.array([])
+        if parameter in data.columns and data.is_numeric(parameter):
+            values = data.column(parameter).astype(float)
+            values = values[np.isfinite(values)]
         
         self.canvas.axes.plot(values, marker='o', linestyle='-', color='coral')
         self.canvas.axes.set_title(f"{parameter} Trend")
@@ -12,6 +12,7 @@ import { useSearchParams } from 'react-router-dom';
 const Dashboard = ({ setIsAuthenticated }) => {
     const [data, setData] = useState([]);
     const [summary, setSummary] = useState(null);
+    const [histograms, setHistograms] = useState({});
     const [currentId, setCurrentId] = useState(null);
     const [loading, setLoading] = useState(false);
     const [searchParams] = useSearchParams();
@@ -36,10 +37,13 @@ const Dashboard = ({ setIsAuthenticated }) => {
         try {
             const dataReq = api.get(`data/${id}/`);
             const summaryReq = api.get(`summary/${id}/`);
-            const [dataRes, summaryRes] = await Promise.all([dataReq, summaryReq]);
+            // Histograms are precomputed at upload; failure only hides the charts
+            const histogramReq = api.get(`histograms/${id}/`).catch(() => null);
+            const [dataRes, summaryRes, histogramRes] = await Promise.all([dataReq, summaryReq, histogramReq]);
 
             setData(dataRes.data);
             setSummary(summaryRes.data.summary_data);
+            setHistograms(histogramRes ? histogramRes.data.histograms.__all__ || {} : {});
         } catch (error) {
             console.error("Error fetching dataset data:", error);
         } finally {
@@ -124,7 +128,7 @@ const Dashboard = ({ setIsAuthenticated }) => {
 
                             <div className="card">
                                 <h3 style={{ marginBottom: '1rem' }}>Parameter Distribution</h3>
-                                <ParamCharts data={data} />
+                                <ParamCharts histograms={histograms} />
                             </div>
                         </div>
 